@@ -0,0 +1,111 @@
+"""
+benchmarks/admission.py
+─────────────────────────────────────────────────────────────────────────────
+Surge test for priority admission control (services/admission.py).
+
+One uvicorn worker, started three times — ADMISSION_MAX_IN_FLIGHT=0 (off),
+the default, and 8 (sized for a small box: on one core, admitted threads
+share the GIL, so a high limit still lets the surge slow every request
+down). For DURATION seconds SURGE_CLIENTS threads poll the dashboard
+and appointment lists as fast as they can, while one probe thread posts
+/hyper-emergency/confirm every PROBE_INTERVAL seconds. Reported:
+
+  confirm     latency and status of the probe's hyper-emergency writes
+  surge       responses per status code, req/s
+  shed        admission_shed_total from the worker's /metrics
+
+  python -m benchmarks.run --suite admission
+
+Needs uvicorn and the same DB_* settings as benchmarks/endpoints.py.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import time
+import random
+import threading
+from collections import Counter
+
+import database
+from benchmarks.endpoints import BENCH_DB_NAME, _ensure_database
+from benchmarks.generator import generate, load
+from benchmarks.harness import summarize
+from benchmarks.workers import _free_port, _request, _start, _stop
+
+SURGE_CLIENTS  = 64
+DURATION       = 10
+PROBE_INTERVAL = 0.2
+
+SURGE_PATHS = ("/dashboard/stats", "/analytics/status", "/forecast/staffing", "/appointments", "/doctors")
+
+
+def _shed_counts(port) -> dict:
+    import http.client
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    conn.request("GET", "/metrics")
+    text = conn.getresponse().read().decode()
+    conn.close()
+    return {line.split("{", 1)[1].split("}", 1)[0]: float(line.rsplit(" ", 1)[1])
+            for line in text.splitlines() if line.startswith("admission_shed_total{")}
+
+
+def _surge(port, doctors, duration) -> dict:
+    statuses, surge_latency, confirm_latency, confirm_status = Counter(), [], [], Counter()
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def poller(seed):
+        rng, mine, seen = random.Random(seed), [], Counter()
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                seen[_request(port, "GET", rng.choice(SURGE_PATHS))[0]] += 1
+            except (OSError, ValueError) as exc:
+                seen[type(exc).__name__] += 1
+            mine.append(time.perf_counter() - start)
+        with lock:
+            statuses.update(seen)
+            surge_latency.extend(mine)
+
+    def probe():
+        rng = random.Random(0)
+        while time.perf_counter() < stop_at:
+            doctor_id, department_id = rng.choice(doctors)
+            start = time.perf_counter()
+            try:
+                status, body = _request(port, "POST", "/hyper-emergency/confirm", {
+                    "name": "Surge Probe", "age": 40, "gender": "male", "doctor_id": doctor_id,
+                    "department_id": department_id, "problem_text": "crush injury"})
+                confirm_status["error" if status == 200 and "error" in body else status] += 1
+            except OSError as exc:
+                confirm_status[type(exc).__name__] += 1
+            confirm_latency.append(time.perf_counter() - start)
+            time.sleep(max(0.0, PROBE_INTERVAL - (time.perf_counter() - start)))
+
+    threads = [threading.Thread(target=poller, args=(i,)) for i in range(SURGE_CLIENTS)]
+    threads.append(threading.Thread(target=probe))
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return {"confirm": {**summarize(confirm_latency), "status": dict(confirm_status)},
+            "surge":   {"requests_per_second": round(len(surge_latency) / duration, 1),
+                        "latency": summarize(surge_latency), "status": dict(statuses)},
+            "shed":    _shed_counts(port)}
+
+
+def run(scale: float = 1, seed: int = 42, repeat: int = 1, duration: float = DURATION) -> dict:
+    _ensure_database(BENCH_DB_NAME)
+    database.DB_CONFIG["database"] = BENCH_DB_NAME
+    data    = generate(scale, seed)
+    doctors = [(d[0], d[2]) for d in data["doctors"]]
+
+    results = {}
+    for label, limit in (("admission_off", "0"), ("admission_on", None), ("admission_8", "8")):
+        conn = database.get_connection()
+        load(conn, data)
+        conn.close()
+        port = _free_port()
+        proc = _start(1, port, {"ADMISSION_MAX_IN_FLIGHT": limit} if limit is not None else None)
+        try:
+            results[label] = _surge(port, doctors, duration)
+        finally:
+            _stop(proc)
+    return results
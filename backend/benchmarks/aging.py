@@ -0,0 +1,104 @@
+"""
+benchmarks/aging.py
+─────────────────────────────────────────────────────────────────────────────
+Priority aging (rules.json → queue.aging_points_per_hour) simulated on one
+doctor's queue.
+
+Patients are drawn from the generator's mix (age, gender, disability,
+appointment type, severity) and arrive as a Poisson stream at each of
+LOADS times the doctor's capacity for SIM_DAYS round the clock. Service
+takes the rules formula's minutes. Whenever the doctor is free the next patient is popped
+from a heap keyed by rules_engine.queue_key, with keys computed once, on
+arrival, and never updated.
+
+Per load and aging rate: waits (p50 / p95 / p99 / max minutes) overall and
+per priority level, and "heap_mismatches": pops where the heap's choice was not
+the patient with the highest effective priority at that moment, recomputed
+from scratch. It is 0 when the keys are truly time-invariant.
+
+  python -m benchmarks.run --suite aging
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import copy
+import heapq
+import random
+from datetime import datetime, timedelta
+
+from benchmarks.generator import generate
+from benchmarks.harness import percentile
+from services.rules_engine import compile_rules, rules_engine
+
+AGING_RATES = (0.0, 0.25, 0.5, 1.0, 2.0)     # priority points per hour waited
+LOADS       = (0.8, 0.9, 0.95)
+SIM_DAYS    = 365
+CHECK_EVERY = 50                             # pops between full effective-priority checks
+EPOCH       = datetime(2026, 1, 1)
+
+
+def _patients(seed: int) -> list:
+    return [{"age": a["age"], "gender": a["gender"], "disability": a["disability"],
+             "appointment_type": a["appointment_type"], "severity_score": a["severity_score"]}
+            for a in generate(1, seed)["appointments"]]
+
+
+def _waits(values: list) -> dict:
+    values = sorted(values)
+    return {"n": len(values),
+            "p50": round(percentile(values, 0.50), 1), "p95": round(percentile(values, 0.95), 1),
+            "p99": round(percentile(values, 0.99), 1), "max": round(values[-1], 1) if values else 0.0}
+
+
+def _simulate(rules, population: list, load: float, seed: int) -> dict:
+    rng       = random.Random(seed)
+    minutes   = [rules_engine.estimate_service_time(p, rules) for p in population]
+    rate      = load / (sum(minutes) / len(minutes))        # arrivals per minute
+    horizon   = SIM_DAYS * 24 * 60
+    arrivals  = []
+    t = 0.0
+    while t < horizon:
+        t += rng.expovariate(rate)
+        i = rng.randrange(len(population))
+        p = population[i]
+        _, level = rules_engine.calculate_priority(p["age"], p["gender"], p["disability"], rules)
+        arrivals.append((t, level, rules.weights[level], p["severity_score"], minutes[i]))
+
+    def effective(entry, now):
+        arrived, _, weight, severity, _ = entry
+        return weight + rules.severity_points * severity + rules.aging_per_minute * (now - arrived)
+
+    heap, waiting, waits, mismatches, pops = [], {}, {}, 0, 0
+    clock, nxt = 0.0, 0
+    while nxt < len(arrivals) or heap:
+        if not heap:
+            clock = max(clock, arrivals[nxt][0])
+        while nxt < len(arrivals) and arrivals[nxt][0] <= clock:
+            entry = arrivals[nxt]
+            key   = rules_engine.queue_key(entry[2], entry[3], EPOCH + timedelta(minutes=entry[0]), rules)
+            heapq.heappush(heap, (key, nxt))
+            waiting[nxt] = entry
+            nxt += 1
+        _, idx = heapq.heappop(heap)
+        entry  = waiting.pop(idx)
+        pops  += 1
+        if pops % CHECK_EVERY == 0 and waiting:
+            best = max(effective(e, clock) for e in waiting.values())
+            if effective(entry, clock) < best - 1e-9:
+                mismatches += 1
+        waits.setdefault(entry[1], []).append(clock - entry[0])
+        clock += entry[4]
+
+    return {"overall": _waits([w for level_waits in waits.values() for w in level_waits]),
+            **{level: _waits(level_waits) for level, level_waits in sorted(waits.items())},
+            "heap_mismatches": mismatches}
+
+
+def run(scale: float = 1, seed: int = 42, repeat: int = 1) -> dict:
+    population = _patients(seed)
+    results = {"days": SIM_DAYS}
+    for aging in AGING_RATES:
+        rules = copy.deepcopy(rules_engine.rules)
+        rules.setdefault("queue", {})["aging_points_per_hour"] = aging
+        for load in LOADS:
+            results[f"load_{load}/aging_{aging}"] = _simulate(compile_rules(rules), population, load, seed)
+    return results
@@ -0,0 +1,86 @@
+"""
+benchmarks/analytics.py
+─────────────────────────────────────────────────────────────────────────────
+Analytics store at archive scale — no database.
+
+ANALYTICS_ROWS × scale synthetic archived appointments spread over
+ANALYTICS_DAYS days are ingested into services/analytics_store.py, written
+to a temporary directory and loaded back; then each /analytics query runs
+over a 90-day and a full-range window.
+
+  ingest          rows/s into columns + rollups
+  save / load     row groups to disk and back (load rebuilds the rollups)
+  query/<name>    one endpoint query
+
+  python -m benchmarks.run --suite analytics [--scale 3]
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.generator import HOURLY_PROFILE
+from benchmarks.harness import measure
+from services.analytics_store import AnalyticsStore, _EPOCH
+
+ANALYTICS_ROWS = 1_000_000
+ANALYTICS_DAYS = 365
+DEPARTMENTS    = 8
+DOCTORS        = 48
+
+
+def _rows(n: int, seed: int) -> list:
+    rng   = random.Random(seed)
+    first = datetime.combine(date.today() - timedelta(days=ANALYTICS_DAYS), datetime.min.time())
+    base  = int((first - _EPOCH).total_seconds())
+    hours = list(range(24))
+    hour_of = rng.choices(hours, weights=HOURLY_PROFILE, k=n)
+    rows = []
+    for i in range(n):
+        doctor = rng.randrange(DOCTORS) + 1
+        status = 0 if rng.random() < 0.92 else 1
+        rows.append((i + 1, base + rng.randrange(ANALYTICS_DAYS) * 86400 + hour_of[i] * 3600 + rng.randrange(3600),
+                     doctor % DEPARTMENTS + 1, doctor, rng.choices((0, 1, 2), (60, 25, 15))[0], status,
+                     int(rng.random() < 0.01), rng.randint(1, 10), int(rng.expovariate(1 / 25)),
+                     rng.randint(10, 60), rng.lognormvariate(3, 0.4) if status == 0 else -1.0))
+    return rows
+
+
+def run(scale: float = 1, seed: int = 42, repeat: int = 20) -> dict:
+    n    = int(ANALYTICS_ROWS * scale)
+    rows = _rows(n, seed)
+    results = {"rows": n}
+
+    store = AnalyticsStore(tempfile.mkdtemp(prefix="analytics-bench-"))
+    start = time.perf_counter()
+    store.append_rows(rows)
+    elapsed = time.perf_counter() - start
+    results["ingest"] = {"seconds": round(elapsed, 2), "rows_per_s": round(n / elapsed)}
+
+    start = time.perf_counter()
+    store.persist()
+    results["save"] = {"seconds": round(time.perf_counter() - start, 2),
+                       "bytes": sum(os.path.getsize(os.path.join(store.directory, f))
+                                    for f in os.listdir(store.directory)),
+                       "raw_bytes": sum(c.itemsize * len(c) for c in store.store.columns.values())}
+    reloaded = AnalyticsStore(store.directory)
+    start = time.perf_counter()
+    reloaded.load()
+    results["load"] = {"seconds": round(time.perf_counter() - start, 2), "rows": reloaded.store.rows}
+
+    today   = date.today()
+    recent  = today - timedelta(days=90)
+    oldest  = today - timedelta(days=ANALYTICS_DAYS + 1)
+    queries = {
+        "wait_times/90d_week":        lambda: store.wait_times(recent, today),
+        "wait_times/year_month":      lambda: store.wait_times(oldest, today, granularity="month"),
+        "arrivals/year":              lambda: store.arrivals(oldest, today),
+        "emergency_ratio/year_week":  lambda: store.emergency_ratio(oldest, today),
+        "throughput/year_month":      lambda: store.throughput(oldest, today, granularity="month"),
+    }
+    for name, fn in queries.items():
+        results[f"query/{name}"] = measure(fn, repeat)
+    return results
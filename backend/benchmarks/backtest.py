@@ -0,0 +1,126 @@
+"""
+benchmarks/backtest.py
+─────────────────────────────────────────────────────────────────────────────
+Wait-prediction backtest for the service-time model.
+
+Replays completed visits day by day, prequentially: each day is predicted
+with the model as it stood at the end of the previous day, then learned.
+
+Visits are grouped into sessions — one doctor's back-to-back patients, a
+new session after a gap of SESSION_GAP_MINUTES. Within a session, patient
+i's actual wait is started_at(i) − started_at(first), and the predicted
+wait is the sum of predicted durations of everyone seen before them. This
+is exactly what waiting_time shows a patient who joins behind that queue.
+
+  rules     rules.json formula only (what waiting_time used before)
+  learned   services/service_time_model.py, trained online
+
+  python -m benchmarks.run --suite backtest                 # synthetic history
+  python -m benchmarks.run --suite backtest --source db     # DB_NAME's history
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import time
+from datetime import timedelta
+
+from benchmarks.generator import history
+from benchmarks.harness import percentile
+from services.rules_engine import rules_engine
+from services.service_time_model import ServiceTimeModel
+
+HISTORY_DAYS        = 30
+SESSION_GAP_MINUTES = 60
+
+
+def load_history(cursor, days: int = HISTORY_DAYS) -> list:
+    cursor.execute("""
+        SELECT a.department_id, a.doctor_id, a.appointment_type, a.severity_score,
+               p.age, p.disability, a.started_at, a.completed_at
+        FROM appointment_history a JOIN patients p ON a.patient_id=p.patient_id
+        WHERE a.status='completed' AND a.started_at IS NOT NULL AND a.completed_at > a.started_at
+          AND a.completed_at >= NOW() - %s * INTERVAL '1 day'
+    """, (days,))
+    return [{"department_id": r[0], "doctor_id": r[1], "appointment_type": r[2], "severity_score": r[3],
+             "age": r[4], "disability": r[5], "started_at": r[6], "completed_at": r[7]}
+            for r in cursor.fetchall()]
+
+
+def _sessions(visits: list) -> list:
+    by_doctor = {}
+    for v in sorted(visits, key=lambda v: (v["doctor_id"], v["started_at"])):
+        by_doctor.setdefault(v["doctor_id"], []).append(v)
+    sessions = []
+    gap = timedelta(minutes=SESSION_GAP_MINUTES)
+    for doctor_visits in by_doctor.values():
+        current = [doctor_visits[0]]
+        for prev, v in zip(doctor_visits, doctor_visits[1:]):
+            if v["started_at"] - prev["completed_at"] > gap:
+                sessions.append(current)
+                current = []
+            current.append(v)
+        sessions.append(current)
+    return sessions
+
+
+def _errors(errors: list) -> dict:
+    absolute = sorted(abs(e) for e in errors)
+    return {"n":            len(errors),
+            "mae_min":      round(sum(absolute) / len(absolute), 2) if absolute else 0.0,
+            "p50_abs_min":  round(percentile(absolute, 0.50), 2),
+            "p90_abs_min":  round(percentile(absolute, 0.90), 2),
+            "bias_min":     round(sum(errors) / len(errors), 2) if errors else 0.0}
+
+
+def backtest(visits: list) -> dict:
+    model = ServiceTimeModel()
+    by_day = {}
+    for session in _sessions(visits):
+        by_day.setdefault(session[0]["started_at"].date(), []).append(session)
+
+    waits    = {"rules": [], "learned": []}
+    services = {"rules": [], "learned": []}
+    learn_seconds = 0.0
+    for day in sorted(by_day):
+        model.compile()
+        for session in by_day[day]:
+            v0 = session[0]
+            durations = model.for_doctor(v0["doctor_id"], v0["department_id"])
+            ahead = {"rules": 0.0, "learned": 0.0}
+            for v in session:
+                actual_wait = (v["started_at"] - v0["started_at"]).total_seconds() / 60
+                actual_min  = (v["completed_at"] - v["started_at"]).total_seconds() / 60
+                base = rules_engine.estimate_service_time(v)
+                predicted = {"rules":   base,
+                             "learned": durations(v, base, v0["started_at"] + timedelta(minutes=ahead["learned"]))}
+                for name in waits:
+                    waits[name].append(ahead[name] - actual_wait)
+                    services[name].append(predicted[name] - actual_min)
+                    ahead[name] += predicted[name]
+
+        start = time.perf_counter()
+        for session in by_day[day]:
+            for v in session:
+                model.observe(v["department_id"], v["doctor_id"], v, v["started_at"],
+                              (v["completed_at"] - v["started_at"]).total_seconds() / 60, record=False)
+        learn_seconds += time.perf_counter() - start
+
+    return {
+        "wait_error":    {name: _errors(e) for name, e in waits.items()},
+        "service_error": {name: _errors(e) for name, e in services.items()},
+        "days": len(by_day), "visits": len(visits),
+        "learn_us_per_visit": round(learn_seconds / max(len(visits), 1) * 1e6, 2),
+        "model_keys": len(model.table()),
+    }
+
+
+def run(scale: float = 1, seed: int = 42, repeat: int = 1, source: str = "synthetic") -> dict:
+    if source == "db":
+        import database
+        conn = database.get_connection()
+        try:
+            visits = load_history(conn.cursor())
+        finally:
+            conn.close()
+    else:
+        visits = history(HISTORY_DAYS, scale, seed)
+    return {"source": source, **backtest(visits)}
@@ -0,0 +1,137 @@
+"""
+benchmarks/batching.py
+─────────────────────────────────────────────────────────────────────────────
+Micro-batched Gemini triage (services/triage_llm.py, TriageBatcher) against
+a local stand-in for the Gemini endpoint that behaves like a rate-limited
+model: STUB_BASE_LATENCY per request plus STUB_PER_PATIENT per patient in
+the prompt, at most STUB_CONCURRENCY requests served at once.
+
+SURGE_PATIENTS triages arrive together from SURGE_THREADS threads:
+
+  unbatched   LLM_BATCH_WINDOW_MS=0, one prompt per patient (old behaviour)
+  batched     default window / batch size / concurrency
+  partial     batched, but every PARTIAL_EVERY-th patient is left out of
+              the reply or garbled: those get the rules, the rest Gemini
+
+The circuit breaker is off so queueing at the stub's limit can't open it
+mid-run. Per scenario: triage latency, Gemini requests and prompt bytes sent,
+"source" counts, batch sizes.
+
+  python -m benchmarks.run --suite batching
+
+Runs against an empty TRIAGE_DATA_DIR, so no local model answers first and
+the stub's answers stay out of the real decision log. Needs no database and
+no API key.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import json
+import time
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.harness import summarize
+from services import triage_llm, triage_model
+
+STUB_BASE_LATENCY = 0.4
+STUB_PER_PATIENT  = 0.02
+STUB_CONCURRENCY  = 4
+SURGE_PATIENTS    = 64
+SURGE_THREADS     = 32
+PARTIAL_EVERY     = 5
+
+COMPLAINTS = ("chest pain radiating to left arm", "sudden facial droop and slurred speech",
+              "fracture of the left wrist after a fall", "infant with high fever",
+              "severe allergic reaction with swelling", "shortness of breath at rest")
+
+
+class _Stub(BaseHTTPRequestHandler):
+    gate     = threading.Semaphore(STUB_CONCURRENCY)
+    partial  = False
+    requests = 0
+    bytes_in = 0
+
+    def do_POST(self):
+        body   = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        prompt = json.loads(body)["contents"][0]["parts"][0]["text"]
+        _Stub.requests += 1
+        _Stub.bytes_in += len(body)
+        patients = prompt.count('"complaint":')
+        with _Stub.gate:
+            time.sleep(STUB_BASE_LATENCY + STUB_PER_PATIENT * max(1, patients))
+        if patients:
+            answer = [{"id": i, "department": "cardiology ward", "urgency_level": "HIGH", "reasoning": "Stub."}
+                      for i in range(patients)]
+            if _Stub.partial:
+                answer = [a if a["id"] % PARTIAL_EVERY else {"id": "x"} for a in answer
+                          if a["id"] % (2 * PARTIAL_EVERY)]
+        else:
+            answer = {"department": "cardiology ward", "urgency_level": "HIGH", "reasoning": "Stub."}
+        reply = json.dumps({"candidates": [{"content": {"parts": [{"text": json.dumps(answer)}]}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+
+def _surge() -> dict:
+    _Stub.requests = _Stub.bytes_in = 0
+    sizes_before = triage_llm.BATCH_SIZE.totals()
+    latency, sources, departments = [], Counter(), Counter()
+
+    def one(n):
+        start  = time.perf_counter()
+        result = triage_llm.classify_department_llm(COMPLAINTS[n % len(COMPLAINTS)], 30 + n % 50)
+        return time.perf_counter() - start, result
+
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=SURGE_THREADS) as pool:
+        for elapsed, result in pool.map(one, range(SURGE_PATIENTS)):
+            latency.append(elapsed)
+            sources[result["source"]] += 1
+            departments[result["department"]] += 1
+    wall = time.perf_counter() - wall
+    batches, patients = (now - before for now, before in zip(triage_llm.BATCH_SIZE.totals(), sizes_before))
+    return {"latency": summarize(latency), "wall_s": round(wall, 3),
+            "gemini_requests": _Stub.requests, "prompt_kb": round(_Stub.bytes_in / 1024, 1),
+            "mean_batch": round(patients / batches, 2) if batches else None,
+            "source": dict(sources), "department": dict(departments)}
+
+
+def run(scale: float = 1, seed: int = 42, repeat: int = 50) -> dict:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Stub)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    data_dir = triage_model.use_data_dir(tempfile.mkdtemp(prefix="triage-bench-"))
+    saved = (triage_llm.GEMINI_API_KEY, triage_llm.GEMINI_URL, triage_llm.BATCH_WINDOW_SECONDS,
+             triage_llm.BATCHER, triage_llm.BREAKER)
+    triage_llm.GEMINI_API_KEY = "benchmark"
+    triage_llm.GEMINI_URL     = f"http://127.0.0.1:{server.server_address[1]}/generateContent"
+    triage_llm.BREAKER        = triage_llm.CircuitBreaker(failures=0)
+
+    results = {}
+    try:
+        triage_llm.BATCH_WINDOW_SECONDS = 0
+        results["unbatched"] = _surge()
+
+        triage_llm.BATCH_WINDOW_SECONDS = saved[2] or 0.005
+        triage_llm.BATCHER = triage_llm.TriageBatcher(triage_llm.BATCH_WINDOW_SECONDS)
+        results["batched"] = _surge()
+
+        _Stub.partial = True
+        results["partial"] = _surge()
+        results["partial"]["missing_total"] = sum(triage_llm.BATCH_MISSING._values.values())
+    finally:
+        _Stub.partial = False
+        (triage_llm.GEMINI_API_KEY, triage_llm.GEMINI_URL, triage_llm.BATCH_WINDOW_SECONDS,
+         triage_llm.BATCHER, triage_llm.BREAKER) = saved
+        triage_model.use_data_dir(data_dir)
+        server.shutdown()
+    return results
@@ -0,0 +1,117 @@
+"""
+benchmarks/breaker.py
+─────────────────────────────────────────────────────────────────────────────
+Gemini circuit breaker and adaptive timeout (services/triage_llm.py) against
+a local stand-in for the Gemini endpoint whose latency the benchmark sets.
+
+  healthy     STUB_LATENCY per call: every triage comes from "gemini" and
+              the timeout settles near p95 × LLM_TIMEOUT_HEADROOM
+  degraded    the stub answers after DEGRADED_LATENCY (longer than any
+              timeout); SURGE_CALLS triages from SURGE_THREADS threads,
+              once with the breaker off (fixed LLM_TIMEOUT_MAX_SECONDS, the
+              old behaviour) and once on after the healthy warm-up
+  recovered   the stub is healthy again; after the open period one probe
+              closes the circuit
+
+Per scenario: triage latency, "source" counts, breaker state and timeout.
+
+  python -m benchmarks.run --suite breaker
+
+Micro-batching is off here (LLM_BATCH_WINDOW_MS=0): one call per triage.
+Runs against an empty TRIAGE_DATA_DIR, so no local model answers first and
+the stub's answers stay out of the real decision log. Needs no database and
+no API key.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import json
+import time
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.harness import summarize
+from services import triage_llm, triage_model
+
+STUB_LATENCY     = 0.05
+DEGRADED_LATENCY = 12.0
+SURGE_CALLS      = 32
+SURGE_THREADS    = 8
+OPEN_SECONDS     = 2.0
+
+_REPLY = json.dumps({"candidates": [{"content": {"parts": [{"text": json.dumps({
+    "department": "Cardiology", "urgency_level": "high", "reasoning": "Stub."})}]}}]}).encode()
+
+
+class _Stub(BaseHTTPRequestHandler):
+    latency = STUB_LATENCY
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(_Stub.latency)
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(_REPLY)))
+            self.end_headers()
+            self.wfile.write(_REPLY)
+        except OSError:
+            pass     # the client timed out and went away
+
+    def log_message(self, *args):
+        pass
+
+
+def _triage(calls: int, threads: int) -> dict:
+    latency, sources = [], Counter()
+
+    def one(_):
+        start  = time.perf_counter()
+        result = triage_llm.classify_department_llm("chest pain radiating to left arm", 58)
+        return time.perf_counter() - start, result["source"]
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for elapsed, source in pool.map(one, range(calls)):
+            latency.append(elapsed)
+            sources[source] += 1
+    breaker = triage_llm.BREAKER
+    return {"latency": summarize(latency), "source": dict(sources), "state": breaker.state,
+            "timeout_s": round(breaker.timeout(), 3)}
+
+
+def run(scale: float = 1, seed: int = 42, repeat: int = 50) -> dict:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Stub)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    data_dir = triage_model.use_data_dir(tempfile.mkdtemp(prefix="triage-bench-"))
+    saved = (triage_llm.GEMINI_API_KEY, triage_llm.GEMINI_URL, triage_llm.BREAKER,
+             triage_llm.BATCH_WINDOW_SECONDS)
+    triage_llm.GEMINI_API_KEY       = "benchmark"
+    triage_llm.GEMINI_URL           = f"http://127.0.0.1:{server.server_address[1]}/generateContent"
+    triage_llm.BATCH_WINDOW_SECONDS = 0
+
+    results = {}
+    try:
+        _Stub.latency = DEGRADED_LATENCY
+        triage_llm.BREAKER = triage_llm.CircuitBreaker(failures=0)
+        results["degraded/breaker_off"] = _triage(SURGE_CALLS, SURGE_THREADS)
+
+        triage_llm.BREAKER = triage_llm.CircuitBreaker(open_seconds=OPEN_SECONDS)
+        _Stub.latency = STUB_LATENCY
+        results["healthy"] = _triage(repeat, 1)
+
+        _Stub.latency = DEGRADED_LATENCY
+        results["degraded/breaker_on"] = _triage(SURGE_CALLS, SURGE_THREADS)
+
+        _Stub.latency = STUB_LATENCY
+        time.sleep(OPEN_SECONDS)
+        results["recovered"] = _triage(repeat, 1)
+    finally:
+        (triage_llm.GEMINI_API_KEY, triage_llm.GEMINI_URL, triage_llm.BREAKER,
+         triage_llm.BATCH_WINDOW_SECONDS) = saved
+        triage_model.use_data_dir(data_dir)
+        server.shutdown()
+    results["transitions"] = {state: n for (state,), n in sorted(triage_llm.TRANSITIONS._values.items())}
+    return results
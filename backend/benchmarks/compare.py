@@ -0,0 +1,51 @@
+"""
+benchmarks/compare.py
+─────────────────────────────────────────────────────────────────────────────
+Compares two result files benchmark by benchmark:
+
+  python -m benchmarks.compare results/3463009-micro-x1.json results/a1b2c3d-micro-x1.json
+
+  benchmark                        base p50    new p50    change
+  optimizer/queue_200                1.84ms     0.92ms    -50.0%
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import sys
+import json
+import argparse
+
+
+def compare(base: dict, new: dict, metric: str = "p50_ms") -> list:
+    rows = []
+    for name, stats in base["results"].items():
+        other = new["results"].get(name)
+        if not isinstance(stats, dict) or not isinstance(other, dict) or metric not in stats:
+            continue
+        before, after = stats[metric], other.get(metric, 0.0)
+        change = ((after - before) / before * 100) if before else 0.0
+        rows.append((name, before, after, change))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--metric", default="p50_ms", choices=("mean_ms", "p50_ms", "p95_ms", "min_ms"))
+    args = parser.parse_args(argv)
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if base.get("scale") != new.get("scale") or base.get("seed") != new.get("seed"):
+        print("warning: results were generated with different scale/seed", file=sys.stderr)
+
+    label = args.metric.replace("_ms", "")
+    print(f"{'benchmark':<40} {'base ' + label:>12} {'new ' + label:>12} {'change':>9}")
+    for name, before, after, change in compare(base, new, args.metric):
+        print(f"{name:<40} {before:>10.3f}ms {after:>10.3f}ms {change:>+8.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+benchmarks/endpoints.py
+─────────────────────────────────────────────────────────────────────────────
+End-to-end endpoint benchmarks against a local Postgres.
+
+The generated day is loaded into a dedicated database (BENCH_DB_NAME,
+default "ai_patient_flow_bench") on the server configured through the usual
+DB_HOST / DB_PORT / DB_USER / DB_PASSWORD variables, then each endpoint is
+driven in-process through FastAPI's TestClient (needs httpx).
+
+Write endpoints mutate the data, so every run reloads it from the seed first.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import itertools
+from collections import Counter
+
+import psycopg2
+
+import database
+from benchmarks.generator import generate, load
+from benchmarks.harness import measure
+
+BENCH_DB_NAME = os.getenv("BENCH_DB_NAME", "ai_patient_flow_bench")
+
+
+def _ensure_database(name: str):
+    admin = psycopg2.connect(**{**database.DB_CONFIG, "database": "postgres"})
+    admin.autocommit = True
+    cursor = admin.cursor()
+    cursor.execute("SELECT 1 FROM pg_database WHERE datname=%s", (name,))
+    if not cursor.fetchone():
+        cursor.execute(f'CREATE DATABASE "{name}"')
+    admin.close()
+
+
+def run(scale: float = 1, seed: int = 42, repeat: int = 30) -> dict:
+    _ensure_database(BENCH_DB_NAME)
+    database.DB_CONFIG["database"] = BENCH_DB_NAME
+
+    data = generate(scale, seed)
+    conn = database.get_connection()
+    load(conn, data)
+    conn.close()
+
+    # Imported late so every module sees the benchmark database.
+    from fastapi.testclient import TestClient
+    import main
+
+    open_appts = [a for a in data["appointments"] if a["status"] in ("scheduled", "waiting", "in-progress")]
+    busiest_id = Counter(a["doctor_id"] for a in open_appts).most_common(1)[0][0]
+    to_complete = itertools.cycle([a["appointment_id"] for a in open_appts])
+    complaints  = itertools.cycle([(a["problem_text"], a["age"]) for a in data["appointments"]])
+    patients    = itertools.cycle(data["appointments"])
+    dept_names  = dict(data["departments"])
+
+    def new_appointment():
+        a = next(patients)
+        return {"name": a["name"], "age": a["age"], "gender": a["gender"], "disability": a["disability"],
+                "contact": "9000000000", "department": dept_names[a["department_id"]],
+                "appointment_type": a["appointment_type"], "severity_score": a["severity_score"],
+                "problem_text": a["problem_text"], "appointment_time": a["appointment_time"].isoformat()}
+
+    def refresh_busiest():
+        c = database.get_connection()
+        main._refresh_queue_waiting_times(c.cursor(), busiest_id)
+        c.rollback()
+        c.close()
+
+    results = {}
+    with TestClient(main.app) as client:
+        def bench(name, fn, n=repeat):
+            results[name] = measure(fn, n)
+
+        bench("GET /dashboard/stats",               lambda: client.get("/dashboard/stats"))
+        bench("GET /appointments",                  lambda: client.get("/appointments"), max(5, repeat // 5))
+        bench("GET /doctors",                       lambda: client.get("/doctors"))
+        bench("GET /doctors/by-department",         lambda: client.get("/doctors/by-department"))
+        bench("GET /hyper-emergency/list",          lambda: client.get("/hyper-emergency/list"))
+        bench("GET /appointments/optimized-queue",  lambda: client.get(f"/appointments/optimized-queue?doctor_id={busiest_id}"))
+        bench("POST /hyper-emergency/triage",       lambda: client.post("/hyper-emergency/triage", json=dict(
+            zip(("problem_text", "age"), next(complaints)))))
+        bench("refresh/busiest_doctor",             refresh_busiest)
+        bench("POST /appointments",                 lambda: client.post("/appointments", json=new_appointment()))
+        bench("PUT /appointments/{id}/complete",    lambda: client.put(f"/appointments/{next(to_complete)}/complete"))
+        bench("POST /appointments/recalculate-all", lambda: client.post("/appointments/recalculate-all"), max(3, repeat // 10))
+
+    results["dataset"] = {"doctors": len(data["doctors"]), "appointments": len(data["appointments"]),
+                          "open_appointments": len(open_appts), "busiest_doctor_id": busiest_id}
+    return results
@@ -0,0 +1,45 @@
+"""
+benchmarks/forecast.py
+─────────────────────────────────────────────────────────────────────────────
+Arrival-forecast backtest (services/forecasting.py).
+
+Each of the last BACKTEST_DAYS days is forecast hour by hour from only
+the weeks before it, and scored against the naive "same hour last week"
+forecast. Also times one full baseline fit, which is what the forecaster
+pays once per day.
+
+  python -m benchmarks.run --suite forecast                 # synthetic arrivals
+  python -m benchmarks.run --suite forecast --source db     # DB_NAME's history
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+from datetime import date, datetime, timedelta
+
+from benchmarks.generator import arrivals
+from benchmarks.harness import measure
+from services.forecasting import BACKTEST_DAYS, HISTORY_WEEKS, backtest, load_counts, seasonal_baselines
+
+HISTORY_DAYS = HISTORY_WEEKS * 7 + BACKTEST_DAYS
+
+
+def run(scale: float = 1, seed: int = 42, repeat: int = 5, source: str = "synthetic") -> dict:
+    today = date.today()
+    if source == "db":
+        import database
+        conn = database.get_connection()
+        try:
+            midnight = datetime.combine(today, datetime.min.time())
+            counts = load_counts(conn.cursor(), midnight - timedelta(days=HISTORY_DAYS), midnight)
+        finally:
+            conn.close()
+    else:
+        counts = arrivals(HISTORY_DAYS, scale, seed, today)
+
+    results = {"source": source,
+               "departments": len(counts),
+               "arrivals": sum(sum(by_hour.values()) for by_hour in counts.values())}
+    for alpha in (0.1, 0.3, 0.5):
+        report = backtest(counts, today - timedelta(days=1), alpha=alpha)
+        results[f"alpha_{alpha}"] = {"forecast": report["forecast"], "naive_last_week": report["naive_last_week"]}
+    results["fit"] = measure(lambda: seasonal_baselines(counts, today), max(3, repeat // 10))
+    return results
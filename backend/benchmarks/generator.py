@@ -0,0 +1,285 @@
+"""
+benchmarks/generator.py
+─────────────────────────────────────────────────────────────────────────────
+Seeded synthetic hospital generator.
+
+`generate(scale, seed)` builds one hospital day as plain Python rows:
+
+  scale 1   ≈ a real day   —   ~42 doctors,    600 appointments
+  scale 10                 —  ~420 doctors,  6 000 appointments
+  scale 100                — ~4200 doctors, 60 000 appointments
+
+The same (scale, seed, day) always produces the same rows, so timings from
+different commits are measured against identical data. `load(conn, data)`
+bulk-inserts a generated day into a database created from schema.sql.
+
+`history(days, scale, seed)` builds weeks of completed visits with real
+started_at / completed_at, for the service-time backtest. True durations
+are the rules formula bent by hidden department, doctor and time-of-day
+factors plus log-normal noise — the structure the learned model should find.
+
+`arrivals(days, scale, seed)` builds hourly arrival counts per department
+for the forecast backtest: Poisson draws around HOURLY_PROFILE ×
+WEEKDAY_PROFILE × a department share, with a slow drift in volume.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import math
+import random
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from psycopg2.extras import execute_values
+
+from services.triage_llm import VALID_DEPARTMENTS
+from services import archive
+from services.rules_engine import rules_engine
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "schema.sql")
+
+# ─── SHAPE OF ONE REAL DAY ────────────────────────────────────────────────────
+APPOINTMENTS_PER_DAY = 600
+DOCTORS_PER_DEPARTMENT = (4, 8)
+
+APPOINTMENT_TYPES = [("routine", 0.60), ("follow-up", 0.25), ("emergency", 0.15)]
+STATUSES = [("completed", 0.50), ("cancelled", 0.05), ("scheduled", 0.25),
+            ("waiting", 0.15), ("in-progress", 0.05)]
+SHIFTS = [("morning", 0.5), ("afternoon", 0.35), ("night", 0.15)]
+SHIFT_START_HOURS = {"morning": 8, "afternoon": 15, "night": 20}
+
+# Arrivals per hour of day, relative. Peaks mid-morning and early afternoon.
+HOURLY_PROFILE = [1, 1, 1, 1, 1, 2, 4, 8, 12, 14, 13, 11,
+                  9, 10, 11, 10, 8, 6, 5, 4, 3, 2, 2, 1]
+
+# Arrivals per weekday, relative (Monday first). Quieter at the weekend.
+WEEKDAY_PROFILE = [1.15, 1.05, 1.0, 1.0, 1.05, 0.75, 0.6]
+
+# Complaint phrases, roughly weighted towards the departments they route to.
+COMPLAINTS = {
+    "Cardiology":  ["chest pain radiating to left arm", "palpitations since morning",
+                    "known arrhythmia, feeling dizzy", "chest pressure on exertion"],
+    "Neurology":   ["sudden numbness in right hand", "severe migraine with aura",
+                    "seizure at home", "slurred speech for an hour"],
+    "Orthopedics": ["possible fracture after fall", "ligament injury playing football",
+                    "back injury lifting boxes", "shoulder dislocation"],
+    "Pediatrics":  ["infant with high fever", "toddler not eating", "child with persistent cough"],
+    "Dermatology": ["itchy rash on arms", "eczema flare", "skin infection on leg"],
+    "General":     ["abdominal pain severe", "fever high for three days", "shortness of breath",
+                    "general weakness", "routine blood pressure check"],
+    "ICU":         ["septic shock transfer", "respiratory failure", "unresponsive patient"],
+}
+
+FIRST_NAMES = ["Aarav", "Diya", "Ishaan", "Kavya", "Rohan", "Ananya", "Vikram", "Meera",
+               "Arjun", "Sara", "Kabir", "Nisha", "Dev", "Priya", "Aditya", "Riya"]
+LAST_NAMES  = ["Sharma", "Patel", "Rath", "Das", "Iyer", "Khan", "Singh", "Nair", "Gupta", "Mishra"]
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights, k=1)[0]
+
+
+def _age(rng):
+    bucket = rng.random()
+    if bucket < 0.12:
+        return rng.randint(0, 5)
+    if bucket < 0.25:
+        return rng.randint(6, 17)
+    if bucket < 0.70:
+        return rng.randint(18, 59)
+    if bucket < 0.90:
+        return rng.randint(60, 74)
+    return rng.randint(75, 95)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# GENERATE
+# ═══════════════════════════════════════════════════════════════════════════════
+def generate(scale: float = 1, seed: int = 42, day: date | None = None) -> dict:
+    """
+    Returns {"departments", "doctors", "schedules", "patients", "appointments"}.
+    Ids are 1-based and dense, matching what SERIAL assigns on an empty DB.
+    """
+    rng = random.Random(seed)
+    day = day or date.today()
+    day_start = datetime.combine(day, datetime.min.time())
+
+    departments = [(i + 1, name) for i, name in enumerate(VALID_DEPARTMENTS)]
+
+    doctors   = []
+    schedules = []
+    by_dept   = {}
+    for dept_id, dept_name in departments:
+        lo, hi = DOCTORS_PER_DEPARTMENT
+        for _ in range(max(1, round(rng.randint(lo, hi) * scale))):
+            doctor_id = len(doctors) + 1
+            status    = "active" if rng.random() < 0.9 else "inactive"
+            doctors.append((doctor_id, f"Dr. {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                            dept_id, rng.randint(1, 30), status))
+            schedules.append((doctor_id, _weighted(rng, SHIFTS), day, status == "active"))
+            if status == "active":
+                by_dept.setdefault(dept_id, []).append(doctor_id)
+
+    dept_weights = [len(by_dept.get(dept_id, [])) for dept_id, _ in departments]
+    hours        = list(range(24))
+
+    patients     = []
+    appointments = []
+    for _ in range(int(APPOINTMENTS_PER_DAY * scale)):
+        patient_id = len(patients) + 1
+        age        = _age(rng)
+        gender     = rng.choice(["male", "female"])
+        disability = rng.random() < 0.08
+        patients.append((patient_id, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                         age, gender, disability, f"9{rng.randint(100000000, 999999999)}"))
+
+        dept_id, dept_name = rng.choices(departments, weights=dept_weights, k=1)[0]
+        doctor_id = rng.choice(by_dept[dept_id])
+        appt_type = _weighted(rng, APPOINTMENT_TYPES)
+        hour      = rng.choices(hours, weights=HOURLY_PROFILE, k=1)[0]
+        appt_time = day_start + timedelta(hours=hour, minutes=rng.randint(0, 59))
+        severity  = rng.randint(6, 10) if appt_type == "emergency" else rng.randint(1, 7)
+        hyper     = appt_type == "emergency" and rng.random() < 0.08
+
+        appointments.append({
+            "appointment_id":   len(appointments) + 1,
+            "patient_id":       patient_id,
+            "doctor_id":        doctor_id,
+            "department_id":    dept_id,
+            "appointment_time": appt_time,
+            "appointment_type": appt_type,
+            "problem_text":     rng.choice(COMPLAINTS[dept_name]),
+            "severity_score":   10 if hyper else severity,
+            "status":           _weighted(rng, STATUSES),
+            "is_hyper_emergency": hyper,
+            # Denormalised patient fields, handy for pure-Python benchmarks.
+            "name": patients[-1][1], "age": age, "gender": gender, "disability": disability,
+        })
+
+    return {
+        "departments":  departments,
+        "doctors":      doctors,
+        "schedules":    schedules,
+        "patients":     patients,
+        "appointments": appointments,
+    }
+
+
+def queue_for_doctor(data: dict, doctor_id: int) -> list:
+    """Open appointments of one doctor, shaped like RuleBasedQueueOptimizer input."""
+    return [{"id": a["appointment_id"], "name": a["name"], "age": a["age"], "gender": a["gender"],
+             "disability": a["disability"], "appointment_type": a["appointment_type"],
+             "severity_score": a["severity_score"], "arrival_time": a["appointment_time"]}
+            for a in data["appointments"]
+            if a["doctor_id"] == doctor_id and a["status"] in ("scheduled", "waiting", "in-progress")]
+
+
+def history(days: int = 30, scale: float = 1, seed: int = 42, end: date | None = None) -> list:
+    """
+    Completed visits for the `days` days before `end`, each doctor seeing
+    back-to-back patients from the start of one shift per day.
+    Returns dicts with department_id, doctor_id, appointment_type,
+    severity_score, age, disability, started_at, completed_at.
+    """
+    data = generate(scale, seed)
+    rng  = random.Random(seed + 1)
+    end  = end or date.today()
+
+    dept_factor   = {dept_id: rng.uniform(0.7, 1.4) for dept_id, _ in data["departments"]}
+    doctor_factor = {d[0]: rng.uniform(0.8, 1.25) for d in data["doctors"]}
+    hour_factor   = lambda hour: 1.15 if hour >= 20 or hour < 6 else (0.95 if hour >= 13 else 1.0)
+    doctors       = [d for d in data["doctors"] if d[4] == "active"]
+
+    visits = []
+    for offset in range(days, 0, -1):
+        day = end - timedelta(days=offset)
+        for doctor_id, _, dept_id, _, _ in doctors:
+            t = datetime.combine(day, datetime.min.time()) + timedelta(
+                hours=SHIFT_START_HOURS[_weighted(rng, SHIFTS)], minutes=rng.randint(0, 20))
+            for _ in range(rng.randint(6, 16)):
+                appt_type = _weighted(rng, APPOINTMENT_TYPES)
+                row = {"appointment_type": appt_type,
+                       "severity_score":   rng.randint(6, 10) if appt_type == "emergency" else rng.randint(1, 7),
+                       "age":              _age(rng),
+                       "disability":       rng.random() < 0.08}
+                minutes = (rules_engine.estimate_service_time(row) * dept_factor[dept_id]
+                           * doctor_factor[doctor_id] * hour_factor(t.hour) * rng.lognormvariate(0, 0.25))
+                visits.append({**row, "department_id": dept_id, "doctor_id": doctor_id,
+                               "started_at": t, "completed_at": t + timedelta(minutes=minutes)})
+                t += timedelta(minutes=minutes + rng.randint(0, 4))
+    return visits
+
+
+def _poisson(rng, lam: float) -> int:
+    if lam > 30:
+        return max(0, round(rng.gauss(lam, lam ** 0.5)))
+    limit, k, p = math.exp(-lam), 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+def arrivals(days: int = 70, scale: float = 1, seed: int = 42, end: date | None = None) -> dict:
+    """
+    {department_id: {hour datetime: arrivals}} for the `days` days before
+    `end`, shaped like services/forecasting.load_counts().
+    """
+    data  = generate(scale, seed)
+    rng   = random.Random(seed + 2)
+    end   = end or date.today()
+    per_day = APPOINTMENTS_PER_DAY * scale
+    share   = Counter(a["department_id"] for a in data["appointments"])
+    total_profile = sum(HOURLY_PROFILE)
+
+    counts = {dept_id: {} for dept_id, _ in data["departments"]}
+    for offset in range(days, 0, -1):
+        day   = end - timedelta(days=offset)
+        drift = 1 + 0.15 * math.sin(2 * math.pi * offset / 45)
+        for dept_id in counts:
+            dept_day = per_day * share[dept_id] / len(data["appointments"]) * WEEKDAY_PROFILE[day.weekday()] * drift
+            for hour, weight in enumerate(HOURLY_PROFILE):
+                n = _poisson(rng, dept_day * weight / total_profile)
+                if n:
+                    counts[dept_id][datetime.combine(day, datetime.min.time()) + timedelta(hours=hour)] = n
+    return counts
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LOAD
+# ═══════════════════════════════════════════════════════════════════════════════
+def load(conn, data: dict):
+    """Recreates the schema and bulk-inserts one generated day."""
+    cursor = conn.cursor()
+    with open(SCHEMA_PATH) as f:
+        cursor.execute(f.read())
+    archive.ensure_schema(cursor)
+
+    execute_values(cursor, "INSERT INTO departments (department_id, name) VALUES %s", data["departments"])
+    execute_values(cursor, """
+        INSERT INTO doctors (doctor_id, name, department_id, experience_years, status) VALUES %s
+    """, data["doctors"])
+    execute_values(cursor, """
+        INSERT INTO doctor_schedule (doctor_id, shift, date, availability_status) VALUES %s
+    """, data["schedules"])
+    execute_values(cursor, """
+        INSERT INTO patients (patient_id, name, age, gender, disability, contact_number) VALUES %s
+    """, data["patients"], page_size=1000)
+    execute_values(cursor, """
+        INSERT INTO appointments
+            (appointment_id, patient_id, doctor_id, department_id, appointment_time,
+             appointment_type, problem_text, severity_score, status, is_hyper_emergency)
+        VALUES %s
+    """, [(a["appointment_id"], a["patient_id"], a["doctor_id"], a["department_id"],
+           a["appointment_time"], a["appointment_type"], a["problem_text"],
+           a["severity_score"], a["status"], a["is_hyper_emergency"])
+          for a in data["appointments"]], page_size=1000)
+
+    # Explicit ids above don't advance the SERIAL sequences.
+    for table, column in (("departments", "department_id"), ("doctors", "doctor_id"),
+                          ("patients", "patient_id"), ("appointments", "appointment_id")):
+        cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), "
+                       f"(SELECT COALESCE(MAX({column}), 1) FROM {table}))")
+    cursor.execute("ANALYZE")
+    conn.commit()
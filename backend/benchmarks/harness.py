@@ -0,0 +1,87 @@
+"""
+benchmarks/harness.py
+─────────────────────────────────────────────────────────────────────────────
+Timing and result-file helpers shared by every benchmark module.
+
+Every benchmark reports the same stats dict so results from different suites
+and commits can be compared key by key:
+
+  {"n": 200, "mean_ms": 1.92, "p50_ms": 1.85, "p95_ms": 2.40, "min_ms": 1.61}
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import json
+import time
+import platform
+import subprocess
+from datetime import datetime
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def summarize(samples_seconds: list) -> dict:
+    ms = sorted(s * 1000 for s in samples_seconds)
+    return {
+        "n":       len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 4) if ms else 0.0,
+        "p50_ms":  round(percentile(ms, 0.50), 4),
+        "p95_ms":  round(percentile(ms, 0.95), 4),
+        "min_ms":  round(ms[0], 4) if ms else 0.0,
+    }
+
+
+def measure(fn, repeat: int = 50, warmup: int = 3, setup=None) -> dict:
+    """
+    Calls fn() `repeat` times and summarizes wall-clock latency.
+    `setup`, if given, runs before each call and is not timed.
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(__file__),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def write_results(suite: str, scale: float, seed: int, results: dict, out_dir: str | None = None) -> str:
+    """Writes results/<rev>-<suite>-x<scale>.json and returns the path."""
+    out_dir  = out_dir or RESULTS_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    revision = git_revision()
+    path     = os.path.join(out_dir, f"{revision}-{suite}-x{scale:g}.json")
+    with open(path, "w") as f:
+        json.dump({
+            "suite":     suite,
+            "revision":  revision,
+            "scale":     scale,
+            "seed":      seed,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python":    platform.python_version(),
+            "machine":   platform.machine(),
+            "results":   results,
+        }, f, indent=2, default=str)
+    return path
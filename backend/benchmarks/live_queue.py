@@ -0,0 +1,88 @@
+"""
+benchmarks/live_queue.py
+─────────────────────────────────────────────────────────────────────────────
+"Call next patient" from the live per-doctor heap (services/live_queue.py)
+against the old way: optimize() over the doctor's whole queue, first entry.
+
+For each of QUEUE_LENGTHS, patients drawn from the generator's mix:
+
+  next/optimize   optimize(queue)[0]         (after the doctor_queue query)
+  next/heap       live_queues.peek()         no query when in sync
+  drain/optimize  n × (optimize, drop the first): serving the whole queue
+  drain/heap      n × pop()
+
+plus "same_order": the heap pops patients in exactly optimize()'s order.
+The database round-trip the old path also paid is not included. Needs no
+database: heaps are filled with LiveQueues.load().
+
+  python -m benchmarks.run --suite live_queue
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import time
+
+from benchmarks.generator import generate
+from benchmarks.harness import measure
+from services.live_queue import LiveQueues
+from services.rules_engine import rules_engine
+
+QUEUE_LENGTHS = (20, 100, 500)
+
+
+def _rows(appointments: list, length: int) -> list:
+    """doctor_waiting columns."""
+    return [(i + 1, a["name"], a["age"], a["gender"], a["disability"], a["appointment_type"],
+             a["severity_score"], a["appointment_time"], a["is_hyper_emergency"])
+            for i, a in enumerate(appointments[:length])]
+
+
+def _patients(rows: list) -> list:
+    return [{"id": r[0], "name": r[1], "age": r[2], "gender": r[3], "disability": r[4],
+             "appointment_type": r[5], "severity_score": r[6], "arrival_time": r[7],
+             "is_hyper_emergency": r[8]} for r in rows]
+
+
+def _drain_optimize(patients: list) -> list:
+    order, remaining = [], list(patients)
+    while remaining:
+        first = rules_engine.optimize(remaining)[0]["id"]
+        order.append(first)
+        remaining = [p for p in remaining if p["id"] != first]
+    return order
+
+
+def _drain_heap(rows: list) -> list:
+    queues = LiveQueues()
+    queues.load(1, rows)
+    order = []
+    while (patient := queues.pop(1)) is not None:
+        order.append(patient["appointment_id"])
+    return order
+
+
+def run(scale: float = 1, seed: int = 42, repeat: int = 50) -> dict:
+    appointments = generate(max(scale, 1), seed)["appointments"]
+    results = {}
+    for length in QUEUE_LENGTHS:
+        if length > len(appointments):
+            continue
+        rows     = _rows(appointments, length)
+        patients = _patients(rows)
+        queues   = LiveQueues()
+        queues.load(1, rows)
+
+        start = time.perf_counter()
+        drained_optimize = _drain_optimize(patients)
+        drain_optimize_s = time.perf_counter() - start
+        start = time.perf_counter()
+        drained_heap = _drain_heap(rows)
+        drain_heap_s = time.perf_counter() - start
+
+        results[f"queue_{length}"] = {
+            "next/optimize":  measure(lambda: rules_engine.optimize(patients)[0], repeat=repeat),
+            "next/heap":      measure(lambda: queues.peek(1), repeat=repeat * 20),
+            "drain/optimize": {"total_ms": round(drain_optimize_s * 1000, 2)},
+            "drain/heap":     {"total_ms": round(drain_heap_s * 1000, 2)},
+            "same_order":     drained_heap == drained_optimize,
+        }
+    return results
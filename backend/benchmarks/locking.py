@@ -0,0 +1,222 @@
+"""
+benchmarks/locking.py
+─────────────────────────────────────────────────────────────────────────────
+Concurrency stress test for per-doctor queue locking (services/doctor_locks.py).
+
+  lost_updates   THREADS threads mutate the queues of HOT_DOCTORS doctors
+                 (hyper-emergency inserts, status changes, completions)
+                 while two refresh workers — standing in for two uvicorn
+                 processes — refresh them. Once quiet, every stored
+                 waiting_time / predicted_service_time / priority_score is
+                 compared with a from-scratch recompute, and the routing
+                 index's open counts with SQL. Run with locks off, then on.
+
+  throughput     N threads, each doing status change + synchronous refresh
+                 transactions for OPS_PER_THREAD ops: every thread on its
+                 own doctor, then all N on one doctor. Independent doctors
+                 never retry a lock and scale with N up to the cores free
+                 for Postgres and Python; one doctor serializes on its
+                 exclusive refresh lock.
+
+  python -m benchmarks.run --suite locking
+
+Needs the same local Postgres as benchmarks/endpoints.py.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import random
+import threading
+import time
+from collections import Counter
+
+import database
+from benchmarks.endpoints import BENCH_DB_NAME, _ensure_database
+from benchmarks.generator import generate, load
+
+THREADS          = 8
+HOT_DOCTORS      = 2
+OPS_PER_THREAD   = 40
+THREAD_COUNTS    = (1, 2, 4, 8)
+
+
+def _open_queue(cursor, doctor_id) -> list:
+    cursor.execute("""
+        SELECT appointment_id FROM appointments
+        WHERE doctor_id=%s AND status IN ('scheduled','waiting','in-progress') ORDER BY appointment_id
+    """, (doctor_id,))
+    return [r[0] for r in cursor.fetchall()]
+
+
+def _stored(cursor, doctor_ids) -> dict:
+    cursor.execute("""
+        SELECT appointment_id, waiting_time, predicted_service_time, priority_score FROM appointments
+        WHERE doctor_id = ANY(%s) AND status IN ('scheduled','waiting','in-progress')
+    """, (list(doctor_ids),))
+    return {r[0]: r[1:] for r in cursor.fetchall()}
+
+
+def _stale_rows(doctor_ids) -> int:
+    """Rows whose stored queue values differ from a fresh recompute (rolled back)."""
+    from services.refresh_worker import refresh_queues
+    conn = database.get_connection()
+    try:
+        cursor = conn.cursor()
+        before = _stored(cursor, doctor_ids)
+        refresh_queues(cursor, doctor_ids)
+        after  = _stored(cursor, doctor_ids)
+        return sum(before[a] != after[a] for a in after)
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+class _Workers:
+    """Spreads mark_dirty over several refresh workers, like requests over processes."""
+
+    def __init__(self, workers):
+        self.workers = workers
+
+    def mark_dirty(self, doctor_id):
+        random.choice(self.workers).mark_dirty(doctor_id)
+
+
+def _lost_updates(main, data, locked: bool, seed: int) -> dict:
+    from services import doctor_locks, refresh_worker as refresh_module
+    from services.routing_index import routing_index
+
+    conn = database.get_connection()
+    load(conn, data)
+    conn.close()
+    routing_index.reconcile()
+
+    saved = (doctor_locks.lock_doctors, doctor_locks.try_lock_doctors)
+    if not locked:
+        doctor_locks.lock_doctors     = lambda cursor, doctor_ids, shared=False, attempts=0: None
+        doctor_locks.try_lock_doctors = lambda cursor, doctor_ids: set(doctor_ids)
+
+    workers = [refresh_module.QueueRefreshWorker(debounce=0.02, max_staleness=0.1) for _ in range(2)]
+    for w in workers:
+        w.start()
+    main_worker, main.refresh_worker = main.refresh_worker, _Workers(workers)
+
+    open_by_doctor = Counter(a["doctor_id"] for a in data["appointments"]
+                             if a["status"] in ("scheduled", "waiting", "in-progress"))
+    hot   = [doctor_id for doctor_id, _ in open_by_doctor.most_common(HOT_DOCTORS)]
+    dept  = {d[0]: d[2] for d in data["doctors"]}
+    names = dict(data["departments"])
+    errors = Counter()
+
+    def mutate(thread_no):
+        rng  = random.Random(seed + thread_no)
+        conn = database.get_connection()
+        for _ in range(OPS_PER_THREAD):
+            doctor_id = rng.choice(hot)
+            queue = _open_queue(conn.cursor(), doctor_id)
+            conn.rollback()
+            op = rng.random()
+            if op < 0.3 or not queue:
+                result = main.hyper_emergency_confirm({"name": "Stress", "age": rng.randint(1, 90),
+                                                       "gender": "female", "doctor_id": doctor_id,
+                                                       "department_id": dept[doctor_id], "problem_text": "stress"})
+            elif op < 0.6:
+                result = main.complete_appointment(rng.choice(queue))
+            else:
+                result = main.update_appointment(rng.choice(queue), {
+                    "appointment_type": rng.choice(("routine", "follow-up", "emergency")),
+                    "problem_text": "stress", "department": names[dept[doctor_id]],
+                    "status": rng.choice(("scheduled", "waiting", "in-progress"))})
+            if "error" in result:
+                errors[result["error"].split(":")[0][:60]] += 1
+        conn.close()
+
+    start   = time.perf_counter()
+    threads = [threading.Thread(target=mutate, args=(i,)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    for w in workers:
+        w.stop()
+    main.refresh_worker = main_worker
+    doctor_locks.lock_doctors, doctor_locks.try_lock_doctors = saved
+
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    index_mismatch = sum(routing_index.open_count(d) != len(_open_queue(cursor, d)) for d in hot)
+    conn.close()
+    return {"locks": locked, "ops": THREADS * OPS_PER_THREAD, "seconds": round(elapsed, 2),
+            "ops_per_s": round(THREADS * OPS_PER_THREAD / elapsed, 1),
+            "stale_rows": _stale_rows(hot), "open_count_mismatches": index_mismatch,
+            "errors": dict(errors)}
+
+
+def _retries() -> int:
+    from services import doctor_locks
+    return sum(doctor_locks.WAITS._values.values())
+
+
+def _throughput(main, data, threads: int, same_doctor: bool) -> dict:
+    conn = database.get_connection()
+    load(conn, data)
+    cursor = conn.cursor()
+    open_by_doctor = Counter(a["doctor_id"] for a in data["appointments"]
+                             if a["status"] in ("scheduled", "waiting", "in-progress"))
+    doctors = [doctor_id for doctor_id, n in open_by_doctor.most_common() if n >= 3][:threads]
+    if same_doctor:
+        doctors = [doctors[0]] * threads
+    queues = {d: _open_queue(cursor, d) for d in set(doctors)}
+    conn.rollback()
+    conn.close()
+    errors = Counter()
+
+    def work(thread_no):
+        doctor_id = doctors[thread_no]
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        for i in range(OPS_PER_THREAD):
+            try:
+                dr = main._lock_appointment(cursor, queues[doctor_id][i % len(queues[doctor_id])])
+                cursor.execute("UPDATE appointments SET status=%s WHERE appointment_id=%s",
+                               (("waiting", "scheduled")[i % 2], queues[doctor_id][0]))
+                conn.commit()
+                main._refresh_queue_waiting_times(cursor, doctor_id)
+                conn.commit()
+            except Exception as exc:
+                conn.rollback()
+                errors[type(exc).__name__] += 1
+        conn.close()
+
+    retries = _retries()
+    start = time.perf_counter()
+    pool  = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    ops = threads * OPS_PER_THREAD
+    return {"ops": ops, "ops_per_s": round(ops / elapsed, 1), "lock_retries": _retries() - retries,
+            "errors": dict(errors)}
+
+
+def run(scale: float = 1, seed: int = 42, repeat: int = 1) -> dict:
+    _ensure_database(BENCH_DB_NAME)
+    database.DB_CONFIG["database"] = BENCH_DB_NAME
+    data = generate(scale, seed)
+    conn = database.get_connection()
+    load(conn, data)
+    conn.close()
+
+    # Imported late so every module sees the benchmark database.
+    import main
+    from services import metrics
+
+    results = {"lost_updates/locks_off": _lost_updates(main, data, False, seed),
+               "lost_updates/locks_on":  _lost_updates(main, data, True, seed)}
+    for n in THREAD_COUNTS:
+        results[f"throughput/independent_x{n}"] = _throughput(main, data, n, same_doctor=False)
+        results[f"throughput/same_doctor_x{n}"] = _throughput(main, data, n, same_doctor=True)
+    results["lock_metrics"] = [line for line in metrics.render().splitlines()
+                               if line.startswith("doctor_lock_") and "_bucket" not in line]
+    return results
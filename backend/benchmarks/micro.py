@@ -0,0 +1,110 @@
+"""
+benchmarks/micro.py
+─────────────────────────────────────────────────────────────────────────────
+Pure-Python microbenchmarks — no database, no network.
+
+  optimizer/queue_<n>     RuleBasedQueueOptimizer.optimize on an n-patient queue
+  optimizer/busiest       the busiest doctor's queue from the generated day
+  triage/rule_based       _rule_based_triage over the generated complaints
+  scoring/priority        PatientPriorityModel.calculate_priority per patient
+  scoring/service_time    estimate_service_time per patient
+  schedule/build          ScheduleIndex.build over SCHEDULE_DOCTORS × SCHEDULE_DAYS rows
+  schedule/on_shift       "who is on shift at t in D", bisect timeline
+  schedule/linear_scan    the same question answered by scanning every row
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import random
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from benchmarks.generator import generate, queue_for_doctor
+from benchmarks.harness import measure
+from services.queue_optimizer import RuleBasedQueueOptimizer, PatientPriorityModel, estimate_service_time
+from services.triage_llm import _rule_based_triage
+from services.schedule_index import ScheduleIndex, shift_interval
+
+QUEUE_SIZES = (10, 50, 200)
+
+SCHEDULE_DOCTORS = 1000
+SCHEDULE_DAYS    = 90
+SCHEDULE_QUERIES = 1000
+
+
+def _open_queue(data: dict, size: int) -> list:
+    """First `size` open appointments, re-labelled as one doctor's queue."""
+    open_appts = [a for a in data["appointments"] if a["status"] in ("scheduled", "waiting", "in-progress")]
+    queue = []
+    for a in open_appts[:size]:
+        queue.append({"id": a["appointment_id"], "name": a["name"], "age": a["age"],
+                      "gender": a["gender"], "disability": a["disability"],
+                      "appointment_type": a["appointment_type"],
+                      "severity_score": a["severity_score"], "arrival_time": a["appointment_time"]})
+    return queue
+
+
+def _schedule_rows(seed: int, departments: int = 8) -> list:
+    """One shift per doctor per day, ~90% available, spread over `departments`."""
+    rng   = random.Random(seed)
+    start = date.today() - timedelta(days=SCHEDULE_DAYS // 2)
+    return [(doctor_id, doctor_id % departments + 1, rng.choice(("morning", "afternoon", "night")),
+             start + timedelta(days=d), rng.random() < 0.9)
+            for doctor_id in range(1, SCHEDULE_DOCTORS + 1) for d in range(SCHEDULE_DAYS)]
+
+
+def run(scale: float = 1, seed: int = 42, repeat: int = 50) -> dict:
+    data    = generate(scale, seed)
+    results = {}
+
+    for size in QUEUE_SIZES:
+        queue = _open_queue(data, size)
+        results[f"optimizer/queue_{len(queue)}"] = measure(lambda: RuleBasedQueueOptimizer.optimize(queue), repeat)
+
+    open_per_doctor = Counter(a["doctor_id"] for a in data["appointments"]
+                              if a["status"] in ("scheduled", "waiting", "in-progress"))
+    busiest_id, busiest_n = open_per_doctor.most_common(1)[0]
+    busiest = queue_for_doctor(data, busiest_id)
+    results["optimizer/busiest"] = {**measure(lambda: RuleBasedQueueOptimizer.optimize(busiest), repeat),
+                                    "queue_size": busiest_n}
+
+    complaints = [(a["problem_text"], a["age"]) for a in data["appointments"]]
+    results["triage/rule_based"] = {
+        **measure(lambda: [_rule_based_triage(text, age) for text, age in complaints], max(5, repeat // 10)),
+        "batch": len(complaints),
+    }
+
+    appts = data["appointments"]
+    results["scoring/priority"] = {
+        **measure(lambda: [PatientPriorityModel.calculate_priority(a["age"], a["gender"], a["disability"])
+                           for a in appts], max(5, repeat // 10)),
+        "batch": len(appts),
+    }
+    results["scoring/service_time"] = {
+        **measure(lambda: [estimate_service_time(a) for a in appts], max(5, repeat // 10)),
+        "batch": len(appts),
+    }
+
+    rows  = _schedule_rows(seed)
+    index = ScheduleIndex()
+    results["schedule/build"] = {**measure(lambda: index.build(rows), max(3, repeat // 10)), "rows": len(rows)}
+
+    rng     = random.Random(seed)
+    origin  = datetime.combine(rows[0][3], datetime.min.time())
+    queries = [(rng.randint(1, 8), origin + timedelta(minutes=rng.randint(0, SCHEDULE_DAYS * 24 * 60 - 1)))
+               for _ in range(SCHEDULE_QUERIES)]
+    intervals = [(doctor_id, dept_id, shift_interval(shift, day), available)
+                 for doctor_id, dept_id, shift, day, available in rows]
+
+    def linear_scan(dept_id, at):
+        return [doctor_id for doctor_id, d, (start, end), available in intervals
+                if d == dept_id and available and start <= at < end]
+
+    results["schedule/on_shift"] = {
+        **measure(lambda: [index.on_shift(dept_id, at) for dept_id, at in queries], max(5, repeat // 5)),
+        "batch": len(queries),
+    }
+    results["schedule/linear_scan"] = {
+        **measure(lambda: [linear_scan(dept_id, at) for dept_id, at in queries[:20]], 3),
+        "batch": 20,
+    }
+    return results
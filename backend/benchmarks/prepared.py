@@ -0,0 +1,114 @@
+"""
+benchmarks/prepared.py
+─────────────────────────────────────────────────────────────────────────────
+Parse/plan savings of the query catalog (services/query_catalog.py) and the
+connection pool (database.py).
+
+For every catalog statement, on one session:
+
+  text      cursor.execute(<statement text>, params)    parse + plan each call
+  prepared  query_catalog.execute(cursor, name, params)  EXECUTE by name
+  server    Postgres' own Planning / Execution Time for both, from
+            EXPLAIN (ANALYZE, SUMMARY) after the generic plan has settled
+
+and for connections: connect + SELECT 1 + close, fresh vs pooled.
+
+  python -m benchmarks.run --suite prepared
+
+Needs the same local Postgres as benchmarks/endpoints.py.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+from collections import Counter
+
+import psycopg2
+
+import database
+from benchmarks.endpoints import BENCH_DB_NAME, _ensure_database
+from benchmarks.generator import generate, load
+from benchmarks.harness import measure
+from services import doctor_locks, query_catalog
+
+SERVER_SAMPLES = 20
+ROUNDS         = 2     # text and prepared alternate; the better round of each is kept
+
+
+def _text(name: str) -> str:
+    """The catalog statement with psycopg2 placeholders, as it used to be sent."""
+    types, statement = query_catalog.CATALOG[name]
+    for n, type_name in enumerate(types, 1):
+        cast = "::int[]" if type_name.endswith("[]") else ""
+        statement = statement.replace(f"${n}", f"%s{cast}")
+    return statement
+
+
+def _server_ms(cursor, statement: str, params: tuple) -> dict:
+    plan = execution = 0.0
+    for _ in range(SERVER_SAMPLES):
+        cursor.execute(f"EXPLAIN (ANALYZE, SUMMARY, FORMAT JSON) {statement}", params)
+        summary = cursor.fetchone()[0][0]
+        plan      += summary["Planning Time"]
+        execution += summary["Execution Time"]
+    return {"plan_ms": round(plan / SERVER_SAMPLES, 4), "execution_ms": round(execution / SERVER_SAMPLES, 4)}
+
+
+def run(scale: float = 1, seed: int = 42, repeat: int = 50) -> dict:
+    _ensure_database(BENCH_DB_NAME)
+    database.DB_CONFIG["database"] = BENCH_DB_NAME
+    data = generate(scale, seed)
+    conn = database.get_connection()
+    load(conn, data)
+    conn.close()
+
+    open_appts = [a for a in data["appointments"] if a["status"] in ("scheduled", "waiting", "in-progress")]
+    busiest    = Counter(a["doctor_id"] for a in open_appts).most_common(1)[0][0]
+    doctor_ids = sorted({d[0] for d in data["doctors"]})
+    params = {"doctor_queue":           (busiest,),
+              "doctor_queues":          (doctor_ids,),
+              "doctor_lock":            ([busiest], doctor_locks.LOCK_NAMESPACE),
+              "doctor_lock_shared":     ([busiest], doctor_locks.LOCK_NAMESPACE),
+              "appointment_doctor":     (open_appts[0]["appointment_id"],),
+              "appointment_for_update": (open_appts[0]["appointment_id"],),
+              "open_counts":            (),
+              "departments":            (),
+              "doctors":                ()}
+    calls = repeat * 10
+
+    results = {}
+    conn   = database.get_connection()
+    cursor = conn.cursor()
+    try:
+        for name in query_catalog.CATALOG:
+            text = _text(name)
+            entry = {}
+            for _ in range(ROUNDS):
+                for key, fn in (("text", lambda: cursor.execute(text, params[name]) or cursor.fetchall()),
+                                ("prepared", lambda: query_catalog.execute(cursor, name, params[name]).fetchall())):
+                    summary = measure(fn, repeat=calls)
+                    if key not in entry or summary["mean_ms"] < entry[key]["mean_ms"]:
+                        entry[key] = summary
+            # Advisory and row locks pile up inside one transaction; start clean.
+            conn.rollback()
+            call = f"{name}({', '.join(['%s'] * len(params[name]))})" if params[name] else name
+            entry["server_text"]     = _server_ms(cursor, text, params[name])
+            entry["server_prepared"] = _server_ms(cursor, f"EXECUTE {call}", params[name])
+            conn.rollback()
+            entry["speedup"] = round(entry["text"]["mean_ms"] / entry["prepared"]["mean_ms"], 2)
+            results[name] = entry
+    finally:
+        conn.close()
+
+    def fresh():
+        session = psycopg2.connect(**database.DB_CONFIG)
+        session.cursor().execute("SELECT 1")
+        session.close()
+
+    def pooled():
+        pooled_conn = database.get_connection()
+        pooled_conn.cursor().execute("SELECT 1")
+        pooled_conn.close()
+
+    results["connection/fresh"]  = measure(fresh, repeat=repeat)
+    results["connection/pooled"] = measure(pooled, repeat=repeat)
+    results["catalog_stats"] = query_catalog.stats()
+    return results
@@ -0,0 +1,107 @@
+"""
+benchmarks/queue_versions.py
+─────────────────────────────────────────────────────────────────────────────
+Queue deltas (services/queue_versions.py, GET /appointments/optimized-queue/
+changes) against re-fetching the whole optimized queue.
+
+For each of QUEUE_LENGTHS, a queue drawn from the generator's patients goes
+through STEPS, one mutation each, recomputed and recorded after every one:
+
+  hyper_emergency   a severity-10 hyper-emergency arrives
+  complete_head     the first patient is completed
+  routine_added     a routine patient arrives
+  unchanged         nothing happens (a poll with no news)
+
+Per step: response bytes (full queue vs delta), the number of changes and
+their reasons, the cost of record() + changes(), and "replayed": applying
+the delta to the client's previous order reproduces the new order and
+waits. Needs no database.
+
+  python -m benchmarks.run --suite queue_versions
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import json
+from collections import Counter
+from datetime import datetime
+
+from benchmarks.generator import generate
+from benchmarks.harness import measure
+from services.queue_versions import QueueVersions
+from services.rules_engine import rules_engine
+
+QUEUE_LENGTHS = (20, 100, 500)
+STEPS         = ("hyper_emergency", "complete_head", "routine_added", "unchanged")
+
+
+def _queue(patients: list) -> list:
+    return [{**e, "start_time": str(e["start_time"]), "end_time": str(e["end_time"])}
+            for e in rules_engine.optimize(patients)]
+
+
+def _mutate(step: str, patients: list, queue: list, next_id: int, versions: QueueVersions) -> list:
+    if step == "hyper_emergency":
+        return patients + [{"id": next_id, "name": "Hyper", "age": 45, "gender": "Male", "disability": False,
+                            "appointment_type": "emergency", "severity_score": 10,
+                            "arrival_time": datetime.now(), "is_hyper_emergency": True}]
+    if step == "complete_head":
+        head = queue[0]["id"]
+        versions.on_appointment(doctor_id=1, appointment_id=head, before="in-progress", after="completed")
+        return [p for p in patients if p["id"] != head]
+    if step == "routine_added":
+        return patients + [{"id": next_id, "name": "Routine", "age": 30, "gender": "Female", "disability": False,
+                            "appointment_type": "routine", "severity_score": 2,
+                            "arrival_time": datetime.now()}]
+    return patients
+
+
+def _replay(previous: list, changes: list) -> list:
+    """The client's side: previous queue + changes → new (id, wait) order."""
+    reported = {i for c in changes for i in c.get("ids", [c.get("id")])}
+    placed = {}
+    for position, entry in enumerate(previous, 1):
+        if entry["id"] not in reported:
+            placed[position] = (entry["id"], entry["waiting_time_minutes"])
+    for c in changes:
+        if c["change"] == "shifted":
+            for k in range(c["count"]):
+                entry = previous[c["previous_position"] - 1 + k]
+                placed[c["position"] + k] = (entry["id"],
+                                             round(entry["waiting_time_minutes"] + c["wait_delta_minutes"], 2))
+        elif c["change"] != "removed":
+            placed[c["position"]] = (c["id"], c["waiting_time_minutes"])
+    return [placed[p] for p in sorted(placed)]
+
+
+def _scenario(length: int, pool: list, repeat: int) -> dict:
+    versions = QueueVersions()
+    patients = [dict(p, id=i + 1) for i, p in enumerate(pool[:length])]
+    queue    = _queue(patients)
+    version  = versions.record(1, (0, 0), queue, patients)
+    results  = {}
+    for n, step in enumerate(STEPS):
+        patients = _mutate(step, patients, queue, 10 ** 6 + n, versions)
+        previous, queue = queue, _queue(patients)
+        cost = measure(lambda: (versions.record(1, (0, 0), queue, patients), versions.changes(1, version)),
+                       repeat=repeat)
+        delta = versions.changes(1, version)
+        results[step] = {
+            "full_bytes":  len(json.dumps({"optimized_queue": queue})),
+            "delta_bytes": len(json.dumps(delta)),
+            "changes":     Counter(c["change"] for c in delta["changes"]),
+            "reasons":     Counter(c["reason"] for c in delta["changes"]),
+            "replayed":    _replay(previous, delta["changes"])
+                           == [(e["id"], e["waiting_time_minutes"]) for e in queue],
+            "record_and_diff": cost,
+        }
+        version = delta["version"]
+    return results
+
+
+def run(scale: float = 1, seed: int = 42, repeat: int = 50) -> dict:
+    pool = [{"name": a["name"], "age": a["age"], "gender": a["gender"], "disability": a["disability"],
+             "appointment_type": a["appointment_type"], "severity_score": a["severity_score"],
+             "arrival_time": a["appointment_time"]}
+            for a in generate(max(scale, 1), seed)["appointments"]]
+    return {f"queue_{length}": _scenario(length, pool, repeat)
+            for length in QUEUE_LENGTHS if length <= len(pool)}
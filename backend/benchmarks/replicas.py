@@ -0,0 +1,123 @@
+"""
+benchmarks/replicas.py
+─────────────────────────────────────────────────────────────────────────────
+Read-replica routing (database.get_read_connection) against a real
+streaming standby. One-time setup next to the benchmark Postgres:
+
+  pg_basebackup -h <primary socket dir> -U postgres -D /tmp/pgreplica -R -X stream
+  pg_ctl -D /tmp/pgreplica -o '-p 5433 -k /tmp/pgreplica' start
+
+  DB_REPLICAS=/tmp/pgreplica:5433 DB_REPLICA_MAX_LAG_SECONDS=1 \
+  DB_REPLICA_CHECK_SECONDS=0.2 python -m benchmarks.run --suite replicas
+
+Scenarios, through the FastAPI app with two clients (a writer whose
+cookie carries its last write, and an independent reader):
+
+  fresh          reads go to the replica
+  own_write      replay paused (pg_wal_replay_pause): the writer still sees
+                 its new appointment, served by the primary; the other
+                 reader is served by the replica, without it
+  stale          still paused past DB_REPLICA_MAX_LAG_SECONDS: all reads
+                 fall back to the primary
+  resumed        replay resumed: reads return to the replica
+
+plus read-endpoint latency served from replica and from primary.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import time
+
+import psycopg2
+
+import database
+from benchmarks.endpoints import BENCH_DB_NAME, _ensure_database
+from benchmarks.generator import generate, load
+from benchmarks.harness import measure
+
+READ_PATHS = ("/appointments", "/doctors", "/dashboard/stats", "/hyper-emergency/list")
+
+NEW_APPOINTMENT = {"name": "Replica Check", "age": 30, "gender": "female", "disability": False,
+                   "contact": "0", "department": "Cardiology", "appointment_type": "routine",
+                   "problem_text": "chest pain", "appointment_time": "2026-01-01T10:00:00"}
+
+
+def _routes() -> dict:
+    return {f"{target}/{reason}": n for (target, reason), n in sorted(database.ROUTED._values.items())}
+
+
+def _ids(response) -> set:
+    return {a["appointment_id"] for a in response.json()["appointments"]}
+
+
+def _wait_for_replay(replica_conn, timeout: float = 30):
+    """Blocks until the standby has replayed the primary's current WAL position."""
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_current_wal_lsn()")
+    target = database.lsn_int(cursor.fetchone()[0])
+    conn.close()
+    deadline = time.monotonic() + timeout
+    cursor = replica_conn.cursor()
+    while time.monotonic() < deadline:
+        cursor.execute("SELECT pg_last_wal_replay_lsn()")
+        if database.lsn_int(cursor.fetchone()[0]) >= target:
+            return
+        time.sleep(0.05)
+    raise RuntimeError("standby did not catch up")
+
+
+def run(scale: float = 1, seed: int = 42, repeat: int = 50) -> dict:
+    if not database.REPLICAS:
+        raise SystemExit("set DB_REPLICAS (see benchmarks/replicas.py)")
+    _ensure_database(BENCH_DB_NAME)
+    database.DB_CONFIG["database"] = BENCH_DB_NAME
+    conn = database.get_connection()
+    load(conn, generate(scale, seed))
+    conn.close()
+
+    replica = database.REPLICAS[0]
+    control = psycopg2.connect(**replica.config())
+    control.autocommit = True
+    _wait_for_replay(control)
+    pause_for = database.REPLICA_MAX_LAG_SECONDS + 3 * database.REPLICA_CHECK_SECONDS
+
+    # Imported late so every module sees the benchmark database.
+    from fastapi.testclient import TestClient
+    import main
+
+    results = {}
+    with TestClient(main.app) as writer, TestClient(main.app) as reader:
+        time.sleep(2 * database.REPLICA_CHECK_SECONDS)
+        reader.get("/appointments")
+        results["fresh"] = _routes()
+
+        control.cursor().execute("SELECT pg_wal_replay_pause()")
+        try:
+            created = writer.post("/appointments", json=NEW_APPOINTMENT)
+            appointment_id = created.json()["appointment_id"]
+            results["own_write"] = {
+                "min_lsn":       created.headers.get(database.MIN_LSN_HEADER),
+                "writer_sees":   appointment_id in _ids(writer.get("/appointments")),
+                "reader_sees":   appointment_id in _ids(reader.get("/appointments")),
+                "routes":        _routes(),
+            }
+            time.sleep(pause_for)
+            results["stale"] = {"reader_sees": appointment_id in _ids(reader.get("/appointments")),
+                                "routes": _routes()}
+        finally:
+            control.cursor().execute("SELECT pg_wal_replay_resume()")
+        _wait_for_replay(control)
+        time.sleep(2 * database.REPLICA_CHECK_SECONDS)
+        results["resumed"] = {"reader_sees": appointment_id in _ids(reader.get("/appointments")),
+                              "routes": _routes()}
+
+        for path in READ_PATHS:
+            results[f"{path}/replica"] = measure(lambda: reader.get(path), repeat=repeat)
+        saved, database.REPLICAS = database.REPLICAS, []
+        try:
+            for path in READ_PATHS:
+                results[f"{path}/primary"] = measure(lambda: reader.get(path), repeat=repeat)
+        finally:
+            database.REPLICAS = saved
+    control.close()
+    return results
@@ -0,0 +1,78 @@
+"""
+benchmarks/run.py
+─────────────────────────────────────────────────────────────────────────────
+Benchmark entry point. Run from backend/:
+
+  python -m benchmarks.run                         # micro suite, 1× day
+  python -m benchmarks.run --suite all --scale 10  # micro + endpoints, 10× day
+  python -m benchmarks.run --suite workers --workers 1,2,4
+  python -m benchmarks.run --suite backtest [--source db]
+  python -m benchmarks.run --suite forecast [--source db]
+  python -m benchmarks.run --suite analytics
+  python -m benchmarks.run --suite locking
+  python -m benchmarks.run --suite prepared
+  DB_REPLICAS=host:port python -m benchmarks.run --suite replicas
+  python -m benchmarks.run --suite admission
+  python -m benchmarks.run --suite breaker
+  python -m benchmarks.run --suite batching
+  python -m benchmarks.run --suite triage_model
+  python -m benchmarks.run --suite aging
+  python -m benchmarks.run --suite queue_versions
+  python -m benchmarks.run --suite live_queue
+  python -m benchmarks.compare results/a.json results/b.json
+
+Each suite writes benchmarks/results/<git-rev>-<suite>-x<scale>.json.
+Endpoint benchmarks need a local Postgres (see benchmarks/endpoints.py).
+Gemini is disabled unless --with-llm is passed, so triage timings measure
+the deterministic local path.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import sys
+import json
+import argparse
+
+SUITES = ("micro", "endpoints")
+# Not part of --suite all: server processes, model backtests, the million-row
+# analytics store, the locking stress test, the prepared-statement comparison,
+# the read-replica checks, the surge test, the Gemini breaker / batching and
+# the local triage model's evaluation, the priority-aging simulation, the
+# queue-delta comparison and the live-queue "call next" comparison.
+EXTRA_SUITES = ("workers", "backtest", "forecast", "analytics", "locking", "prepared", "replicas",
+                "admission", "breaker", "batching", "triage_model", "aging", "queue_versions",
+                "live_queue")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run patient-flow benchmarks.")
+    parser.add_argument("--suite", choices=SUITES + EXTRA_SUITES + ("all",), default="micro")
+    parser.add_argument("--scale", type=float, default=1, help="1 = one real hospital day")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--out", default=None, help="results directory")
+    parser.add_argument("--workers", default="1,2,4", help="worker counts for --suite workers")
+    parser.add_argument("--source", choices=("synthetic", "db"), default="synthetic",
+                        help="history for --suite backtest / forecast")
+    parser.add_argument("--with-llm", action="store_true", help="keep GEMINI_API_KEY for triage")
+    args = parser.parse_args(argv)
+
+    if not args.with_llm:
+        os.environ["GEMINI_API_KEY"] = ""
+
+    from benchmarks.harness import write_results
+
+    suites = SUITES if args.suite == "all" else (args.suite,)
+    for suite in suites:
+        module = __import__(f"benchmarks.{suite}", fromlist=["run"])
+        extra = {"workers":  {"worker_counts": [int(n) for n in args.workers.split(",")]},
+                 "backtest": {"source": args.source},
+                 "forecast": {"source": args.source}}.get(suite, {})
+        results = module.run(scale=args.scale, seed=args.seed, repeat=args.repeat, **extra)
+        path = write_results(suite, args.scale, args.seed, results, args.out)
+        print(json.dumps(results, indent=2, default=str))
+        print(f"→ {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+-- Schema used by the benchmark database. Mirrors the columns main.py reads
+-- and writes; production tables may carry extra columns.
+-- The appointment archive is created by services/archive.ensure_schema().
+DROP TABLE IF EXISTS appointments, patients, doctor_schedule, doctors, departments,
+                     appointments_archive, appointments_archive_totals CASCADE;
+
+CREATE TABLE departments (
+    department_id SERIAL PRIMARY KEY,
+    name          VARCHAR(50) UNIQUE NOT NULL
+);
+
+CREATE TABLE doctors (
+    doctor_id        SERIAL PRIMARY KEY,
+    name             VARCHAR(100) NOT NULL,
+    department_id    INT REFERENCES departments(department_id),
+    experience_years INT,
+    status           VARCHAR(20) DEFAULT 'active'
+);
+
+CREATE TABLE doctor_schedule (
+    schedule_id         SERIAL PRIMARY KEY,
+    doctor_id           INT REFERENCES doctors(doctor_id),
+    shift               VARCHAR(20),
+    date                DATE,
+    availability_status BOOLEAN
+);
+
+CREATE TABLE patients (
+    patient_id     SERIAL PRIMARY KEY,
+    name           VARCHAR(100),
+    age            INT,
+    gender         VARCHAR(20),
+    disability     BOOLEAN,
+    contact_number VARCHAR(20)
+);
+
+CREATE TABLE appointments (
+    appointment_id         SERIAL PRIMARY KEY,
+    patient_id             INT REFERENCES patients(patient_id),
+    doctor_id              INT REFERENCES doctors(doctor_id),
+    department_id          INT REFERENCES departments(department_id),
+    appointment_time       TIMESTAMP,
+    appointment_type       VARCHAR(20),
+    problem_text           TEXT,
+    severity_score         INT,
+    priority_score         INT,
+    predicted_service_time INT,
+    waiting_time           INT,
+    status                 VARCHAR(20),
+    is_hyper_emergency     BOOLEAN DEFAULT FALSE,
+    started_at             TIMESTAMP,
+    completed_at           TIMESTAMP
+);
@@ -0,0 +1,164 @@
+"""
+benchmarks/triage_model.py
+─────────────────────────────────────────────────────────────────────────────
+Accuracy and latency of the local triage model (services/triage_model.py)
+against the keyword rules, on decisions the model did not train on.
+
+Decisions come from TRIAGE_DATA_DIR/decisions.jsonl when it holds at least
+MIN_LOGGED of them (real Gemini answers), otherwise from a synthetic
+teacher: CASES below, each phrase with an optional lead-in and time course,
+labelled with its department and urgency plus the same age adjustments a
+clinician (and the rules) apply. Two splits:
+
+  random           TEST_SHARE of decisions held out at random
+  unseen_phrases   every decision of TEST_SHARE of the phrases held out
+                   (synthetic only): complaints worded unlike anything seen
+
+Per split, on the held-out decisions:
+
+  rules            _rule_based_triage
+  model            arg-max of both heads, always answering
+  model_confident  only where triage_model.confident() (coverage = share)
+  engine           model if confident, else rules — what serving does
+                   without Gemini
+
+  accuracy = department and urgency both right. Plus train time and the
+  per-call latency of predict() vs the rules.
+
+  python -m benchmarks.run --suite triage_model
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import time
+import random
+
+from benchmarks.harness import measure
+from services import triage_model
+from services.triage_llm import _age_override, _age_urgency_boost, _rule_based_triage
+
+MIN_LOGGED = 500
+TEST_SHARE = 0.2
+SYNTHETIC  = 3000
+
+# phrase → (department, urgency); many are worded unlike the rules' keywords.
+CASES = {
+    "chest pain radiating to left arm":           ("Cardiology",  "high"),
+    "crushing pressure behind the breastbone":    ("Cardiology",  "high"),
+    "heart racing and nearly fainted":            ("Cardiology",  "high"),
+    "palpitations since morning":                 ("Cardiology",  "medium"),
+    "known arrhythmia, feeling dizzy":            ("Cardiology",  "high"),
+    "swollen ankles and breathless lying flat":   ("Cardiology",  "medium"),
+    "sudden numbness in right hand":              ("Neurology",   "critical"),
+    "face drooping on one side":                  ("Neurology",   "critical"),
+    "worst headache of my life":                  ("Neurology",   "critical"),
+    "seizure at home":                            ("Neurology",   "critical"),
+    "slurred speech for an hour":                 ("Neurology",   "critical"),
+    "tingling in the feet for weeks":             ("Neurology",   "low"),
+    "possible fracture after fall":               ("Orthopedics", "high"),
+    "cannot put weight on the ankle":             ("Orthopedics", "medium"),
+    "shoulder dislocation":                       ("Orthopedics", "high"),
+    "knee swollen after twisting it":             ("Orthopedics", "medium"),
+    "back injury lifting boxes":                  ("Orthopedics", "high"),
+    "stiff neck from sleeping badly":             ("Orthopedics", "low"),
+    "infant with high fever":                     ("Pediatrics",  "high"),
+    "toddler not eating":                         ("Pediatrics",  "medium"),
+    "child with persistent cough":                ("Pediatrics",  "medium"),
+    "baby floppy and not feeding":                ("Pediatrics",  "critical"),
+    "itchy rash on arms":                         ("Dermatology", "low"),
+    "hives and lip swelling after peanuts":       ("Dermatology", "critical"),
+    "eczema flare":                               ("Dermatology", "low"),
+    "red hot spreading patch on the shin":        ("Dermatology", "high"),
+    "mole that changed colour":                   ("Dermatology", "low"),
+    "abdominal pain severe":                      ("General",     "high"),
+    "vomiting blood":                             ("General",     "high"),
+    "fever high for three days":                  ("General",     "high"),
+    "stomach cramps since yesterday":             ("General",     "medium"),
+    "general weakness":                           ("General",     "medium"),
+    "routine blood pressure check":               ("General",     "low"),
+    "cannot catch breath, lips turning blue":     ("ICU",         "critical"),
+    "septic shock transfer":                      ("ICU",         "critical"),
+    "respiratory failure":                        ("ICU",         "critical"),
+    "unresponsive patient":                       ("ICU",         "critical"),
+    "collapsed, no pulse":                        ("ICU",         "critical"),
+}
+LEAD_INS = ("", "", "patient reports ", "c/o ", "brought in with ", "complains of ")
+COURSES  = ("", "", " since this morning", " for two days", ", getting worse", " after lunch")
+
+
+def _teacher(phrase: str, age: int) -> dict:
+    department, urgency = CASES[phrase]
+    return {"department": _age_override(age, department), "urgency_level": _age_urgency_boost(age, urgency)}
+
+
+def _synthetic(rng, phrases, n: int) -> list:
+    decisions = []
+    for _ in range(n):
+        phrase = rng.choice(phrases)
+        age    = rng.choice((rng.randint(1, 14), rng.randint(15, 64), rng.randint(15, 64), rng.randint(65, 95)))
+        text   = f"{rng.choice(LEAD_INS)}{phrase}{rng.choice(COURSES)}"
+        decisions.append({"problem_text": text, "age": age, "phrase": phrase, **_teacher(phrase, age)})
+    return decisions
+
+
+def _right(result: dict, decision: dict) -> bool:
+    return (result["department"] == decision["department"]
+            and result["urgency_level"] == decision["urgency_level"])
+
+
+def _evaluate(train_set: list, test_set: list) -> dict:
+    start = time.perf_counter()
+    model = triage_model.train(train_set)
+    train_s = time.perf_counter() - start
+
+    rules = model_right = confident = confident_right = engine_right = 0
+    for d in test_set:
+        rule_result = _rule_based_triage(d["problem_text"], d["age"] or 30)
+        prediction  = model.predict(d["problem_text"], d["age"])
+        sure        = triage_model.confident(prediction)
+        rules       += _right(rule_result, d)
+        model_right += _right(prediction, d)
+        if sure:
+            confident       += 1
+            confident_right += _right(prediction, d)
+        engine_right += _right(prediction if sure else rule_result, d)
+
+    n = len(test_set)
+    return {"train": len(train_set), "test": n, "train_s": round(train_s, 2),
+            "weights": len(model.department.weights),
+            "accuracy": {"rules":           round(rules / n, 3),
+                         "model":           round(model_right / n, 3),
+                         "model_confident": round(confident_right / confident, 3) if confident else None,
+                         "engine":          round(engine_right / n, 3)},
+            "coverage": round(confident / n, 3),
+            "model": model}
+
+
+def run(scale: float = 1, seed: int = 42, repeat: int = 50) -> dict:
+    rng = random.Random(seed)
+    logged = (triage_model.load_decisions() if os.path.exists(triage_model.DECISION_LOG) else [])
+    source = "log" if len(logged) >= MIN_LOGGED else "synthetic"
+    decisions = logged if source == "log" else _synthetic(rng, sorted(CASES), int(SYNTHETIC * scale))
+
+    rng.shuffle(decisions)
+    cut = int(len(decisions) * (1 - TEST_SHARE))
+    results = {"source": source, "decisions": len(decisions),
+               "min_confidence": triage_model.MIN_CONFIDENCE, "min_known": triage_model.MIN_KNOWN}
+    results["random"] = _evaluate(decisions[:cut], decisions[cut:])
+
+    if source == "synthetic":
+        phrases = sorted(CASES)
+        rng.shuffle(phrases)
+        held_out = set(phrases[:int(len(phrases) * TEST_SHARE)])
+        results["unseen_phrases"] = _evaluate([d for d in decisions if d["phrase"] not in held_out],
+                                              [d for d in decisions if d["phrase"] in held_out])
+        results["unseen_phrases"].pop("model")
+
+    model = results["random"].pop("model")
+    pairs = [(d["problem_text"], d["age"]) for d in decisions[cut:]]
+    cycle = iter(range(10 ** 9))
+    results["latency/model_predict"] = measure(lambda: model.predict(*pairs[next(cycle) % len(pairs)]),
+                                               repeat=repeat * 20)
+    results["latency/rules"] = measure(lambda: _rule_based_triage(pairs[next(cycle) % len(pairs)][0], 40),
+                                       repeat=repeat * 20)
+    return results
@@ -0,0 +1,217 @@
+"""
+benchmarks/workers.py
+─────────────────────────────────────────────────────────────────────────────
+Multi-worker benchmark: real uvicorn processes against a local Postgres.
+
+For each worker count N the generated day is reloaded into BENCH_DB_NAME,
+`uvicorn main:app --workers N` is started on a free port, and two things
+are measured over plain HTTP (a new connection per request, so the kernel
+spreads requests across workers):
+
+  convergence  POST /appointments on whichever worker accepts it, then poll
+               GET /departments/capacity until 3×N consecutive responses
+               show the new load. Time from the POST returning to the first
+               response of that streak = how long other workers were stale.
+  throughput   CLIENTS threads issuing a read mix (capacity, emergency
+               triage, optimized queue) for DURATION seconds → req/s, latency
+
+  python -m benchmarks.run --suite workers --workers 1,2,4
+
+Needs uvicorn and the same DB_* settings as benchmarks/endpoints.py.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import threading
+import subprocess
+import http.client
+from collections import Counter
+
+import database
+from benchmarks.endpoints import BENCH_DB_NAME, _ensure_database
+from benchmarks.generator import generate, load
+from benchmarks.harness import summarize
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CLIENTS  = 8
+DURATION = 10      # seconds of throughput load per worker count
+CONVERGENCE_TIMEOUT = 30
+
+
+# ─── HTTP ─────────────────────────────────────────────────────────────────────
+def _request(port, method, path, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        headers = {"Content-Type": "application/json", "Connection": "close"}
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"null")
+    finally:
+        conn.close()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ─── WORKERS ──────────────────────────────────────────────────────────────────
+def _start(workers: int, port: int, extra_env: dict | None = None):
+    env = dict(os.environ, DB_NAME=BENCH_DB_NAME, DB_HOST=str(database.DB_CONFIG["host"]),
+               DB_PORT=str(database.DB_CONFIG["port"]), DB_USER=database.DB_CONFIG["user"],
+               DB_PASSWORD=database.DB_CONFIG["password"], **(extra_env or {}))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, start_new_session=True)
+
+    # Every worker runs the lifespan before accepting; wait for a streak of
+    # successful requests so late starters have joined too.
+    deadline, streak = time.monotonic() + 60, 0
+    while streak < 10 * workers:
+        if time.monotonic() > deadline or proc.poll() is not None:
+            _stop(proc)
+            raise RuntimeError(f"uvicorn with {workers} workers did not come up")
+        try:
+            streak = streak + 1 if _request(port, "GET", "/")[0] == 200 else 0
+        except OSError:
+            streak = 0
+            time.sleep(0.2)
+    time.sleep(1)
+    return proc
+
+
+def _stop(proc):
+    if proc.poll() is not None:
+        return
+    os.killpg(proc.pid, signal.SIGTERM)
+    try:
+        proc.wait(15)
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGKILL)
+
+
+# ─── CONVERGENCE ──────────────────────────────────────────────────────────────
+def _loads(port, department) -> int:
+    _, body = _request(port, "GET", "/departments/capacity")
+    return next(d["load"] for d in body["departments"] if d["name"] == department)
+
+
+def _agreed_load(port, department, streak_needed) -> int:
+    streak, value = 0, None
+    deadline = time.monotonic() + CONVERGENCE_TIMEOUT
+    while streak < streak_needed:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"workers never agreed on the {department} load")
+        load_now = _loads(port, department)
+        streak, value = (streak + 1, value) if load_now == value else (1, load_now)
+    return value
+
+
+def _convergence(port, workers, new_appointment, trials) -> dict:
+    streak_needed = 3 * workers
+    samples, timeouts = [], 0
+    for _ in range(trials):
+        body = new_appointment()
+        baseline = _agreed_load(port, body["department"], streak_needed)
+
+        status, result = _request(port, "POST", "/appointments", body)
+        if status != 200 or "error" in result:
+            raise RuntimeError(f"POST /appointments failed: {result}")
+        posted = time.perf_counter()
+
+        streak_start, streak = None, 0
+        while streak < streak_needed:
+            if time.perf_counter() - posted > CONVERGENCE_TIMEOUT:
+                timeouts += 1
+                break
+            seen = time.perf_counter()
+            if _loads(port, body["department"]) == baseline + 1:
+                streak_start = streak_start if streak else seen
+                streak += 1
+            else:
+                streak_start, streak = None, 0
+        else:
+            samples.append(max(0.0, streak_start - posted))
+    return {**summarize(samples), "timeouts": timeouts}
+
+
+# ─── THROUGHPUT ───────────────────────────────────────────────────────────────
+def _throughput(port, requests_cycle, duration) -> dict:
+    latencies, errors = [], Counter()
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(seed):
+        rng, mine = random.Random(seed), []
+        while time.perf_counter() < stop_at:
+            method, path, body = rng.choice(requests_cycle)
+            start = time.perf_counter()
+            try:
+                status, _ = _request(port, method, path, body)
+                if status != 200:
+                    errors[status] += 1
+            except OSError as exc:
+                errors[type(exc).__name__] += 1
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(CLIENTS)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return {"requests_per_second": round(len(latencies) / duration, 1),
+            "latency": summarize(latencies), "errors": dict(errors)}
+
+
+# ─── ENTRY ────────────────────────────────────────────────────────────────────
+def run(scale: float = 1, seed: int = 42, repeat: int = 20, worker_counts=(1, 2, 4),
+        duration: float = DURATION) -> dict:
+    _ensure_database(BENCH_DB_NAME)
+    database.DB_CONFIG["database"] = BENCH_DB_NAME
+    data       = generate(scale, seed)
+    dept_names = dict(data["departments"])
+    open_appts = [a for a in data["appointments"] if a["status"] in ("scheduled", "waiting", "in-progress")]
+    busiest_id = Counter(a["doctor_id"] for a in open_appts).most_common(1)[0][0]
+    patients   = iter(data["appointments"] * 10)
+
+    def new_appointment():
+        a = next(patients)
+        return {"name": a["name"], "age": a["age"], "gender": a["gender"], "disability": a["disability"],
+                "contact": "9000000000", "department": dept_names[a["department_id"]],
+                "appointment_type": a["appointment_type"], "severity_score": a["severity_score"],
+                "problem_text": a["problem_text"], "appointment_time": a["appointment_time"].isoformat()}
+
+    reads = [("GET", "/departments/capacity", None),
+             ("GET", f"/appointments/optimized-queue?doctor_id={busiest_id}", None)] + [
+            ("POST", "/emergency-triage", {"problem": a["problem_text"], "age": a["age"]})
+            for a in data["appointments"][:50]]
+
+    results = {}
+    for workers in worker_counts:
+        conn = database.get_connection()
+        load(conn, data)
+        conn.close()
+
+        port = _free_port()
+        proc = _start(workers, port)
+        try:
+            results[f"workers={workers}"] = {
+                "convergence": _convergence(port, workers, new_appointment, max(3, repeat // 4)),
+                "throughput":  _throughput(port, reads, duration),
+            }
+        finally:
+            _stop(proc)
+        print(f"workers={workers}: {json.dumps(results[f'workers={workers}'])}", file=sys.stderr)
+
+    results["dataset"] = {"doctors": len(data["doctors"]), "appointments": len(data["appointments"]),
+                          "clients": CLIENTS, "duration_s": duration}
+    return results
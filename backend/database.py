@@ -1,10 +1,386 @@
+import os
+import math
+import time
+import random
+import logging
+import threading
+import contextvars
+from collections import deque
+from http.cookies import CookieError, SimpleCookie
+
 import psycopg2
+from services import metrics
+from services.metrics import TimedCursor, record_connect
+
+logger = logging.getLogger(__name__)
+
+# Overridable so benchmarks and extra workers can point at another database.
+DB_CONFIG = {
+    "host":     os.getenv("DB_HOST", "localhost"),
+    "port":     int(os.getenv("DB_PORT", "5432")),
+    "database": os.getenv("DB_NAME", "AI-PATIENT-FLOW"),
+    "user":     os.getenv("DB_USER", "postgres"),
+    "password": os.getenv("DB_PASSWORD", "subhankar"),
+}
+
+# ─── POOL ─────────────────────────────────────────────────────────────────────
+# conn.close() returns the session to a per-process pool instead of ending it,
+# so the next get_connection() skips the connect and finds the statements
+# services/query_catalog.py already prepared on it. Up to DB_POOL_SIZE idle
+# sessions are kept per database, each for at most DB_POOL_IDLE_SECONDS.
+#
+# Callers get a PooledConnection wrapping the session. After close() the
+# wrapper and its cursors are dead, exactly as a closed psycopg2 connection
+# was, so a stray rollback() can't reach the session's next borrower.
+POOL_SIZE         = int(os.getenv("DB_POOL_SIZE", "16"))
+POOL_IDLE_SECONDS = float(os.getenv("DB_POOL_IDLE_SECONDS", "300"))
+
+_pool_lock = threading.Lock()
+_idle      = {}            # DB_CONFIG snapshot → [(session, returned_at)]
+_pool_pid  = os.getpid()
+_inherited = []            # a forked parent's sessions: never used, never closed here
+
+
+class Session(psycopg2.extensions.connection):
+    """A pooled server session; `prepared` names the catalog statements it holds."""
+
+    def __init__(self, dsn, *args, **kwargs):
+        super().__init__(dsn, *args, **kwargs)
+        self.pool_key = None
+        self.prepared = set()
+
+
+class PooledConnection:
+    """One borrowing of a Session. Behaves like the psycopg2 connection it wraps."""
+
+    __slots__ = ("_session", "_cursors", "_primary")
+
+    def __init__(self, session, primary=True):
+        object.__setattr__(self, "_session", session)
+        object.__setattr__(self, "_cursors", [])
+        object.__setattr__(self, "_primary", primary)
+
+    def _live(self):
+        if self._session is None:
+            raise psycopg2.InterfaceError("connection already closed")
+        return self._session
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._live().cursor(*args, **kwargs)
+        self._cursors.append(cursor)
+        return cursor
+
+    def commit(self):
+        session = self._live()
+        session.commit()
+        floor = _read_floor.get()
+        if self._primary and REPLICAS and floor is not None:
+            cursor = session.cursor()
+            cursor.execute("SELECT pg_current_wal_lsn()")
+            floor.raise_to(lsn_int(cursor.fetchone()[0]))
+            cursor.close()
+
+    def close(self):
+        session = self._session
+        if session is None:
+            return
+        object.__setattr__(self, "_session", None)
+        for cursor in self._cursors:
+            cursor.close()
+        _release(session)
+
+    @property
+    def closed(self) -> int:
+        return 1 if self._session is None else self._session.closed
+
+    def __getattr__(self, name):
+        return getattr(self._live(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._live(), name, value)
+
+    def __enter__(self):
+        self._live().__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._live().__exit__(*exc)
+
 
 def get_connection():
-    connection = psycopg2.connect(
-        host="localhost",
-        database="AI-PATIENT-FLOW",
-        user="postgres",
-        password="subhankar"
-    )
-    return connection
\ No newline at end of file
+    """Connection to the primary; use for anything that writes."""
+    return _checkout(DB_CONFIG)
+
+
+def _checkout(config: dict, primary: bool = True) -> PooledConnection:
+    session = _acquire(_key(config))
+    if session is None:
+        start = time.perf_counter()
+        session = psycopg2.connect(**config, cursor_factory=TimedCursor, connection_factory=Session)
+        record_connect(time.perf_counter() - start)
+        session.pool_key = _key(config)
+    return PooledConnection(session, primary)
+
+
+def _key(config: dict):
+    return tuple(sorted(config.items()))
+
+
+def _acquire(key):
+    global _pool_pid
+    now = time.monotonic()
+    with _pool_lock:
+        if _pool_pid != os.getpid():
+            # Forked: the parent's sessions are not ours to use, nor to terminate.
+            _inherited.extend(_idle.values())
+            _idle.clear()
+            _pool_pid = os.getpid()
+        idle = _idle.get(key, [])
+        while idle:
+            session, returned_at = idle.pop()
+            if not session.closed and now - returned_at < POOL_IDLE_SECONDS:
+                return session
+            session.close()
+    return None
+
+
+def _release(session):
+    try:
+        if session.closed == 1:
+            return
+        if session.closed:
+            raise psycopg2.OperationalError("connection lost")
+        # LISTEN / autocommit sessions (services/events.py) aren't reusable as-is.
+        if session.autocommit:
+            raise psycopg2.InterfaceError("session state changed")
+        session.rollback()
+    except psycopg2.Error as exc:
+        session.close()
+        if isinstance(exc, psycopg2.OperationalError):
+            # The server went away; its other idle sessions are dead too.
+            with _pool_lock:
+                lost = _idle.pop(session.pool_key, [])
+            for other, _ in lost:
+                other.close()
+        return
+    with _pool_lock:
+        idle = _idle.setdefault(session.pool_key, [])
+        if len(idle) < POOL_SIZE and _pool_pid == os.getpid():
+            idle.append((session, time.monotonic()))
+            return
+    session.close()
+
+
+# ─── READ REPLICAS ────────────────────────────────────────────────────────────
+# DB_REPLICAS="host[:port],…" lists streaming standbys of the primary (same
+# database, user and password). Read-only endpoints call get_read_connection(),
+# which hands out a session on a replica that is
+#
+#   fresh      known to have replayed everything the primary had written
+#              REPLICA_MAX_LAG_SECONDS ago or later, and
+#   caught up  past the caller's own last write (read-your-writes),
+#
+# and otherwise a primary session. With no replicas configured it is
+# get_connection().
+#
+# Freshness: every REPLICA_CHECK_SECONDS a watcher thread samples the
+# primary's pg_current_wal_lsn() with the time, then each replica's
+# pg_last_wal_replay_lsn(). A replica that has replayed past the sample
+# taken at time t holds every commit before t, so its staleness is at most
+# now − t. This stays correct while the primary is idle, unlike
+# now() − pg_last_xact_replay_timestamp().
+#
+# Read-your-writes: a primary commit inside a request records the primary's
+# WAL position after it. ReadYourWritesMiddleware returns the position as the
+# X-Min-LSN header and min_lsn cookie, and reads it back from the next
+# request. A replica serves that request only once it has replayed past it.
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_CHECK_SECONDS   = float(os.getenv("DB_REPLICA_CHECK_SECONDS", "1"))
+MIN_LSN_HEADER          = "x-min-lsn"
+MIN_LSN_COOKIE          = "min_lsn"
+
+ROUTED = metrics.counter("db_read_route_total", "Read-only connections by where they went and why.",
+                         ("target", "reason"))
+LAG    = metrics.gauge("db_replica_lag_bound_seconds", "Upper bound on each replica's staleness.", ("replica",))
+
+_read_floor   = contextvars.ContextVar("read_floor", default=None)
+_watcher_pid  = None
+_watcher_lock = threading.Lock()
+
+
+def lsn_int(text) -> int:
+    high, _, low = str(text).partition("/")
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+def lsn_text(value: int) -> str:
+    return f"{value >> 32:X}/{value & 0xFFFFFFFF:X}"
+
+
+class ReadFloor:
+    """The WAL position a request's reads must include; mutable so threadpool code can raise it."""
+
+    def __init__(self, lsn: int = 0):
+        self.lsn = lsn
+
+    def raise_to(self, lsn: int):
+        self.lsn = max(self.lsn, lsn)
+
+
+class Replica:
+
+    def __init__(self, address: str):
+        host, _, port = address.strip().rpartition(":")
+        if not host:
+            host, port = port, DB_CONFIG["port"]
+        self.host, self.port = host, int(port)
+        self.name         = f"{self.host}:{self.port}"
+        self.up           = False
+        self.replay_lsn   = 0
+        self.caught_up_at = None     # time.monotonic() of the newest primary sample it has replayed
+
+    def config(self) -> dict:
+        return {**DB_CONFIG, "host": self.host, "port": self.port}
+
+    def lag(self, now: float) -> float:
+        return math.inf if self.caught_up_at is None else now - self.caught_up_at
+
+    def check(self, samples):
+        try:
+            conn = _checkout(self.config(), primary=False)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT pg_is_in_recovery(), pg_last_wal_replay_lsn()")
+                recovering, replay = cursor.fetchone()
+            finally:
+                conn.close()
+        except psycopg2.Error as exc:
+            if self.up:
+                logger.warning(f"[Replicas] {self.name} unreachable ({exc}), reads go elsewhere.")
+            self.up = False
+            return
+        # A promoted (or misconfigured) server is not following this primary.
+        self.up = bool(recovering) and replay is not None
+        if self.up:
+            self.replay_lsn   = lsn_int(replay)
+            self.caught_up_at = max((t for t, lsn in samples if lsn <= self.replay_lsn),
+                                    default=self.caught_up_at)
+        LAG.set(round(min(self.lag(time.monotonic()), 1e9), 3), self.name)
+
+
+REPLICAS = [Replica(address) for address in os.getenv("DB_REPLICAS", "").split(",") if address.strip()]
+
+
+def get_read_connection():
+    """Connection for a read-only request: a fresh, caught-up replica if there is one, else the primary."""
+    if not REPLICAS:
+        return get_connection()
+    _start_watcher()
+    floor   = _read_floor.get()
+    min_lsn = floor.lsn if floor is not None else 0
+    now     = time.monotonic()
+    fresh   = [r for r in REPLICAS if r.up and r.lag(now) <= REPLICA_MAX_LAG_SECONDS]
+    for replica in random.sample(fresh, len(fresh)):
+        try:
+            conn = _checkout(replica.config(), primary=False)
+        except psycopg2.Error:
+            replica.up = False
+            continue
+        if min_lsn > replica.replay_lsn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT pg_last_wal_replay_lsn()")
+            replica.replay_lsn = max(replica.replay_lsn, lsn_int(cursor.fetchone()[0]))
+            if min_lsn > replica.replay_lsn:
+                conn.close()
+                ROUTED.inc("primary", "own_write")
+                return get_connection()
+        ROUTED.inc("replica", "fresh")
+        return conn
+    ROUTED.inc("primary", "stale" if any(r.up for r in REPLICAS) else "down")
+    return get_connection()
+
+
+def _start_watcher():
+    global _watcher_pid
+    if _watcher_pid == os.getpid():
+        return
+    with _watcher_lock:
+        if _watcher_pid == os.getpid():
+            return
+        _watcher_pid = os.getpid()
+        samples = deque(maxlen=int(REPLICA_MAX_LAG_SECONDS / REPLICA_CHECK_SECONDS) + 2)
+        _check_replicas(samples)
+        threading.Thread(target=_watch_forever, args=(samples,), name="replica-watcher", daemon=True).start()
+
+
+def _watch_forever(samples):
+    while True:
+        time.sleep(REPLICA_CHECK_SECONDS)
+        _check_replicas(samples)
+
+
+def _check_replicas(samples):
+    try:
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT pg_current_wal_lsn()")
+            samples.append((time.monotonic(), lsn_int(cursor.fetchone()[0])))
+        finally:
+            conn.close()
+    except psycopg2.Error as exc:
+        logger.warning(f"[Replicas] primary WAL position unavailable ({exc})")
+    for replica in REPLICAS:
+        replica.check(samples)
+
+
+class ReadYourWritesMiddleware:
+    """Carries a client's last-write WAL position between its requests (header and cookie)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not REPLICAS:
+            await self.app(scope, receive, send)
+            return
+
+        floor = ReadFloor(_client_lsn(scope))
+        seen  = floor.lsn
+        token = _read_floor.set(floor)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and floor.lsn > seen:
+                value = lsn_text(floor.lsn)
+                max_age = math.ceil(REPLICA_MAX_LAG_SECONDS) + 1
+                message["headers"] = list(message.get("headers", [])) + [
+                    (MIN_LSN_HEADER.encode(), value.encode()),
+                    (b"set-cookie", f"{MIN_LSN_COOKIE}={value}; Max-Age={max_age}; Path=/; SameSite=Lax".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _read_floor.reset(token)
+
+
+def _client_lsn(scope) -> int:
+    values = []
+    for name, value in scope.get("headers", ()):
+        if name == MIN_LSN_HEADER.encode():
+            values.append(value.decode("latin-1"))
+        elif name == b"cookie":
+            try:
+                morsel = SimpleCookie(value.decode("latin-1")).get(MIN_LSN_COOKIE)
+            except CookieError:
+                continue
+            if morsel is not None:
+                values.append(morsel.value)
+    lsn = 0
+    for value in values:
+        try:
+            lsn = max(lsn, lsn_int(value))
+        except ValueError:
+            pass
+    return lsn
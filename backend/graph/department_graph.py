@@ -1,8 +1,284 @@
+"""
+graph/department_graph.py
+─────────────────────────────────────────────────────────────────────────────
+Department capacity graph.
+
+  nodes : departments — active doctors, capacity, open load
+          capacity = active doctors × MAX_PATIENTS_PER_DOCTOR, except that with
+          two or more doctors the least experienced one is on standby and
+          only takes STANDBY_MAX_PATIENTS (same rule as /doctors/by-department)
+  edges : overflow / referral paths, e.g. General → ICU, Pediatrics ↔ General,
+          each with a cost (lower = clinically preferred)
+
+Capacity queries are O(1) dict reads. The graph is kept current by events
+(services/events.py): an appointment opening or closing moves one unit of
+load, a doctor change recounts that department's active doctors.
+reconcile() reloads all loads from SQL at startup and every RECONCILE_SECONDS.
+
+overflow_plan() answers "where should the excess go?" when departments
+saturate: a min-cost max-flow from every over-capacity department, along
+its overflow edges, into departments with headroom.
+
+  source ─excess─▶ [Dept]out ─edge cost─▶ [Dept]in ─headroom─▶ sink
+
+Out/in node splitting keeps patients from being routed through a second
+department — every transfer is one direct referral.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+
+from database import get_connection
+from services import events
+from services.reference_cache import reference_cache
+from services.rules_engine import rules_engine
+
+logger = logging.getLogger(__name__)
+
+# Same limits the roster endpoint shows per doctor.
+MAX_PATIENTS_PER_DOCTOR = 15
+STANDBY_MAX_PATIENTS    = 5
+
+# load / capacity thresholds for check_capacity()
+BUSY_RATIO       = 0.8
+OVERLOADED_RATIO = 1.0
+
+RECONCILE_SECONDS = 60
+
+# (from, to, cost) — referral paths used when `from` saturates.
+OVERFLOW_EDGES = [
+    ("Pediatrics",  "General",    1),
+    ("General",     "Pediatrics", 1),
+    ("Dermatology", "General",    1),
+    ("Orthopedics", "General",    2),
+    ("Cardiology",  "ICU",        2),
+    ("Neurology",   "ICU",        2),
+    ("General",     "ICU",        3),
+]
+
+
 def sort_patients(patients):
-    for patient in patients:
-        priority = patient["priority_score"]
-        service_time = patient["predicted_time"]
-        patient["adjusted_score"] = priority / service_time
+    """Orders by priority_score / predicted_time — see RulesEngine.sort_patients."""
+    return rules_engine.sort_patients(patients)
+
+
+def department_capacity(active_doctors: int) -> int:
+    """Open-patient capacity of a department with `active_doctors` on duty.
+    With two or more doctors, the least experienced one is on standby."""
+    if active_doctors >= 2:
+        return (active_doctors - 1) * MAX_PATIENTS_PER_DOCTOR + STANDBY_MAX_PATIENTS
+    return active_doctors * MAX_PATIENTS_PER_DOCTOR
+
+
+def capacity_status(load: int, capacity: int) -> str:
+    """
+    Returns "normal", "busy" or "overloaded" for a department's open load, or
+    "closed" for one with nobody on duty and nothing open.
+    """
+    if capacity <= 0 and load <= 0:
+        return "closed"
+    if capacity <= 0 or load >= capacity * OVERLOADED_RATIO:
+        return "overloaded"
+    if load >= capacity * BUSY_RATIO:
+        return "busy"
+    return "normal"
+
+
+def check_capacity(department, load: int | None = None, capacity: int | None = None) -> str:
+    """
+    Capacity status of a department (name or id). load / capacity default to
+    the live values in the department graph.
+    """
+    node = department_graph.node(department)
+    if load is None:
+        load = node["load"] if node else 0
+    if capacity is None:
+        capacity = node["capacity"] if node else 0
+    return capacity_status(load, capacity)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# GRAPH
+# ═══════════════════════════════════════════════════════════════════════════════
+class DepartmentGraph:
+
+    def __init__(self, edges=OVERFLOW_EDGES):
+        self._lock   = threading.Lock()
+        self._edges  = list(edges)
+        self._load   = {}      # department_id → open appointments
+        self._active = {}      # department_id → active doctors
+        self._loaded = False
+
+    # ── Loading ──────────────────────────────────────────────────────────────
+    def reconcile(self, cursor=None):
+        own_conn = None
+        if cursor is None:
+            own_conn = get_connection()
+            cursor   = own_conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT department_id, COUNT(*) FROM appointments
+                WHERE status IN ('scheduled','waiting','in-progress')
+                GROUP BY department_id
+            """)
+            load = dict(cursor.fetchall())
+        finally:
+            if own_conn is not None:
+                own_conn.close()
+
+        active = {dept_id: self._count_active(dept_id) for dept_id in reference_cache.departments().values()}
+        with self._lock:
+            self._load   = load
+            self._active = active
+            self._loaded = True
+
+    def start_reconciler(self):
+        thread = threading.Thread(target=self._reconcile_forever, name="graph-reconciler", daemon=True)
+        thread.start()
+        return thread
+
+    def _reconcile_forever(self):
+        while True:
+            time.sleep(RECONCILE_SECONDS)
+            try:
+                self.reconcile()
+            except Exception as exc:
+                logger.warning(f"[DeptGraph] reconcile failed: {exc}")
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.reconcile()
+
+    @staticmethod
+    def _count_active(department_id) -> int:
+        return sum(1 for d in reference_cache.doctors_in_department(department_id) if d["status"] == "active")
+
+    # ── Capacity queries ─────────────────────────────────────────────────────
+    def node(self, department):
+        """{department_id, name, active_doctors, capacity, load, headroom, status} or None."""
+        self._ensure_loaded()
+        dept_id = department if isinstance(department, int) else reference_cache.department_id(department)
+        if dept_id is None:
+            return None
+        active   = self._active.get(dept_id, 0)
+        capacity = department_capacity(active)
+        load     = self._load.get(dept_id, 0)
+        return {"department_id": dept_id, "name": reference_cache.department_name(dept_id),
+                "active_doctors": active, "capacity": capacity, "load": load,
+                "headroom": capacity - load, "status": capacity_status(load, capacity)}
+
+    def capacity(self, department) -> int:
+        node = self.node(department)
+        return node["capacity"] if node else 0
+
+    def nodes(self) -> list:
+        return [self.node(dept_id) for dept_id in sorted(reference_cache.departments().values())]
+
+    def edges(self) -> list:
+        return [{"from": a, "to": b, "cost": cost} for a, b, cost in self._edges]
+
+    # ── Overflow routing ─────────────────────────────────────────────────────
+    def overflow_plan(self) -> dict:
+        """
+        Min-cost max-flow of excess load along overflow edges.
+        Returns {"transfers": [{from, to, patients, cost}], "unplaced": {dept: n}}.
+        """
+        nodes    = {n["name"]: n for n in self.nodes()}
+        excess   = {name: -n["headroom"] for name, n in nodes.items() if n["headroom"] < 0}
+        headroom = {name: n["headroom"] for name, n in nodes.items() if n["headroom"] > 0}
+        if not excess:
+            return {"transfers": [], "unplaced": {}}
+
+        flow = _MinCostFlow()
+        for name, n in excess.items():
+            flow.add_edge("source", ("out", name), n, 0)
+        for name, n in headroom.items():
+            flow.add_edge(("in", name), "sink", n, 0)
+        for a, b, cost in self._edges:
+            if a in excess and b in headroom:
+                flow.add_edge(("out", a), ("in", b), excess[a], cost)
+        flow.solve("source", "sink")
+
+        transfers = []
+        placed    = {}
+        for (u, v), (sent, cost) in flow.flows().items():
+            if isinstance(u, tuple) and isinstance(v, tuple) and sent > 0:
+                transfers.append({"from": u[1], "to": v[1], "patients": sent, "cost": cost})
+                placed[u[1]] = placed.get(u[1], 0) + sent
+        unplaced = {name: n - placed.get(name, 0) for name, n in excess.items() if n - placed.get(name, 0) > 0}
+        transfers.sort(key=lambda t: (t["from"], t["cost"]))
+        return {"transfers": transfers, "unplaced": unplaced}
+
+    # ── Event handlers ───────────────────────────────────────────────────────
+    def on_appointment(self, department_id=None, before=None, after=None, before_department_id=None, **_):
+        if not self._loaded:
+            return
+        old_dept = before_department_id if before_department_id is not None else department_id
+        with self._lock:
+            if events.is_open(before) and old_dept is not None:
+                self._load[old_dept] = max(0, self._load.get(old_dept, 0) - 1)
+            if events.is_open(after) and department_id is not None:
+                self._load[department_id] = self._load.get(department_id, 0) + 1
+
+    def on_doctor(self, doctor_id, **_):
+        if not self._loaded:
+            return
+        doctor = reference_cache.doctor(doctor_id)
+        if doctor is None:
+            return
+        dept_id = doctor["department_id"]
+        with self._lock:
+            self._active[dept_id] = self._count_active(dept_id)
+
+
+# ─── MIN-COST FLOW ────────────────────────────────────────────────────────────
+class _MinCostFlow:
+    """Successive shortest paths (Bellman-Ford queue). Fine for tens of nodes."""
+
+    def __init__(self):
+        self.graph = {}     # node → list of edge indices
+        self.to, self.cap, self.cost, self.orig = [], [], [], []
+
+    def _node(self, n):
+        self.graph.setdefault(n, [])
+
+    def add_edge(self, u, v, capacity, cost):
+        self._node(u); self._node(v)
+        for a, b, c, w in ((u, v, capacity, cost), (v, u, 0, -cost)):
+            self.graph[a].append(len(self.to))
+            self.to.append(b); self.cap.append(c); self.cost.append(w); self.orig.append((a, b, c))
+
+    def solve(self, source, sink):
+        while True:
+            dist, prev = {source: 0}, {}
+            queue, in_queue = deque([source]), {source}
+            while queue:
+                u = queue.popleft(); in_queue.discard(u)
+                for e in self.graph[u]:
+                    if self.cap[e] > 0 and dist[u] + self.cost[e] < dist.get(self.to[e], float("inf")):
+                        dist[self.to[e]] = dist[u] + self.cost[e]
+                        prev[self.to[e]] = e
+                        if self.to[e] not in in_queue:
+                            queue.append(self.to[e]); in_queue.add(self.to[e])
+            if sink not in dist:
+                return
+            push, v = float("inf"), sink
+            while v != source:
+                e = prev[v]; push = min(push, self.cap[e]); v = self.to[e ^ 1]
+            v = sink
+            while v != source:
+                e = prev[v]; self.cap[e] -= push; self.cap[e ^ 1] += push; v = self.to[e ^ 1]
+
+    def flows(self) -> dict:
+        """(u, v) → (units sent, cost per unit) for every forward edge."""
+        return {(a, b): (c - self.cap[e], self.cost[e])
+                for e, (a, b, c) in enumerate(self.orig) if e % 2 == 0}
+
 
-    sorted_patients = sorted(patients, key=lambda x: x["adjusted_score"], reverse=True)
-    return sorted_patients
\ No newline at end of file
+department_graph = DepartmentGraph()
+events.subscribe("appointment", department_graph.on_appointment)
+events.subscribe("doctor", department_graph.on_doctor)
+events.subscribe("resync", department_graph.reconcile)
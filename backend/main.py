@@ -1,18 +1,100 @@
+import json
+import logging
+import threading
+import contextvars
+from datetime import date, datetime
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from database import get_connection
-from services.triage_llm import classify_department_llm
-from services.queue_optimizer import RuleBasedQueueOptimizer, estimate_service_time, PatientPriorityModel
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from database import get_connection, get_read_connection, ReadYourWritesMiddleware
+from services.triage_llm import classify_department_llm, classify_department_rules
+from services.queue_optimizer import RuleBasedQueueOptimizer, PatientPriorityModel
+from services.reference_cache import reference_cache
+from services.routing_index import routing_index
+from services.rules_engine import rules_engine
+from services.refresh_worker import refresh_worker, refresh_queues
+from services.schedule_index import schedule_index
+from services.queue_versions import queue_versions
+from services.live_queue import live_queues, POPS as LIVE_QUEUE_POPS
+from services.service_time_model import service_time_model
+from services.analytics_store import analytics_store
+from services import archive, doctor_locks, events, metrics, query_catalog
+from services.admission import AdmissionMiddleware
+from routes import appointments as appointment_routes, triage as triage_routes, forecast as forecast_routes
+from routes import archive as archive_routes, analytics as analytics_routes
+from graph.department_graph import department_graph, MAX_PATIENTS_PER_DOCTOR, STANDBY_MAX_PATIENTS
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    reference_cache.warm()
+    events.start_bus()
+    try:
+        _ensure_schema()
+        service_time_model.fit()
+    except Exception as exc:
+        logger.warning(f"[Startup] service-time model not fitted ({exc}), using the rules formula.")
+    for index in (routing_index, department_graph, schedule_index):
+        try:
+            index.reconcile()
+        except Exception as exc:
+            logger.warning(f"[Startup] {type(index).__name__} not loaded ({exc}), will load on first use.")
+        index.start_reconciler()
+    # Re-score stored queues only if the rules changed since the last deploy.
+    threading.Thread(target=_rescore_if_rules_changed, name="rules-rescore", daemon=True).start()
+    rules_engine.start_watcher(on_change=_rescore_if_rules_changed)
+    refresh_worker.start()
+    archive.start()
+    analytics_store.start()
+    yield
+    refresh_worker.stop()
+
+
+def _ensure_schema():
+    """Columns and tables added after the original schema; no-ops once they exist."""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            ALTER TABLE appointments
+                ADD COLUMN IF NOT EXISTS is_hyper_emergency BOOLEAN DEFAULT FALSE,
+                ADD COLUMN IF NOT EXISTS started_at   TIMESTAMP,
+                ADD COLUMN IF NOT EXISTS completed_at TIMESTAMP
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS appointments_open_doctor_idx
+                ON appointments (doctor_id) WHERE status IN ('scheduled','waiting','in-progress')
+        """)
+        archive.ensure_schema(cursor)
+        conn.commit()
+    finally:
+        conn.close()
 
-app = FastAPI()
 
+app = FastAPI(lifespan=lifespan)
+
+# Innermost: shed 503s still get CORS headers and show up in the metrics.
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Min-LSN"],
 )
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
+app.include_router(appointment_routes.router)
+app.include_router(triage_routes.router)
+app.include_router(forecast_routes.router)
+app.include_router(archive_routes.router)
+app.include_router(analytics_routes.router)
 
 
 @app.get("/")
@@ -20,79 +102,184 @@ def root():
     return {"message": "Backend Running"}
 
 
+# ─── PROMETHEUS METRICS ───────────────────────────────────────────────────────
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/queries")
+def get_query_metrics():
+    return {"queries": query_catalog.stats()}
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 # RECALCULATE ALL — run once after deploy to fix existing rows
 # POST /appointments/recalculate-all
 # ═══════════════════════════════════════════════════════════════════════════════
 @app.post("/appointments/recalculate-all")
 def recalculate_all_waiting_times():
+    try:
+        doctors_processed, updated = _recalculate_all()
+        return {
+            "message":              "Recalculated successfully",
+            "doctors_processed":    doctors_processed,
+            "appointments_updated": updated,
+        }
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _recalculate_all(chunk: int = 50) -> tuple:
+    """
+    Re-scores every open queue, `chunk` doctors per short transaction on its
+    own connection. Doctors locked by a writer right now are handed to
+    refresh_worker rather than failing the run or stalling the writer.
+    """
     conn   = get_connection()
     cursor = conn.cursor()
+    busy   = []
     try:
         cursor.execute(
             "SELECT DISTINCT doctor_id FROM appointments "
             "WHERE status IN ('scheduled', 'waiting', 'in-progress')"
         )
-        doctor_ids = [row[0] for row in cursor.fetchall()]
-        updated    = sum(_refresh_queue_waiting_times(cursor, did) for did in doctor_ids)
+        doctor_ids = sorted(row[0] for row in cursor.fetchall())
         conn.commit()
-        conn.close()
-        return {
-            "message":              "Recalculated successfully",
-            "doctors_processed":    len(doctor_ids),
-            "appointments_updated": updated,
-        }
-    except Exception as e:
+        updated = 0
+        for i in range(0, len(doctor_ids), chunk):
+            batch  = doctor_ids[i:i + chunk]
+            locked = doctor_locks.try_lock_doctors(cursor, batch)
+            with metrics.timed("queue_refresh"):
+                updated += refresh_queues(cursor, locked, lock=False)
+            conn.commit()
+            busy += [doctor_id for doctor_id in batch if doctor_id not in locked]
+    except Exception:
         conn.rollback()
+        raise
+    finally:
         conn.close()
-        return {"error": str(e)}
+        for doctor_id in busy:
+            refresh_worker.mark_dirty(doctor_id)
+    return len(doctor_ids), updated
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
-# HYPER EMERGENCY — STEP 1: LLM Triage
+# RULES — scoring weights and thresholds (services/rules.json)
+# GET  /rules          current rules and version
+# POST /rules/reload   body = new rules (persisted to RULES_OVERRIDE_PATH, not
+#                      the tracked file), or empty = re-read the active file
 # ═══════════════════════════════════════════════════════════════════════════════
-@app.post("/hyper-emergency/triage")
-def hyper_emergency_triage(data: dict):
-    age          = data.get("age")
-    problem_text = data.get("problem_text", "")
+@app.get("/rules")
+def get_rules():
+    return {"version": rules_engine.version, "rules": rules_engine.rules}
 
-    triage     = classify_department_llm(problem_text, age)
-    department = triage.get("department", "General")
 
+@app.post("/rules/reload")
+def reload_rules(data: dict | None = None):
+    try:
+        changed = rules_engine.load(data, persist=True) if data else rules_engine.reload()
+    except ValueError as e:
+        return {"error": str(e)}
+    if changed:
+        events.publish("rules", version=rules_engine.version)
+    rescored = _rescore_if_rules_changed()
+    return {"version": rules_engine.version, "changed": changed, "queues_rescored": rescored}
+
+
+def _rescore_if_rules_changed() -> bool:
+    """
+    Re-scores every open queue once per rules version, across all workers.
+    The rules_state row lock makes concurrent workers wait, then skip; the
+    queues themselves are re-scored on a second connection, chunk by chunk.
+    """
     conn   = get_connection()
     cursor = conn.cursor()
+    try:
+        cursor.execute("CREATE TABLE IF NOT EXISTS rules_state (id INT PRIMARY KEY, version TEXT)")
+        cursor.execute("INSERT INTO rules_state (id, version) VALUES (1, '') ON CONFLICT (id) DO NOTHING")
+        conn.commit()
+        cursor.execute("SELECT version FROM rules_state WHERE id=1 FOR UPDATE")
+        if cursor.fetchone()[0] == rules_engine.version:
+            conn.rollback(); conn.close(); return False
 
-    cursor.execute("SELECT department_id FROM departments WHERE name = %s", (department,))
-    dept_row = cursor.fetchone()
-    if not dept_row:
-        cursor.execute("SELECT department_id FROM departments WHERE name = 'General'")
-        dept_row = cursor.fetchone()
-    department_id = dept_row[0]
+        doctors_processed, updated = _recalculate_all()
+        cursor.execute("UPDATE rules_state SET version=%s WHERE id=1", (rules_engine.version,))
+        conn.commit(); conn.close()
+        logger.info(f"[Rules] {rules_engine.version}: re-scored {updated} appointments "
+                    f"across {doctors_processed} doctors")
+        return True
+    except Exception as e:
+        conn.rollback(); conn.close()
+        logger.warning(f"[Rules] re-score failed: {e}")
+        return False
 
-    cursor.execute("""
-        SELECT d.doctor_id, d.name, dep.name, COALESCE(COUNT(a.appointment_id),0), d.experience_years
-        FROM doctors d
-        JOIN departments dep ON d.department_id = dep.department_id
-        LEFT JOIN appointments a
-            ON d.doctor_id = a.doctor_id AND a.status IN ('scheduled','waiting','in-progress')
-        WHERE d.department_id = %s AND d.status = 'active'
-        GROUP BY d.doctor_id, d.name, dep.name, d.experience_years
-        ORDER BY 4 ASC, d.experience_years DESC
-    """, (department_id,))
-
-    rows    = cursor.fetchall()
-    conn.close()
-    doctors = [{"doctor_id":r[0],"name":r[1],"department":r[2],"patients":r[3],"experience_years":r[4],"rank":i+1}
-               for i, r in enumerate(rows)]
 
-    return {
+# ─── SERVICE-TIME MODEL ───────────────────────────────────────────────────────
+# Learned multipliers over the rules formula (services/service_time_model.py)
+@app.get("/service-time/model")
+def get_service_time_model():
+    return {"rules_version": rules_engine.version, "multipliers": service_time_model.table()}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# HYPER EMERGENCY — STEP 1: LLM Triage
+# ═══════════════════════════════════════════════════════════════════════════════
+# Two concurrent stages: classification (LLM or rules) and the doctor rankings
+# of EVERY department. Once both finish, picking the department is a lookup.
+#
+# mode="provisional" streams NDJSON instead: the rule-based result and its
+# doctors go out immediately, the LLM refinement follows as a second line.
+#   {"stage":"provisional", ...}\n{"stage":"final", ...}\n
+_triage_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="triage")
+
+
+def _all_department_rankings() -> dict:
+    return {name: routing_index.ranked(dept_id) for name, dept_id in reference_cache.departments().items()}
+
+
+def _triage_response(triage: dict, rankings: dict, stage: str | None = None) -> dict:
+    department = triage.get("department", "General")
+    if department in rankings:
+        department_id = reference_cache.department_id(department)
+        doctors       = rankings[department]
+    else:
+        department_id = reference_cache.department_id("General")
+        doctors       = rankings.get("General", [])
+
+    response = {
         "department":         department,
         "department_id":      department_id,
         "reasoning":          triage.get("reasoning", ""),
         "urgency_level":      triage.get("urgency_level", "high"),
+        "source":             triage.get("source", ""),
         "doctors":            doctors,
         "recommended_doctor": doctors[0] if doctors else None,
     }
+    if stage:
+        response["stage"] = stage
+    return response
+
+
+@app.post("/hyper-emergency/triage")
+def hyper_emergency_triage(data: dict):
+    age          = data.get("age")
+    problem_text = data.get("problem_text", "")
+
+    # copy_context() keeps the per-request metrics profile attached to both stages.
+    triage_future   = _triage_pool.submit(contextvars.copy_context().run, classify_department_llm, problem_text, age)
+    rankings_future = _triage_pool.submit(contextvars.copy_context().run, _all_department_rankings)
+
+    if data.get("mode") != "provisional":
+        return _triage_response(triage_future.result(), rankings_future.result())
+
+    def stream():
+        rankings    = rankings_future.result()
+        provisional = classify_department_rules(problem_text, age)
+        yield json.dumps(_triage_response(provisional, rankings, "provisional")) + "\n"
+        yield json.dumps(_triage_response(triage_future.result(), rankings, "final")) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -103,40 +290,44 @@ def hyper_emergency_confirm(data: dict):
     conn   = get_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("ALTER TABLE appointments ADD COLUMN IF NOT EXISTS is_hyper_emergency BOOLEAN DEFAULT FALSE")
-
         cursor.execute("""
             INSERT INTO patients (name, age, gender, disability, contact_number)
             VALUES (%s,%s,%s,%s,%s) RETURNING patient_id
         """, (data.get("name"), data.get("age",0), data.get("gender","Unknown"),
               bool(data.get("disability",False)), data.get("contact","")))
         patient_id = cursor.fetchone()[0]
+        doctor_locks.lock_doctors(cursor, [data["doctor_id"]], shared=True)
 
         priority_score, priority_level = PatientPriorityModel.calculate_priority(
             age=data.get("age",0), gender=data.get("gender",""),
             disability=bool(data.get("disability",False)),
         )
-        predicted_service_time = estimate_service_time({
-            "appointment_type":"emergency","severity_score":10,
-            "age":data.get("age",0),"disability":bool(data.get("disability",False)),
+        waiting_time, predicted_service_time = _preview_waiting_time(cursor, data["doctor_id"], {
+            "name":data.get("name"),"age":data.get("age",0),"gender":data.get("gender",""),
+            "disability":bool(data.get("disability",False)),
+            "appointment_type":"emergency","severity_score":10,"arrival_time":None,
+            "is_hyper_emergency":True,
         })
 
         cursor.execute("""
             INSERT INTO appointments
                 (patient_id,doctor_id,department_id,appointment_time,appointment_type,
-                 problem_text,severity_score,priority_score,predicted_service_time,status,is_hyper_emergency)
-            VALUES (%s,%s,%s,NOW(),'emergency',%s,10,%s,%s,'scheduled',TRUE)
+                 problem_text,severity_score,priority_score,predicted_service_time,waiting_time,
+                 status,is_hyper_emergency)
+            VALUES (%s,%s,%s,NOW(),'emergency',%s,10,%s,%s,%s,'scheduled',TRUE)
             RETURNING appointment_id
         """, (patient_id, data["doctor_id"], data["department_id"],
-              data.get("problem_text"), priority_score, predicted_service_time))
+              data.get("problem_text"), priority_score, predicted_service_time, waiting_time))
         appointment_id = cursor.fetchone()[0]
-
-        _refresh_queue_waiting_times(cursor, data["doctor_id"])
         conn.commit()
         conn.close()
+        refresh_worker.mark_dirty(data["doctor_id"])
+        events.publish("appointment", appointment_id=appointment_id, doctor_id=data["doctor_id"],
+                       department_id=data["department_id"], before=None, after="scheduled")
         return {"message":"Hyper emergency created","appointment_id":appointment_id,
                 "priority_level":priority_level,"priority_score":priority_score,
-                "predicted_service_time":predicted_service_time}
+                "predicted_service_time":predicted_service_time,"waiting_time":waiting_time,
+                "queue_refresh":"queued"}
     except Exception as e:
         conn.rollback(); conn.close(); return {"error": str(e)}
 
@@ -146,11 +337,8 @@ def hyper_emergency_confirm(data: dict):
 # ═══════════════════════════════════════════════════════════════════════════════
 @app.get("/hyper-emergency/list")
 def hyper_emergency_list():
-    conn   = get_connection()
+    conn   = get_read_connection()
     cursor = conn.cursor()
-    cursor.execute("ALTER TABLE appointments ADD COLUMN IF NOT EXISTS is_hyper_emergency BOOLEAN DEFAULT FALSE")
-    conn.commit()
-
     cursor.execute("""
         SELECT a.appointment_id, p.name, p.age, d.name, d.doctor_id,
                dep.name, a.problem_text, a.severity_score, a.status, a.appointment_time
@@ -192,7 +380,7 @@ def hyper_emergency_list():
 # ─── GET ALL APPOINTMENTS ─────────────────────────────────────────────────────
 @app.get("/appointments")
 def get_appointments():
-    conn   = get_connection()
+    conn   = get_read_connection()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT a.appointment_id, p.name, p.age, p.gender, p.disability, p.contact_number,
@@ -223,6 +411,9 @@ def get_appointments():
 # ─── ADD NEW APPOINTMENT ──────────────────────────────────────────────────────
 @app.post("/appointments")
 def add_appointment(data: dict):
+    department_id = reference_cache.department_id(data["department"])
+    if department_id is None: return {"error":"Department not found"}
+
     conn   = get_connection()
     cursor = conn.cursor()
     try:
@@ -232,70 +423,45 @@ def add_appointment(data: dict):
         """, (data["name"],data["age"],data["gender"],data["disability"],data["contact"]))
         patient_id = cursor.fetchone()[0]
 
-        cursor.execute("SELECT department_id FROM departments WHERE name=%s",(data["department"],))
-        dept_row = cursor.fetchone()
-        if not dept_row: conn.close(); return {"error":"Department not found"}
-        department_id = dept_row[0]
-
-        cursor.execute("""
-            SELECT d.doctor_id FROM doctors d
-            LEFT JOIN appointments a ON d.doctor_id=a.doctor_id AND a.status IN ('scheduled','waiting','in-progress')
-            WHERE d.department_id=%s AND d.status='active'
-            GROUP BY d.doctor_id ORDER BY COUNT(a.appointment_id) ASC, d.experience_years DESC LIMIT 1
-        """, (department_id,))
-        doctor_row = cursor.fetchone()
-        if not doctor_row: conn.close(); return {"error":"No active doctor found"}
-        doctor_id = doctor_row[0]
+        # Least-loaded doctor on shift at the appointment time; any active
+        # doctor if nobody in the department is scheduled then.
+        appt_time_raw = data["appointment_time"]
+        appt_at   = datetime.fromisoformat(appt_time_raw) if isinstance(appt_time_raw,str) else appt_time_raw
+        if appt_at.tzinfo is not None:      # shifts are in server-local time
+            appt_at = appt_at.astimezone().replace(tzinfo=None)
+        on_shift  = set(schedule_index.on_shift(department_id, appt_at, cursor=cursor))
+        doctor_id = routing_index.least_loaded(department_id, cursor, among=on_shift)
+        if doctor_id is None: doctor_id = routing_index.least_loaded(department_id, cursor)
+        if doctor_id is None: conn.rollback(); conn.close(); return {"error":"No active doctor found"}
+        doctor_locks.lock_doctors(cursor, [doctor_id], shared=True)
 
         age = int(data["age"]); gender = str(data["gender"]); disability = bool(data["disability"])
         severity_score = int(data.get("severity_score",5))
 
         priority_score, priority_level = PatientPriorityModel.calculate_priority(age, gender, disability)
-        predicted_service_time = estimate_service_time({
-            "appointment_type": data.get("appointment_type","routine"),
-            "severity_score": severity_score, "age": age, "disability": disability,
-        })
-
-        # Get current queue to compute new patient's position-based wait time
-        cursor.execute("""
-            SELECT a.appointment_id, p.name, p.age, p.gender, p.disability,
-                   a.appointment_type, a.severity_score, a.appointment_time
-            FROM appointments a JOIN patients p ON a.patient_id=p.patient_id
-            WHERE a.doctor_id=%s AND a.status IN ('scheduled','waiting','in-progress')
-        """, (doctor_id,))
-        queue_rows = cursor.fetchall()
-
-        from datetime import datetime as dt
-        appt_time_raw = data["appointment_time"]
-        new_arrival = dt.fromisoformat(appt_time_raw) if isinstance(appt_time_raw,str) else appt_time_raw
-
-        queue_patients = [{"id":r[0],"name":r[1],"age":r[2],"gender":r[3],"disability":r[4],
-                           "appointment_type":r[5],"severity_score":r[6],"arrival_time":r[7]}
-                          for r in queue_rows] + [{
-            "id":-1,"name":data["name"],"age":age,"gender":gender,"disability":disability,
+        waiting_time, predicted_service_time = _preview_waiting_time(cursor, doctor_id, {
+            "name":data["name"],"age":age,"gender":gender,"disability":disability,
             "appointment_type":data.get("appointment_type","routine"),
-            "severity_score":severity_score,"arrival_time":new_arrival,
-        }]
-
-        optimized    = RuleBasedQueueOptimizer.optimize(queue_patients)
-        slot         = next((q for q in optimized if q["id"]==-1), None)
-        waiting_time = slot["waiting_time_minutes"] if slot else 0
+            "severity_score":severity_score,"arrival_time":appt_at,
+        })
 
         cursor.execute("""
             INSERT INTO appointments
                 (patient_id,doctor_id,department_id,appointment_time,appointment_type,
                  problem_text,severity_score,priority_score,predicted_service_time,waiting_time,status)
             VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,'scheduled') RETURNING appointment_id
-        """, (patient_id,doctor_id,department_id,appt_time_raw,
+        """, (patient_id,doctor_id,department_id,appt_at,
               data.get("appointment_type","routine"),data["problem_text"],
               severity_score,priority_score,predicted_service_time,waiting_time))
         appointment_id = cursor.fetchone()[0]
-
-        _refresh_queue_waiting_times(cursor, doctor_id)
         conn.commit(); conn.close()
+        refresh_worker.mark_dirty(doctor_id)
+        events.publish("appointment", appointment_id=appointment_id, doctor_id=doctor_id,
+                       department_id=department_id, before=None, after="scheduled")
         return {"message":"Patient added","appointment_id":appointment_id,
                 "priority_level":priority_level,"priority_score":priority_score,
-                "predicted_service_time":predicted_service_time,"waiting_time":waiting_time}
+                "predicted_service_time":predicted_service_time,"waiting_time":waiting_time,
+                "doctor_id":doctor_id,"on_shift":doctor_id in on_shift,"queue_refresh":"queued"}
     except Exception as e:
         conn.rollback(); conn.close(); return {"error":str(e)}
 
@@ -303,23 +469,31 @@ def add_appointment(data: dict):
 # ─── UPDATE APPOINTMENT ───────────────────────────────────────────────────────
 @app.put("/appointments/{appointment_id}")
 def update_appointment(appointment_id: int, data: dict):
+    department_id = reference_cache.department_id(data["department"])
+    if department_id is None: return {"error":"Department not found"}
+
     conn   = get_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT department_id FROM departments WHERE name=%s",(data["department"],))
-        dept_row = cursor.fetchone()
-        if not dept_row: conn.close(); return {"error":"Department not found"}
+        dr = _lock_appointment(cursor, appointment_id)
 
+        # started_at / completed_at feed the service-time model.
         cursor.execute("""
-            UPDATE appointments SET appointment_type=%s,problem_text=%s,department_id=%s,status=%s
+            UPDATE appointments SET appointment_type=%s,problem_text=%s,department_id=%s,status=%s,
+                started_at  =CASE WHEN %s='in-progress' THEN COALESCE(started_at,NOW()) ELSE started_at END,
+                completed_at=CASE WHEN %s='completed' AND status<>'completed' THEN NOW() ELSE completed_at END
             WHERE appointment_id=%s
-        """, (data["appointment_type"],data["problem_text"],dept_row[0],data["status"],appointment_id))
+        """, (data["appointment_type"],data["problem_text"],department_id,data["status"],
+              data["status"],data["status"],appointment_id))
+        service = _service_observation(cursor, appointment_id) if dr and dr[1]!="completed" else None
 
-        cursor.execute("SELECT doctor_id FROM appointments WHERE appointment_id=%s",(appointment_id,))
-        dr = cursor.fetchone()
-        if dr: _refresh_queue_waiting_times(cursor, dr[0])
-
-        conn.commit(); conn.close(); return {"message":"Updated"}
+        conn.commit(); conn.close()
+        if dr:
+            refresh_worker.mark_dirty(dr[0])
+            events.publish("appointment", appointment_id=appointment_id, doctor_id=dr[0],
+                           department_id=department_id, before_department_id=dr[2],
+                           before=dr[1], after=data["status"], service=service)
+        return {"message":"Updated","queue_refresh":"queued" if dr else None}
     except Exception as e:
         conn.rollback(); conn.close(); return {"error":str(e)}
 
@@ -330,11 +504,14 @@ def delete_appointment(appointment_id: int):
     conn   = get_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT doctor_id FROM appointments WHERE appointment_id=%s",(appointment_id,))
-        dr = cursor.fetchone()
+        dr = _lock_appointment(cursor, appointment_id)
         cursor.execute("DELETE FROM appointments WHERE appointment_id=%s",(appointment_id,))
-        if dr: _refresh_queue_waiting_times(cursor, dr[0])
-        conn.commit(); conn.close(); return {"message":"Deleted"}
+        conn.commit(); conn.close()
+        if dr:
+            refresh_worker.mark_dirty(dr[0])
+            events.publish("appointment", appointment_id=appointment_id, doctor_id=dr[0],
+                           department_id=dr[2], before=dr[1], after=None)
+        return {"message":"Deleted","queue_refresh":"queued" if dr else None}
     except Exception as e:
         conn.rollback(); conn.close(); return {"error":str(e)}
 
@@ -345,42 +522,146 @@ def complete_appointment(appointment_id: int):
     conn   = get_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT doctor_id FROM appointments WHERE appointment_id=%s",(appointment_id,))
-        dr = cursor.fetchone()
-        cursor.execute("UPDATE appointments SET status='completed' WHERE appointment_id=%s",(appointment_id,))
-        if dr: _refresh_queue_waiting_times(cursor, dr[0])
-        conn.commit(); conn.close(); return {"message":"Completed"}
+        dr = _lock_appointment(cursor, appointment_id)
+        cursor.execute("""
+            UPDATE appointments
+            SET status='completed',
+                completed_at=CASE WHEN status<>'completed' THEN NOW() ELSE completed_at END
+            WHERE appointment_id=%s
+        """, (appointment_id,))
+        service = _service_observation(cursor, appointment_id) if dr and dr[1]!="completed" else None
+        conn.commit(); conn.close()
+        if dr:
+            refresh_worker.mark_dirty(dr[0])
+            events.publish("appointment", appointment_id=appointment_id, doctor_id=dr[0],
+                           department_id=dr[2], before=dr[1], after="completed", service=service)
+        return {"message":"Completed","queue_refresh":"queued" if dr else None}
     except Exception as e:
         conn.rollback(); conn.close(); return {"error":str(e)}
 
 
+# ─── CALL NEXT PATIENT ────────────────────────────────────────────────────────
+# Served from the live per-doctor heap (services/live_queue.py). Waiting times
+# of the rest of the queue are persisted by refresh_worker afterwards.
+@app.get("/doctors/{doctor_id}/next")
+def get_next_patient(doctor_id: int):
+    try:
+        nxt = live_queues.peek(doctor_id)
+        return {"doctor_id":doctor_id,"next":nxt,"waiting":live_queues.waiting(doctor_id)}
+    except Exception as e:
+        return {"error":str(e)}
+
+
+@app.post("/doctors/{doctor_id}/start")
+def start_next_patient(doctor_id: int):
+    conn      = get_connection()
+    cursor    = conn.cursor()
+    candidate = None
+    try:
+        doctor_locks.lock_doctors(cursor, [doctor_id], shared=True)
+        started = None
+        while started is None:
+            candidate = live_queues.pop(doctor_id, cursor)
+            if candidate is None: break
+            row = query_catalog.execute(cursor, "appointment_for_update", (candidate["appointment_id"],)).fetchone()
+            if row is None or row[0]!=doctor_id or row[1] not in ("scheduled","waiting"):
+                LIVE_QUEUE_POPS.inc("stale"); continue      # changed by another worker since it was queued
+            cursor.execute("""
+                UPDATE appointments SET status='in-progress', started_at=COALESCE(started_at,NOW())
+                WHERE appointment_id=%s
+            """, (candidate["appointment_id"],))
+            started = row
+        conn.commit(); conn.close()
+        if started is None:
+            return {"message":"No patients waiting","started":None,"next":None}
+        LIVE_QUEUE_POPS.inc("started")
+        refresh_worker.mark_dirty(doctor_id)
+        events.publish("appointment", appointment_id=candidate["appointment_id"], doctor_id=doctor_id,
+                       department_id=started[2], before=started[1], after="in-progress")
+        return {"message":"Started","started":candidate,"next":live_queues.peek(doctor_id),
+                "waiting":live_queues.waiting(doctor_id),"queue_refresh":"queued"}
+    except Exception as e:
+        if candidate: live_queues.requeue(doctor_id, candidate["appointment_id"])
+        conn.rollback(); conn.close(); return {"error":str(e)}
+
+
+@app.post("/doctors/{doctor_id}/complete")
+def complete_current_patient(doctor_id: int, call_next: bool = False):
+    """Completes the doctor's longest-running visit; call_next=true also starts the next patient."""
+    conn   = get_connection()
+    cursor = conn.cursor()
+    try:
+        doctor_locks.lock_doctors(cursor, [doctor_id], shared=True)
+        current = query_catalog.execute(cursor, "doctor_in_progress", (doctor_id,)).fetchone()
+        if current is None:
+            conn.rollback(); conn.close()
+            result = {"message":"No patient in progress","completed":None}
+            return _with_next(result, doctor_id, call_next)
+        cursor.execute("""
+            UPDATE appointments SET status='completed', completed_at=NOW() WHERE appointment_id=%s
+        """, (current[0],))
+        service = _service_observation(cursor, current[0])
+        conn.commit(); conn.close()
+        refresh_worker.mark_dirty(doctor_id)
+        events.publish("appointment", appointment_id=current[0], doctor_id=doctor_id,
+                       department_id=current[1], before="in-progress", after="completed", service=service)
+        return _with_next({"message":"Completed","completed":current[0],"queue_refresh":"queued"},
+                          doctor_id, call_next)
+    except Exception as e:
+        conn.rollback(); conn.close(); return {"error":str(e)}
+
+
+def _with_next(result: dict, doctor_id: int, call_next: bool) -> dict:
+    """Adds who is next to a /complete response, starting them first if call_next."""
+    if not call_next:
+        return {**result, "next":live_queues.peek(doctor_id), "waiting":live_queues.waiting(doctor_id)}
+    start = start_next_patient(doctor_id)
+    if "error" in start: return {**result, "error":start["error"]}
+    return {**result, "started":start["started"], "next":start["next"], "waiting":start.get("waiting",0)}
+
+
 # ─── OPTIMIZED QUEUE FOR A DOCTOR ────────────────────────────────────────────
-@app.get("/appointments/optimized-queue")
-def get_optimized_queue(doctor_id: int):
+def _optimized_queue(doctor_id: int) -> tuple:
+    """(queue, version): doctor_id's queue, computed now and recorded in queue_versions."""
+    generation = queue_versions.generation(doctor_id)
     conn   = get_connection()
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT a.appointment_id, p.name, p.age, p.gender, p.disability,
-               a.appointment_type, a.severity_score, a.appointment_time
-        FROM appointments a JOIN patients p ON a.patient_id=p.patient_id
-        WHERE a.doctor_id=%s AND a.status IN ('scheduled','waiting','in-progress')
-    """, (doctor_id,))
+    query_catalog.execute(cursor, "doctor_queue", (doctor_id,))
     rows = cursor.fetchall()
     conn.close()
-    if not rows: return {"optimized_queue":[]}
 
     patients = [{"id":r[0],"name":r[1],"age":r[2],"gender":r[3],"disability":r[4],
-                 "appointment_type":r[5],"severity_score":r[6],"arrival_time":r[7]}
+                 "appointment_type":r[5],"severity_score":r[6],"arrival_time":r[7],"is_hyper_emergency":r[8]}
                 for r in rows]
-    optimized = RuleBasedQueueOptimizer.optimize(patients)
-    return {"optimized_queue":[{**e,"start_time":str(e["start_time"]),"end_time":str(e["end_time"])}
-                                for e in optimized]}
+    with metrics.timed("optimizer"):
+        optimized = RuleBasedQueueOptimizer.optimize(patients, service_time_model.for_doctor(doctor_id))
+    queue = [{**e,"start_time":str(e["start_time"]),"end_time":str(e["end_time"])} for e in optimized]
+    return queue, queue_versions.record(doctor_id, generation, queue, patients)
+
+
+@app.get("/appointments/optimized-queue")
+def get_optimized_queue(doctor_id: int):
+    queue, version = _optimized_queue(doctor_id)
+    return {"optimized_queue":queue,"version":version}
+
+
+# ─── OPTIMIZED QUEUE: CHANGES SINCE A VERSION ────────────────────────────────
+@app.get("/appointments/optimized-queue/changes")
+def get_optimized_queue_changes(doctor_id: int, since: str = ""):
+    """
+    Moves, inserts, removals and wait changes since `since` (a version from
+    either queue endpoint), each with its reason. Unknown or expired versions
+    get the full queue back (full: true). See services/queue_versions.py.
+    """
+    if queue_versions.current(doctor_id) is None:
+        _optimized_queue(doctor_id)
+    return queue_versions.changes(doctor_id, since)
 
 
 # ─── GET ALL DOCTORS ──────────────────────────────────────────────────────────
 @app.get("/doctors")
 def get_all_doctors():
-    conn   = get_connection()
+    conn   = get_read_connection()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT d.doctor_id, d.name, d.experience_years, d.status, dep.name
@@ -396,35 +677,24 @@ def get_all_doctors():
 # ─── DOCTORS BY DEPARTMENT ────────────────────────────────────────────────────
 @app.get("/doctors/by-department")
 def get_doctors_by_department(shift: str = "morning"):
-    conn   = get_connection()
-    cursor = conn.cursor()
     shift_filter = ("morning",) if shift=="morning" else ("afternoon","night")
-    in_clause    = ",".join(["%s"]*len(shift_filter))
-
-    cursor.execute(f"""
-        SELECT d.doctor_id, d.name, d.experience_years, d.status, dep.name,
-               ds.shift, ds.availability_status, COALESCE(COUNT(a.appointment_id),0)
-        FROM doctors d
-        JOIN departments dep ON d.department_id=dep.department_id
-        LEFT JOIN doctor_schedule ds ON d.doctor_id=ds.doctor_id AND ds.date=CURRENT_DATE AND ds.shift IN ({in_clause})
-        LEFT JOIN appointments a ON d.doctor_id=a.doctor_id AND a.status IN ('scheduled','waiting','in-progress')
-        GROUP BY d.doctor_id,d.name,d.experience_years,d.status,dep.name,ds.shift,ds.availability_status
-        ORDER BY dep.name, d.experience_years DESC
-    """, shift_filter)
-
-    rows = cursor.fetchall()
-    conn.close()
+    today        = date.today()
 
     dept_doctors: dict = {}
-    for r in rows:
-        (doctor_id,name,experience,db_status,department,db_shift,availability,patient_count) = r
-        if department not in dept_doctors: dept_doctors[department] = []
-        is_active = (availability is True) if db_shift is not None else (db_status=="active")
-        dept_doctors[department].append({
-            "id":doctor_id,"name":name,"experience_years":experience,"patients":patient_count,
-            "max_patients":15,"status":"active" if is_active else "inactive",
-            "shift":db_shift or shift,"is_standby":False,
-        })
+    for department, dept_id in sorted(reference_cache.departments().items()):
+        doctors = sorted(reference_cache.doctors_in_department(dept_id),
+                         key=lambda d: (-(d["experience_years"] or 0), d["doctor_id"]))
+        if not doctors: continue
+        docs = dept_doctors[department] = []
+        for d in doctors:
+            entry     = schedule_index.shift_entry(d["doctor_id"], today, shift_filter)
+            is_active = entry[1] if entry is not None else (d["status"]=="active")
+            docs.append({
+                "id":d["doctor_id"],"name":d["name"],"experience_years":d["experience_years"],
+                "patients":routing_index.open_count(d["doctor_id"]),
+                "max_patients":MAX_PATIENTS_PER_DOCTOR,"status":"active" if is_active else "inactive",
+                "shift":entry[0] if entry is not None else shift,"is_standby":False,
+            })
 
     for dept, docs in dept_doctors.items():
         active = [d for d in docs if d["status"]=="active"]
@@ -432,7 +702,7 @@ def get_doctors_by_department(shift: str = "morning"):
             standby = sorted(active, key=lambda x:x["experience_years"])[0]
             for doc in docs:
                 if doc["id"]==standby["id"]:
-                    doc["is_standby"]=True; doc["max_patients"]=5
+                    doc["is_standby"]=True; doc["max_patients"]=STANDBY_MAX_PATIENTS
 
     return {"doctors_by_department": dept_doctors}
 
@@ -457,17 +727,16 @@ def get_emergency_doctors():
 # ─── ADD NEW DOCTOR ───────────────────────────────────────────────────────────
 @app.post("/doctors")
 def add_doctor(data: dict):
+    department_id = reference_cache.department_id(data["department"])
+    if department_id is None: return {"error":"Department not found"}
+
     conn   = get_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT department_id FROM departments WHERE name=%s",(data["department"],))
-        dept_row = cursor.fetchone()
-        if not dept_row: conn.close(); return {"error":"Department not found"}
-
         cursor.execute("""
             INSERT INTO doctors (name,department_id,experience_years,status)
             VALUES (%s,%s,%s,%s) RETURNING doctor_id
-        """, (data["name"],dept_row[0],data["experience_years"],data.get("status","active")))
+        """, (data["name"],department_id,data["experience_years"],data.get("status","active")))
         doctor_id = cursor.fetchone()[0]
 
         shift = data.get("shift","morning")
@@ -477,6 +746,8 @@ def add_doctor(data: dict):
         """, (doctor_id, shift, data.get("status","active")=="active"))
 
         conn.commit(); conn.close()
+        events.publish("doctor", doctor_id=doctor_id, name=data["name"], department_id=department_id,
+                       experience_years=data["experience_years"] or 0, status=data.get("status","active"))
         return {"message":"Doctor added","doctor_id":doctor_id}
     except Exception as e:
         conn.rollback(); conn.close(); return {"error":str(e)}
@@ -492,19 +763,38 @@ def toggle_doctor_status(doctor_id: int, data: dict):
         cursor.execute("UPDATE doctors SET status=%s WHERE doctor_id=%s",(ns,doctor_id))
         cursor.execute("UPDATE doctor_schedule SET availability_status=%s WHERE doctor_id=%s AND date=CURRENT_DATE",
                        (ns=="active",doctor_id))
-        conn.commit(); conn.close(); return {"message":f"Status updated to {ns}"}
+        conn.commit(); conn.close()
+        events.publish("doctor", doctor_id=doctor_id, status=ns)
+        return {"message":f"Status updated to {ns}"}
     except Exception as e:
         conn.rollback(); conn.close(); return {"error":str(e)}
 
 
+# ─── DEPARTMENT CAPACITY GRAPH ────────────────────────────────────────────────
+@app.get("/departments/capacity")
+def get_department_capacity():
+    return {"departments": department_graph.nodes(), "overflow_edges": department_graph.edges()}
+
+
+@app.get("/departments/overflow")
+def get_department_overflow():
+    return department_graph.overflow_plan()
+
+
 # ─── DASHBOARD STATS ──────────────────────────────────────────────────────────
 @app.get("/dashboard/stats")
 def get_dashboard_stats():
-    conn   = get_connection()
+    conn   = get_read_connection()
     cursor = conn.cursor()
 
+    # Live rows are about a day's working set; the rest are counted per month
+    # in the archive's totals table as they move.
     cursor.execute("SELECT COUNT(*) FROM appointments")
     total = cursor.fetchone()[0]
+    try:
+        total += archive.archived_total(cursor)
+    except Exception:
+        conn.rollback()     # archive not created yet
 
     cursor.execute("""
         SELECT COUNT(*) FROM appointments
@@ -574,36 +864,51 @@ def get_dashboard_stats():
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
-# INTERNAL HELPER
-# Returns count of appointments updated.
+# INTERNAL HELPERS
+# Queue refresh and waiting-time preview.
 # ═══════════════════════════════════════════════════════════════════════════════
 def _refresh_queue_waiting_times(cursor, doctor_id: int) -> int:
+    """Synchronous refresh inside the caller's transaction (mutations use refresh_worker)."""
+    with metrics.timed("queue_refresh"):
+        return refresh_queues(cursor, [doctor_id])
+
+
+def _lock_appointment(cursor, appointment_id: int):
+    """
+    (doctor_id, status, department_id) of an appointment about to be changed,
+    or None. Takes the doctor's shared queue lock, then the row lock, so the
+    status read is the one this transaction overwrites.
+    """
+    row = query_catalog.execute(cursor, "appointment_doctor", (appointment_id,)).fetchone()
+    if row is None:
+        return None
+    doctor_locks.lock_doctors(cursor, [row[0]], shared=True)
+    return query_catalog.execute(cursor, "appointment_for_update", (appointment_id,)).fetchone()
+
+
+def _service_observation(cursor, appointment_id: int):
+    """Actual service duration of a just-completed visit, for the "service" event field, or None."""
     cursor.execute("""
-        SELECT a.appointment_id, p.name, p.age, p.gender, p.disability,
-               a.appointment_type, a.severity_score, a.appointment_time
+        SELECT a.appointment_type, a.severity_score, p.age, p.disability, a.started_at,
+               EXTRACT(EPOCH FROM a.completed_at - a.started_at) / 60
         FROM appointments a JOIN patients p ON a.patient_id=p.patient_id
-        WHERE a.doctor_id=%s AND a.status IN ('scheduled','waiting','in-progress')
-    """, (doctor_id,))
-    rows = cursor.fetchall()
-    if not rows: return 0
-
-    patients = [{"id":r[0],"name":r[1],"age":r[2],"gender":r[3],"disability":r[4],
-                 "appointment_type":r[5],"severity_score":r[6],"arrival_time":r[7]}
-                for r in rows]
-
-    optimized = RuleBasedQueueOptimizer.optimize(patients)
-
-    for entry in optimized:
-        p = next((x for x in patients if x["id"]==entry["id"]), {})
-        priority_score, _ = PatientPriorityModel.calculate_priority(
-            age=int(p.get("age") or 0),
-            gender=str(p.get("gender") or ""),
-            disability=bool(p.get("disability") or False),
-        )
-        cursor.execute("""
-            UPDATE appointments
-            SET waiting_time=%s, predicted_service_time=%s, priority_score=%s
-            WHERE appointment_id=%s
-        """, (entry["waiting_time_minutes"], entry["estimated_duration"], priority_score, entry["id"]))
-
-    return len(optimized)
\ No newline at end of file
+        WHERE a.appointment_id=%s AND a.status='completed' AND a.started_at IS NOT NULL
+    """, (appointment_id,))
+    r = cursor.fetchone()
+    if r is None or r[5] is None: return None
+    return {"appointment_type":r[0],"severity_score":r[1],"age":r[2],"disability":r[3],
+            "started_at":r[4].isoformat(),"minutes":round(float(r[5]),2)}
+
+
+def _preview_waiting_time(cursor, doctor_id: int, patient: dict) -> tuple:
+    """(waiting_time, predicted_service_time) `patient` would get if added to doctor_id's queue now."""
+    query_catalog.execute(cursor, "doctor_queue", (doctor_id,))
+    queue_patients = [{"id":r[0],"name":r[1],"age":r[2],"gender":r[3],"disability":r[4],
+                       "appointment_type":r[5],"severity_score":r[6],"arrival_time":r[7],
+                       "is_hyper_emergency":r[8]}
+                      for r in cursor.fetchall()] + [dict(patient, id=-1)]
+
+    with metrics.timed("optimizer"):
+        optimized = RuleBasedQueueOptimizer.optimize(queue_patients, service_time_model.for_doctor(doctor_id))
+    slot = next(q for q in optimized if q["id"]==-1)
+    return slot["waiting_time_minutes"], slot["estimated_duration"]
@@ -0,0 +1,80 @@
+"""
+routes/analytics.py
+─────────────────────────────────────────────────────────────────────────────
+Trend queries over archived appointments, served from the local columnar
+store (services/analytics_store.py) — never from the live tables.
+
+  GET  /analytics/wait-times?since=&until=&department_id=&granularity=
+         p50 / p90 / p99 waiting_time of completed visits per period
+  GET  /analytics/arrivals?since=&until=&department_id=
+         appointments by department and hour of day
+  GET  /analytics/emergency-ratio?since=&until=&department_id=&granularity=
+  GET  /analytics/throughput?since=&until=&doctor_id=&granularity=
+         completed visits and mean service minutes per doctor
+  GET  /analytics/status      rows, watermark, last export
+  POST /analytics/refresh     export newly archived rows now
+
+since / until are dates (YYYY-MM-DD, until exclusive), default the last
+90 days; granularity is day, week (default) or month.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import time
+from datetime import date
+
+from fastapi import APIRouter
+
+from services.analytics_store import GRANULARITIES, analytics_store
+
+router = APIRouter()
+
+
+def _query(fn, since, until, granularity=None, **filters):
+    try:
+        if granularity is not None and granularity not in GRANULARITIES:
+            return {"error": f"granularity must be one of {', '.join(GRANULARITIES)}"}
+        since = date.fromisoformat(since) if since else None
+        until = date.fromisoformat(until) if until else None
+        extra = {"granularity": granularity} if granularity is not None else {}
+        start = time.perf_counter()
+        rows  = fn(since, until, **filters, **extra)
+        return {"rows": rows, "query_ms": round((time.perf_counter() - start) * 1000, 2),
+                "watermark": analytics_store.watermark}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@router.get("/analytics/wait-times")
+def analytics_wait_times(since: str | None = None, until: str | None = None,
+                         department_id: int | None = None, granularity: str = "week"):
+    return _query(analytics_store.wait_times, since, until, granularity, department_id=department_id)
+
+
+@router.get("/analytics/arrivals")
+def analytics_arrivals(since: str | None = None, until: str | None = None, department_id: int | None = None):
+    return _query(analytics_store.arrivals, since, until, department_id=department_id)
+
+
+@router.get("/analytics/emergency-ratio")
+def analytics_emergency_ratio(since: str | None = None, until: str | None = None,
+                              department_id: int | None = None, granularity: str = "week"):
+    return _query(analytics_store.emergency_ratio, since, until, granularity, department_id=department_id)
+
+
+@router.get("/analytics/throughput")
+def analytics_throughput(since: str | None = None, until: str | None = None,
+                         doctor_id: int | None = None, granularity: str = "week"):
+    return _query(analytics_store.throughput, since, until, granularity, doctor_id=doctor_id)
+
+
+@router.get("/analytics/status")
+def analytics_status():
+    return analytics_store.status()
+
+
+@router.post("/analytics/refresh")
+def analytics_refresh():
+    try:
+        return {"exported": analytics_store.export(), **analytics_store.status()}
+    except Exception as e:
+        return {"error": str(e)}
@@ -1,84 +1,115 @@
+"""
+routes/appointments.py
+─────────────────────────────────────────────────────────────────────────────
+POST /optimize — hospital-wide optimize pipeline.
+
+Scores every open appointment in the hospital in one streaming pass:
+
+  server-side cursor ──▶ batches of BATCH_SIZE rows
+                              │
+                              ├─▶ rules_engine.score_batch()  priority, service time
+                              ├─▶ per-department load         capacity status
+                              └─▶ bounded min-heap            top `limit` patients
+
+Memory stays O(batch_size + limit + departments) no matter how many
+appointments are open, so 100k rows never sit in Python at once.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import heapq
+import itertools
+
 from fastapi import APIRouter
+
 from database import get_connection
-from services.priority import calculate_priority
-from services.service_time import predict_service_time
-from services.scheduler import sort_patients
-from graph.department_graph import check_capacity
+from services import metrics
+from services.rules_engine import rules_engine
+from services.reference_cache import reference_cache
+from graph.department_graph import check_capacity, department_graph
 
 router = APIRouter()
 
-@router.get("/appointments")
-def get_appointments():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM appointments")
-    rows = cursor.fetchall()
-    conn.close()
-
-    appointments = []
-    for row in rows:
-        appointments.append({
-            "id": row[0],
-            "patient_name": row[1],
-            "severity": row[2],
-            "urgency": row[3],
-            "waiting_time": row[4],
-            "age_group": row[5],
-            "disability": row[6],
-            "experience": row[7],
-            "department": row[8],
-            "status": row[9]
-        })
-    return appointments
+BATCH_SIZE    = 2000
+DEFAULT_LIMIT = 500
+
+
+def _stream_open_appointments(conn, batch_size: int):
+    """Yields lists of open-appointment dicts, batch_size rows at a time."""
+    cursor = conn.cursor(name="optimize_stream")
+    cursor.itersize = batch_size
+    cursor.execute("""
+        SELECT a.appointment_id, p.name, p.age, p.gender, p.disability,
+               a.appointment_type, a.severity_score, a.waiting_time,
+               a.department_id, a.doctor_id
+        FROM appointments a JOIN patients p ON a.patient_id=p.patient_id
+        WHERE a.status IN ('scheduled','waiting','in-progress')
+    """)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield [{"id":r[0],"patient_name":r[1],"age":r[2],"gender":r[3],"disability":r[4],
+                "appointment_type":r[5],"severity_score":r[6],"waiting_time":r[7] or 0,
+                "department_id":r[8],"doctor_id":r[9]}
+               for r in rows]
+    cursor.close()
 
 
 @router.post("/optimize")
-def optimize():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM appointments")
-    rows = cursor.fetchall()
-    conn.close()
-
-    patients = []
-    for row in rows:
-        patient = {
-            "id": row[0],
-            "patient_name": row[1],
-            "severity": row[2],
-            "urgency": row[3],
-            "waiting_time": row[4],
-            "age_group": row[5],
-            "disability": row[6],
-            "experience": row[7],
-            "department": row[8]
-        }
-
-        # Step 2: Calculate priority
-        patient["priority_score"] = calculate_priority(
-            patient["severity"],
-            patient["urgency"],
-            patient["waiting_time"],
-            patient["age_group"],
-            patient["disability"]
-        )
-
-        # Step 3: Predict service time
-        patient["predicted_time"] = predict_service_time(
-            patient["severity"],
-            patient["experience"]
-        )
-
-        patients.append(patient)
-
-    # Step 4: Sort patients
-    sorted_patients = sort_patients(patients)
-
-    # Step 5: Check department capacity
+def optimize(limit: int = DEFAULT_LIMIT, batch_size: int = BATCH_SIZE):
+    limit      = max(1, limit)
+    batch_size = max(100, batch_size)
+
     department_load = {}
-    for patient in sorted_patients:
-        dept = patient["department"]
-        department_load[dept] = department_load.get(dept, 0) + 1
-        patient["capacity_status"] = check_capacity(dept, department_load[dept])
+    top             = []                  # min-heap of (adjusted_score, tiebreak, patient)
+    tiebreak        = itertools.count()
+    total           = 0
+
+    conn = get_connection()
+    try:
+        for batch in _stream_open_appointments(conn, batch_size):
+            with metrics.timed("optimizer"):      # scoring only, not the batch fetch
+                for patient, (score, level, minutes, adjusted) in zip(batch, rules_engine.score_batch(batch)):
+                    total += 1
+                    dept_id = patient["department_id"]
+                    department_load[dept_id] = department_load.get(dept_id, 0) + 1
+
+                    entry = (adjusted, next(tiebreak), patient)
+                    if len(top) < limit:
+                        heapq.heappush(top, entry)
+                    elif adjusted > top[0][0]:
+                        heapq.heapreplace(top, entry)
+                    else:
+                        continue
+                    patient.update(priority_score=score, priority_level=level,
+                                   predicted_time=minutes, adjusted_score=round(adjusted, 4))
+    finally:
+        conn.close()
+
+    departments = {}
+    for dept_id, load in department_load.items():
+        capacity = department_graph.capacity(dept_id)
+        name     = reference_cache.department_name(dept_id) or str(dept_id)
+        departments[name] = {"load": load, "capacity": capacity,
+                             "capacity_status": check_capacity(name, load, capacity)}
+
+    schedule = []
+    for adjusted, _, patient in sorted(top, key=lambda e: (-e[0], e[1])):
+        name = reference_cache.department_name(patient["department_id"]) or str(patient["department_id"])
+        schedule.append({
+            "id":               patient["id"],
+            "patient_name":     patient["patient_name"],
+            "department":       name,
+            "doctor_id":        patient["doctor_id"],
+            "severity":         patient["severity_score"],
+            "appointment_type": patient["appointment_type"],
+            "waiting_time":     patient["waiting_time"],
+            "priority_score":   patient["priority_score"],
+            "priority_level":   patient["priority_level"],
+            "predicted_time":   patient["predicted_time"],
+            "adjusted_score":   patient["adjusted_score"],
+            "capacity_status":  departments[name]["capacity_status"],
+        })
 
-    return {"optimized_schedule": sorted_patients}
\ No newline at end of file
+    return {"optimized_schedule": schedule, "departments": departments,
+            "total_open": total, "rules_version": rules_engine.version}
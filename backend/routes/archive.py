@@ -0,0 +1,72 @@
+"""
+routes/archive.py
+─────────────────────────────────────────────────────────────────────────────
+Read API over the appointment archive (services/archive.py).
+
+  GET  /archive/appointments?since=&until=&department_id=&patient_id=&status=&after_id=&limit=
+         archived rows, oldest first; pass the last appointment_id back as
+         after_id for the next page. since/until default to the last 30 days.
+  GET  /archive/stats      rows per month partition, live vs archived
+  POST /archive/run        one archive pass now, instead of waiting for the timer
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter
+
+from database import get_connection
+from services import archive
+
+router = APIRouter()
+
+DEFAULT_DAYS = 30
+MAX_LIMIT    = 5000
+
+
+@router.get("/archive/appointments")
+def archived_appointments(since: str | None = None, until: str | None = None,
+                          department_id: int | None = None, patient_id: int | None = None,
+                          status: str | None = None, after_id: int | None = None, limit: int = 500):
+    limit = max(1, min(limit, MAX_LIMIT))
+    conn  = get_connection()
+    try:
+        until_at = datetime.fromisoformat(until) if until else datetime.now()
+        since_at = datetime.fromisoformat(since) if since else until_at - timedelta(days=DEFAULT_DAYS)
+        rows = archive.query(conn.cursor(), since_at, until_at, department_id, patient_id, status,
+                             after_id, limit)
+        conn.close()
+        return {"since": since_at.isoformat(), "until": until_at.isoformat(), "count": len(rows),
+                "next_after_id": rows[-1]["appointment_id"] if len(rows) == limit else None,
+                "appointments": rows}
+    except Exception as e:
+        conn.rollback(); conn.close(); return {"error": str(e)}
+
+
+@router.get("/archive/stats")
+def archive_stats():
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COUNT(*), COUNT(*) FILTER (WHERE status IN ('completed','cancelled'))
+            FROM appointments
+        """)
+        live, finished = cursor.fetchone()
+        months = archive.monthly_totals(cursor)
+        conn.close()
+        return {"live_rows": live, "live_finished_rows": finished,
+                "archived_rows": sum(m["rows"] for m in months),
+                "cutoff": archive.cutoff().isoformat(timespec="seconds"),
+                "archive_after_hours": archive.ARCHIVE_AFTER_HOURS,
+                "months": months}
+    except Exception as e:
+        conn.rollback(); conn.close(); return {"error": str(e)}
+
+
+@router.post("/archive/run")
+def run_archive(max_batches: int | None = None):
+    try:
+        return {"moved": archive.archive_pass(max_batches=max_batches)}
+    except Exception as e:
+        return {"error": str(e)}
@@ -0,0 +1,61 @@
+"""
+routes/forecast.py
+─────────────────────────────────────────────────────────────────────────────
+Arrival forecast and staffing recommendations (services/forecasting.py).
+
+  GET /forecast/arrivals?day=&department_id=   expected arrivals per hour
+  GET /forecast/staffing?day=                  per department and shift:
+                                               activate / standby / hold
+  GET /forecast/accuracy?days=                 backtest against the naive
+                                               "same hour last week"
+
+day defaults to today (YYYY-MM-DD).
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+from datetime import date
+
+from fastapi import APIRouter
+
+from services.forecasting import BACKTEST_DAYS, arrival_forecaster
+from services.reference_cache import reference_cache
+
+router = APIRouter()
+
+
+def _day(day: str | None) -> date:
+    return date.fromisoformat(day) if day else date.today()
+
+
+@router.get("/forecast/arrivals")
+def forecast_arrivals(day: str | None = None, department_id: int | None = None):
+    try:
+        target = _day(day)
+        hourly = arrival_forecaster.hourly(target, department_id)
+        return {"day": target.isoformat(),
+                "departments": [{"department_id": dept_id, "department": reference_cache.department_name(dept_id),
+                                 "expected_total": round(sum(hours), 1), "hourly": hours}
+                                for dept_id, hours in hourly.items()]}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@router.get("/forecast/staffing")
+def forecast_staffing(day: str | None = None):
+    try:
+        target = _day(day)
+        plan   = arrival_forecaster.staffing(target)
+        return {"day": target.isoformat(),
+                "activate": sum(p["change"] for p in plan if p["action"] == "activate"),
+                "standby":  -sum(p["change"] for p in plan if p["action"] == "standby"),
+                "shifts":   plan}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@router.get("/forecast/accuracy")
+def forecast_accuracy(days: int = BACKTEST_DAYS):
+    try:
+        return arrival_forecaster.accuracy(max(1, min(days, 60)))
+    except Exception as e:
+        return {"error": str(e)}
@@ -1,68 +1,38 @@
+from datetime import datetime
+
 from fastapi import APIRouter
-from database import get_connection
+
+from services.triage_llm import classify_department_rules
+from services.reference_cache import reference_cache
+from services.routing_index import routing_index
+from services.schedule_index import schedule_index
 
 router = APIRouter()
 
+
+# ─── QUICK EMERGENCY TRIAGE ───────────────────────────────────────────────────
+# Rule-based only (no LLM round-trip): suggested department + least-loaded
+# active doctor on shift now (any active doctor if nobody is on shift), all
+# served from memory.
 @router.post("/emergency-triage")
 def emergency_triage(data: dict):
+    triage = classify_department_rules(data.get("problem", ""), data.get("age"))
+    suggested_department = triage["department"]
 
-    problem_text = data["problem"]
-
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    # Step 1: Get all department names
-    cursor.execute("SELECT department_id, name FROM departments")
-    departments = cursor.fetchall()
-
-    department_names = [d[1] for d in departments]
-
-    # Step 2: Temporary rule-based classification (replace with LLM later)
-    # For now simple logic
-    suggested_department = "General"
-
-    if "chest" in problem_text.lower():
-        suggested_department = "Cardiology"
-    elif "fracture" in problem_text.lower():
-        suggested_department = "Orthopedics"
-
-    # Step 3: Get department_id
-    department_id = None
-    for d in departments:
-        if d[1] == suggested_department:
-            department_id = d[0]
-            break
-
+    department_id = reference_cache.department_id(suggested_department)
     if department_id is None:
-        conn.close()
         return {"error": "Department not found"}
 
-    # Step 4: Find least-loaded ACTIVE & AVAILABLE doctor
-    cursor.execute("""
-        SELECT d.doctor_id,
-               COUNT(a.appointment_id) AS load
-        FROM doctors d
-        LEFT JOIN appointments a
-          ON d.doctor_id = a.doctor_id
-          AND a.status = 'scheduled'
-        LEFT JOIN doctor_schedule ds
-          ON d.doctor_id = ds.doctor_id
-        WHERE d.department_id = %s
-          AND d.status = 'active'
-          AND ds.availability_status = true
-        GROUP BY d.doctor_id
-        ORDER BY load ASC
-        LIMIT 1;
-    """, (department_id,))
-
-    doctor = cursor.fetchone()
-
-    conn.close()
-
-    if doctor is None:
+    on_shift  = set(schedule_index.on_shift(department_id, datetime.now()))
+    doctor_id = routing_index.least_loaded(department_id, among=on_shift)
+    if doctor_id is None:
+        doctor_id = routing_index.least_loaded(department_id)
+    if doctor_id is None:
         return {"error": "No available doctor"}
 
     return {
         "suggested_department": suggested_department,
-        "doctor_id": doctor[0]
-    }
\ No newline at end of file
+        "doctor_id":            doctor_id,
+        "on_shift":             doctor_id in on_shift,
+        "urgency_level":        triage["urgency_level"],
+    }
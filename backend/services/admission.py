@@ -0,0 +1,213 @@
+"""
+services/admission.py
+─────────────────────────────────────────────────────────────────────────────
+Priority admission control in front of the worker threadpool.
+
+Every sync endpoint runs on one of the threadpool's 40 threads and holds a
+database session while it does. In a surge, dashboard polls used to take
+those threads first come, first served, and /hyper-emergency/confirm
+queued behind them. AdmissionMiddleware now classifies every request
+
+  hyper_emergency   POST /hyper-emergency/*, /emergency-triage
+  intake            other writes (appointments, doctors, /optimize)
+  queue_read        other reads (queues, doctors, appointment lists)
+  dashboard         /dashboard, /analytics, /forecast, /archive, batch admin
+
+and lets it start only while
+
+  in flight of its own class  <  share × ADMISSION_MAX_IN_FLIGHT
+  in flight of all classes    <  gate  × ADMISSION_MAX_IN_FLIGHT
+
+Lower classes have lower gates, so the last slots are always left to the
+classes above them. A request that can't start waits in its class's FIFO
+queue. Freed slots go to the highest class with a waiter. Past its class's
+queue deadline it is shed: 503 with Retry-After, or, for dashboard GETs, the
+last 200 response for the same URL if it is younger than the class's cache
+age, marked X-Admission: cached.
+
+/, /metrics and CORS preflights are never queued. The controller lives on
+the event loop, so its counters need no locks. ADMISSION_MAX_IN_FLIGHT=0
+turns it off.
+
+  admission_in_flight{priority}            admission_waiting{priority}
+  admission_queue_seconds{priority}        wait before admission
+  admission_shed_total{priority,outcome}   outcome = rejected | cached
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import json
+import time
+import asyncio
+from collections import deque
+
+from services import metrics
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+# Below the threadpool's 40 threads, so admitted work never queues for one.
+# Size it to CPU capacity too: admitted requests share the cores (and the GIL).
+MAX_IN_FLIGHT     = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "32"))
+CACHE_MAX_BYTES   = 1 << 20
+CACHE_MAX_ENTRIES = 256
+
+# class → (share, gate, queue deadline s, Retry-After s, serve cached up to s), highest first
+PRIORITIES = {
+    "hyper_emergency": (1.00, 1.00, 10.0, 1,  0),
+    "intake":          (0.50, 0.85,  5.0, 2,  0),
+    "queue_read":      (0.40, 0.65,  2.0, 2,  0),
+    "dashboard":       (0.20, 0.40,  0.5, 5, 30),
+}
+
+DASHBOARD_PREFIXES = ("/dashboard", "/analytics", "/forecast", "/archive")
+ADMIN_PATHS        = ("/appointments/recalculate-all", "/rules/reload")
+EXEMPT_PATHS       = ("/", "/metrics", "/metrics/queries")
+
+IN_FLIGHT = metrics.gauge("admission_in_flight", "Requests admitted and not yet finished.", ("priority",))
+WAITING   = metrics.gauge("admission_waiting", "Requests queued for admission.", ("priority",))
+QUEUED    = metrics.histogram("admission_queue_seconds", "Time requests waited before admission.", ("priority",))
+SHED      = metrics.counter("admission_shed_total", "Requests not admitted before their deadline.",
+                            ("priority", "outcome"))
+
+
+def classify(method: str, path: str):
+    """Priority class of a request, or None if it is never queued."""
+    if method == "OPTIONS" or path in EXEMPT_PATHS:
+        return None
+    if (method == "POST" and path.startswith("/hyper-emergency/")) or path == "/emergency-triage":
+        return "hyper_emergency"
+    if path.startswith(DASHBOARD_PREFIXES) or path in ADMIN_PATHS:
+        return "dashboard"
+    return "queue_read" if method == "GET" else "intake"
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONTROLLER
+# ═══════════════════════════════════════════════════════════════════════════════
+class AdmissionController:
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self.total     = 0
+        self.in_flight = {name: 0 for name in PRIORITIES}
+        self.waiting   = {name: deque() for name in PRIORITIES}
+
+    def _can_start(self, name: str) -> bool:
+        share, gate = PRIORITIES[name][:2]
+        return (self.in_flight[name] < max(1, round(share * self.max_in_flight))
+                and self.total < max(1, round(gate * self.max_in_flight)))
+
+    def _start(self, name: str):
+        self.total += 1
+        self.in_flight[name] += 1
+        IN_FLIGHT.set(self.in_flight[name], name)
+
+    async def acquire(self, name: str) -> bool:
+        """True once the request may run; False if its queue deadline passed first."""
+        if not self.waiting[name] and self._can_start(name):
+            self._start(name)
+            QUEUED.observe(0.0, name)
+            return True
+
+        start = time.perf_counter()
+        ticket = asyncio.get_running_loop().create_future()
+        self.waiting[name].append(ticket)
+        WAITING.set(len(self.waiting[name]), name)
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket), PRIORITIES[name][2])
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # Client went away while queued; give back a slot granted meanwhile.
+            if ticket.done() and not ticket.cancelled():
+                self.release(name)
+            else:
+                self._forget(name, ticket)
+            raise
+        if ticket.done() and not ticket.cancelled():
+            QUEUED.observe(time.perf_counter() - start, name)
+            return True
+        self._forget(name, ticket)
+        return False
+
+    def release(self, name: str):
+        self.total -= 1
+        self.in_flight[name] -= 1
+        IN_FLIGHT.set(self.in_flight[name], name)
+        for waiting_name, queue in self.waiting.items():
+            while queue and self._can_start(waiting_name):
+                ticket = queue.popleft()
+                if not ticket.done():
+                    self._start(waiting_name)
+                    ticket.set_result(True)
+            WAITING.set(len(queue), waiting_name)
+
+    def _forget(self, name: str, ticket):
+        if ticket in self.waiting[name]:
+            self.waiting[name].remove(ticket)
+        ticket.cancel()
+        WAITING.set(len(self.waiting[name]), name)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ASGI MIDDLEWARE
+# ═══════════════════════════════════════════════════════════════════════════════
+class AdmissionMiddleware:
+
+    def __init__(self, app, max_in_flight: int = MAX_IN_FLIGHT):
+        self.app        = app
+        self.controller = AdmissionController(max_in_flight) if max_in_flight > 0 else None
+        self._cache     = {}     # (path, query) → (stored_at, status, headers, body)
+
+    async def __call__(self, scope, receive, send):
+        name = classify(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if name is None or self.controller is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.controller.acquire(name):
+            await self._shed(scope, send, name)
+            return
+        try:
+            if PRIORITIES[name][4] and scope["method"] == "GET":
+                send = self._recording(scope, send)
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(name)
+
+    def _recording(self, scope, send):
+        key   = (scope["path"], scope.get("query_string", b""))
+        start = {}
+        body  = []
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body" and start.get("status") == 200:
+                body.append(message.get("body", b""))
+                size = sum(map(len, body))
+                if not message.get("more_body") and size <= CACHE_MAX_BYTES:
+                    self._cache.pop(key, None)
+                    self._cache[key] = (time.monotonic(), 200, list(start.get("headers", [])), b"".join(body))
+                    if len(self._cache) > CACHE_MAX_ENTRIES:
+                        del self._cache[next(iter(self._cache))]
+            await send(message)
+        return send_wrapper
+
+    async def _shed(self, scope, send, name: str):
+        retry_after, cache_seconds = PRIORITIES[name][3:]
+        cached = self._cache.get((scope["path"], scope.get("query_string", b"")))
+        if cached is not None and scope["method"] == "GET" and time.monotonic() - cached[0] <= cache_seconds:
+            stored_at, status, headers, body = cached
+            SHED.inc(name, "cached")
+            headers = [(k, v) for k, v in headers if k.lower() not in (b"age", b"x-admission")]
+            headers += [(b"x-admission", b"cached"), (b"age", str(int(time.monotonic() - stored_at)).encode())]
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        SHED.inc(name, "rejected")
+        body = json.dumps({"error": "Server busy, retry shortly", "priority": name}).encode()
+        await send({"type": "http.response.start", "status": 503, "headers": [
+            (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after).encode()), (b"x-admission", b"rejected")]})
+        await send({"type": "http.response.body", "body": body})
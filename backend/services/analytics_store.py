@@ -0,0 +1,443 @@
+"""
+services/analytics_store.py
+─────────────────────────────────────────────────────────────────────────────
+Columnar copy of appointment history for the /analytics endpoints.
+
+Trend queries (wait percentiles by week, throughput per doctor, emergency
+ratios) scan months of rows. Running them as GROUP BYs on Postgres would
+compete with the queue endpoints, so they run against a local copy:
+
+  appointments_archive ──export (incremental)──▶ ColumnStore ──▶ rollups ──▶ /analytics/…
+      (services/archive.py)                         │
+                                                    └──▶ ANALYTICS_DIR (row groups on disk)
+
+Export. Archived rows never change, so the archive is exported append-only
+in (archived_at, appointment_id) order from a watermark, EXPORT_BATCH rows
+per query. Rows archived in the last EXPORT_LAG_SECONDS are left for the
+next export, so an archive batch that is still committing is never
+skipped. The copy trails the live table by the archive cutoff (a day).
+
+ColumnStore keeps one typed array per column (array module: 8-byte ids
+and times, 1-byte codes for type/status). On disk it is a manifest plus
+fixed-size row groups, each column zlib-compressed:
+
+  manifest.json   {rows, watermark, columns, groups}
+  group-00000.bin [appointment_id][appointment_time][department_id]…
+                  rows [k·ROW_GROUP_ROWS, (k+1)·ROW_GROUP_ROWS)
+
+Row order follows the watermark, so group k holds the same rows whichever
+worker writes it; a worker only persists when it has more rows than the
+manifest, under a file lock. A restart loads the groups and exports only
+the rows archived since.
+
+Rollups. Each ingested row updates four small aggregates, keyed by day:
+
+  _daily[(day, dept)]     [appointments, emergency, hyper, cancelled]
+  _hourly[(day, dept)]    the same four counts for each hour, flat (96)
+  _wait[(day, dept)]      waiting_time histogram, WAIT_BUCKETS counts:
+                          by the minute below 2 h, 10-minute steps to 10 h
+  _doctor[(day, doctor)]  [completed, timed visits, Σ service minutes, 1]
+
+Every cell is a fixed-length list, so a query merges the cells in its date
+range with map(add) — days × departments, not rows — and stays in
+milliseconds however many rows are stored.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import json
+import time
+import zlib
+import fcntl
+import logging
+import threading
+from array import array
+from functools import lru_cache
+from operator import add, mul
+from datetime import date, datetime, timedelta
+
+from database import get_connection
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR",
+                          os.path.join(os.path.dirname(os.path.dirname(__file__)), "analytics_data"))
+EXPORT_INTERVAL_SECONDS = float(os.getenv("ANALYTICS_EXPORT_INTERVAL_SECONDS", "300"))
+EXPORT_LAG_SECONDS      = 60
+EXPORT_BATCH            = 50_000
+ROW_GROUP_ROWS          = 65_536
+WAIT_FINE_MINUTES       = 120       # minute buckets below this, WAIT_COARSE_STEP above
+WAIT_COARSE_STEP        = 10
+WAIT_CAP_MINUTES        = 600       # longer waits are counted as WAIT_CAP_MINUTES
+
+NULL = -1
+
+# (column, array typecode)
+SCHEMA = (("appointment_id", "q"), ("appointment_time", "q"), ("department_id", "i"),
+          ("doctor_id", "i"), ("appointment_type", "b"), ("status", "b"),
+          ("is_hyper_emergency", "b"), ("severity_score", "b"), ("waiting_time", "i"),
+          ("predicted_service_time", "i"), ("service_minutes", "f"))
+
+# Dictionary encodings for the 1-byte columns; the last entry catches anything else.
+APPOINTMENT_TYPES = ("routine", "follow-up", "emergency", "other")
+STATUSES          = ("completed", "cancelled", "other")
+EMERGENCY = APPOINTMENT_TYPES.index("emergency")
+COMPLETED = STATUSES.index("completed")
+CANCELLED = STATUSES.index("cancelled")
+
+GRANULARITIES = ("day", "week", "month")
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+
+# Lower bound, in minutes, of each waiting_time histogram bucket.
+WAIT_BUCKETS = tuple(range(WAIT_FINE_MINUTES)) + tuple(
+    range(WAIT_FINE_MINUTES, WAIT_CAP_MINUTES + 1, WAIT_COARSE_STEP))
+
+EXPORTED = metrics.counter("analytics_exported_rows_total", "Archived appointments copied into the analytics store.")
+
+
+def _code(value, values) -> int:
+    value = str(value or "").lower().strip()
+    return values.index(value) if value in values else len(values) - 1
+
+
+def _int(value) -> int:
+    return NULL if value is None else int(value)
+
+
+def _wait_bucket(minutes: int) -> int:
+    minutes = min(minutes, WAIT_CAP_MINUTES)
+    if minutes < WAIT_FINE_MINUTES:
+        return minutes
+    return WAIT_FINE_MINUTES + (minutes - WAIT_FINE_MINUTES) // WAIT_COARSE_STEP
+
+
+@lru_cache(maxsize=8192)
+def period(day: int, granularity: str) -> date:
+    """Start of the day / week (Monday) / month containing date ordinal `day`."""
+    start = date.fromordinal(day)
+    if granularity == "week":
+        return start - timedelta(days=start.weekday())
+    if granularity == "month":
+        return start.replace(day=1)
+    return start
+
+
+def percentiles(histogram: list, qs=(0.5, 0.9, 0.99)) -> dict:
+    """Percentiles of a WAIT_BUCKETS histogram, as bucket lower bounds."""
+    n = sum(histogram)
+    if not n:
+        return {f"p{round(q * 100)}": None for q in qs}
+    out = {}
+    for q in qs:
+        rank = q * (n - 1)
+        seen = 0
+        for bucket, count in enumerate(histogram):
+            seen += count
+            if seen > rank:
+                out[f"p{round(q * 100)}"] = WAIT_BUCKETS[bucket]
+                break
+    return out
+
+
+def _merge(cells, key_of) -> dict:
+    """Sums fixed-length cells into {key_of(cell key): totals}; None keys are skipped."""
+    merged = {}
+    for key, cell in cells:
+        group = key_of(key)
+        if group is None:
+            continue
+        acc = merged.get(group)
+        merged[group] = list(map(add, acc, cell)) if acc is not None else list(cell)
+    return merged
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# COLUMN STORE
+# ═══════════════════════════════════════════════════════════════════════════════
+class ColumnStore:
+    """Typed columns in memory, fixed-size compressed row groups on disk."""
+
+    def __init__(self):
+        self.columns = {name: array(code) for name, code in SCHEMA}
+
+    @property
+    def rows(self) -> int:
+        return len(self.columns["appointment_id"])
+
+    def append(self, row: tuple):
+        for (name, _), value in zip(SCHEMA, row):
+            self.columns[name].append(value)
+
+    # ── Disk ─────────────────────────────────────────────────────────────────
+    def save(self, directory: str, watermark, from_row: int = 0):
+        """Writes the groups at or after from_row, then the manifest."""
+        os.makedirs(directory, exist_ok=True)
+        groups = (self.rows + ROW_GROUP_ROWS - 1) // ROW_GROUP_ROWS
+        sizes  = {}
+        for k in range(from_row // ROW_GROUP_ROWS, groups):
+            chunks = [zlib.compress(self.columns[name][k * ROW_GROUP_ROWS:(k + 1) * ROW_GROUP_ROWS].tobytes(), 1)
+                      for name, _ in SCHEMA]
+            _write_atomic(os.path.join(directory, f"group-{k:05d}.bin"), b"".join(chunks))
+            sizes[k] = [len(c) for c in chunks]
+
+        manifest = _read_manifest(directory) or {}
+        old = {g["group"]: g["sizes"] for g in manifest.get("groups", ())}
+        old.update(sizes)
+        _write_atomic(os.path.join(directory, "manifest.json"), json.dumps({
+            "rows": self.rows, "watermark": watermark, "columns": SCHEMA,
+            "groups": [{"group": k, "sizes": old[k]} for k in range(groups)],
+        }).encode())
+
+    @classmethod
+    def load(cls, directory: str):
+        """(store, watermark) from disk, or (empty store, None)."""
+        store    = cls()
+        manifest = _read_manifest(directory)
+        if not manifest or [tuple(c) for c in manifest["columns"]] != list(SCHEMA):
+            return store, None
+        for group in manifest["groups"]:
+            with open(os.path.join(directory, f"group-{group['group']:05d}.bin"), "rb") as f:
+                blob = f.read()
+            offset = 0
+            for (name, code), size in zip(SCHEMA, group["sizes"]):
+                store.columns[name].frombytes(zlib.decompress(blob[offset:offset + size]))
+                offset += size
+        if store.rows != manifest["rows"]:
+            raise ValueError(f"analytics store has {store.rows} rows, manifest says {manifest['rows']}")
+        return store, manifest["watermark"]
+
+
+def _read_manifest(directory: str):
+    try:
+        with open(os.path.join(directory, "manifest.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ANALYTICS
+# ═══════════════════════════════════════════════════════════════════════════════
+class AnalyticsStore:
+
+    def __init__(self, directory: str = ANALYTICS_DIR):
+        self.directory  = directory
+        self._lock      = threading.Lock()
+        self._export_lock = threading.Lock()
+        self.store      = ColumnStore()
+        self.watermark  = None      # [archived_at iso, appointment_id] of the last exported row
+        self._persisted = 0
+        self._daily     = {}
+        self._hourly    = {}
+        self._wait      = {}
+        self._doctor    = {}
+        self.last_export = {}
+
+    # ── Ingest ───────────────────────────────────────────────────────────────
+    def _ingest(self, row: tuple):
+        """row in SCHEMA order, with codes and epoch seconds."""
+        _, at, dept, doctor, appt_type, status, hyper, _, waiting, _, service = row
+        day, seconds = divmod(at, 86400)
+        day += _EPOCH_ORDINAL
+        key = (day, dept)
+        emergency = appt_type == EMERGENCY
+        cancelled = status == CANCELLED
+
+        cell = self._daily.get(key)
+        if cell is None:
+            cell = self._daily[key] = [0, 0, 0, 0]
+            self._hourly[key] = [0] * 96
+        cell[0] += 1
+        cell[1] += emergency
+        cell[2] += hyper
+        cell[3] += cancelled
+        hourly = self._hourly[key]
+        h = seconds // 3600 * 4
+        hourly[h] += 1
+        hourly[h + 1] += emergency
+        hourly[h + 2] += hyper
+        hourly[h + 3] += cancelled
+
+        if status == COMPLETED:
+            if waiting >= 0:
+                hist = self._wait.get(key)
+                if hist is None:
+                    hist = self._wait[key] = [0] * len(WAIT_BUCKETS)
+                hist[_wait_bucket(waiting)] += 1
+            if doctor >= 0:
+                stats = self._doctor.get((day, doctor))
+                if stats is None:
+                    stats = self._doctor[(day, doctor)] = [0, 0, 0.0, 1]     # …, days worked
+                stats[0] += 1
+                if service >= 0:
+                    stats[1] += 1
+                    stats[2] += service
+
+    def append_rows(self, rows):
+        """Appends encoded rows (SCHEMA order) to the columns and the rollups."""
+        with self._lock:
+            for row in rows:
+                self.store.append(row)
+                self._ingest(row)
+
+    @staticmethod
+    def encode(r) -> tuple:
+        """One appointments_archive row from the export query, encoded for SCHEMA."""
+        return (r[0], int((r[1] - _EPOCH).total_seconds()), _int(r[2]), _int(r[3]),
+                _code(r[4], APPOINTMENT_TYPES), _code(r[5], STATUSES), int(bool(r[6])),
+                _int(r[7]), _int(r[8]), _int(r[9]), float(r[10]) if r[10] is not None else float(NULL))
+
+    def export(self, cursor=None) -> int:
+        """Copies rows archived since the watermark. Returns rows added."""
+        with self._export_lock:
+            own_conn = None
+            if cursor is None:
+                own_conn = get_connection()
+                cursor   = own_conn.cursor()
+            start = time.perf_counter()
+            added = 0
+            try:
+                while True:
+                    since_at, since_id = self.watermark or ("-infinity", 0)
+                    cursor.execute("""
+                        SELECT appointment_id, appointment_time, department_id, doctor_id,
+                               appointment_type, status, is_hyper_emergency, severity_score,
+                               waiting_time, predicted_service_time,
+                               EXTRACT(EPOCH FROM completed_at - started_at) / 60, archived_at
+                        FROM appointments_archive
+                        WHERE (archived_at, appointment_id) > (%s::timestamp, %s)
+                          AND archived_at < NOW() - %s * INTERVAL '1 second'
+                        ORDER BY archived_at, appointment_id
+                        LIMIT %s
+                    """, (since_at, since_id, EXPORT_LAG_SECONDS, EXPORT_BATCH))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    self.append_rows(self.encode(r) for r in rows)
+                    self.watermark = [rows[-1][11].isoformat(), rows[-1][0]]
+                    added += len(rows)
+                    if len(rows) < EXPORT_BATCH:
+                        break
+            finally:
+                if own_conn is not None:
+                    own_conn.close()
+            if added:
+                EXPORTED.inc(added)
+                self.persist()
+            self.last_export = {"at": datetime.now().isoformat(timespec="seconds"), "rows": added,
+                                "ms": round((time.perf_counter() - start) * 1000, 1)}
+            return added
+
+    # ── Disk ─────────────────────────────────────────────────────────────────
+    def persist(self):
+        """Writes new row groups if this worker is ahead of what is on disk."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            manifest = _read_manifest(self.directory)
+            on_disk  = manifest["rows"] if manifest else 0
+            if self.store.rows > on_disk:
+                with self._lock:
+                    self.store.save(self.directory, self.watermark, from_row=on_disk)
+            self._persisted = self.store.rows
+
+    def load(self):
+        with self._lock:
+            self.store, self.watermark = ColumnStore.load(self.directory)
+            self._daily, self._hourly, self._wait, self._doctor = {}, {}, {}, {}
+            for row in zip(*(self.store.columns[name] for name, _ in SCHEMA)):
+                self._ingest(row)
+            self._persisted = self.store.rows
+        logger.info(f"[Analytics] loaded {self.store.rows} rows from {self.directory}")
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self._run, name="analytics-export", daemon=True)
+        thread.start()
+        return thread
+
+    def _run(self):
+        try:
+            self.load()
+        except Exception as exc:
+            logger.warning(f"[Analytics] could not load {self.directory} ({exc}), exporting from scratch.")
+        while True:
+            try:
+                self.export()
+            except Exception as exc:
+                logger.warning(f"[Analytics] export failed: {exc}")
+            time.sleep(EXPORT_INTERVAL_SECONDS)
+
+    # ── Queries ──────────────────────────────────────────────────────────────
+    @staticmethod
+    def _range(since: date | None, until: date | None):
+        until = until or date.today()
+        since = since or until - timedelta(days=90)
+        return since.toordinal(), until.toordinal()
+
+    def wait_times(self, since=None, until=None, department_id=None, granularity="week") -> list:
+        """waiting_time percentiles of completed visits per period and department."""
+        lo, hi = self._range(since, until)
+        with self._lock:
+            merged = _merge(self._wait.items(), lambda k: (period(k[0], granularity), k[1])
+                            if lo <= k[0] < hi and department_id in (None, k[1]) else None)
+        out = []
+        for (start, dept), hist in sorted(merged.items()):
+            n = sum(hist)
+            out.append({"period": start.isoformat(), "department_id": dept, "visits": n,
+                        "mean": round(sum(map(mul, WAIT_BUCKETS, hist)) / n, 1),
+                        **percentiles(hist)})
+        return out
+
+    def arrivals(self, since=None, until=None, department_id=None) -> list:
+        """Appointments by department and hour of day, with emergency share."""
+        lo, hi = self._range(since, until)
+        with self._lock:
+            merged = _merge(self._hourly.items(), lambda k: k[1]
+                            if lo <= k[0] < hi and department_id in (None, k[1]) else None)
+        days = max(hi - lo, 1)
+        return [{"department_id": dept, "hour": hour, "appointments": cell[4 * hour],
+                 "per_day": round(cell[4 * hour] / days, 2), "emergency": cell[4 * hour + 1],
+                 "hyper_emergency": cell[4 * hour + 2], "cancelled": cell[4 * hour + 3]}
+                for dept, cell in sorted(merged.items()) for hour in range(24)]
+
+    def emergency_ratio(self, since=None, until=None, department_id=None, granularity="week") -> list:
+        lo, hi = self._range(since, until)
+        with self._lock:
+            merged = _merge(self._daily.items(), lambda k: (period(k[0], granularity), k[1])
+                            if lo <= k[0] < hi and department_id in (None, k[1]) else None)
+        return [{"period": start.isoformat(), "department_id": dept, "appointments": total,
+                 "emergency": emergency, "hyper_emergency": hyper, "cancelled": cancelled,
+                 "emergency_ratio": round(emergency / total, 3) if total else 0.0}
+                for (start, dept), (total, emergency, hyper, cancelled) in sorted(merged.items())]
+
+    def throughput(self, since=None, until=None, doctor_id=None, granularity="week") -> list:
+        """Completed visits and mean measured service minutes per doctor and period."""
+        lo, hi = self._range(since, until)
+        with self._lock:
+            merged = _merge(self._doctor.items(), lambda k: (period(k[0], granularity), k[1])
+                            if lo <= k[0] < hi and doctor_id in (None, k[1]) else None)
+        return [{"period": start.isoformat(), "doctor_id": doctor, "completed": completed,
+                 "days_worked": days, "per_day": round(completed / days, 2),
+                 "mean_service_minutes": round(minutes / timed, 1) if timed else None}
+                for (start, doctor), (completed, timed, minutes, days) in sorted(merged.items())]
+
+    def status(self) -> dict:
+        return {"rows": self.store.rows, "persisted_rows": self._persisted, "watermark": self.watermark,
+                "row_groups": (self.store.rows + ROW_GROUP_ROWS - 1) // ROW_GROUP_ROWS,
+                "rollup_cells": {"daily": len(self._daily), "wait": len(self._wait),
+                                 "doctor": len(self._doctor)},
+                "directory": self.directory, "last_export": self.last_export}
+
+
+analytics_store = AnalyticsStore()
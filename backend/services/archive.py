@@ -0,0 +1,282 @@
+"""
+services/archive.py
+─────────────────────────────────────────────────────────────────────────────
+Moves finished appointments out of the live table into a partitioned archive.
+
+appointments kept every completed and cancelled row forever, so full scans
+(/appointments, dashboard counts) grew every day. Finished rows older than
+ARCHIVE_AFTER_HOURS now move, in batches, into
+
+  appointments_archive                     PARTITION BY RANGE (appointment_time)
+    ├── appointments_archive_y2026m09      one partition per month, created
+    ├── appointments_archive_y2026m10      on demand by the batch that needs it
+    └── …
+  appointments_archive_totals (month, rows)     archived row counts, kept in
+                                                the same transaction as the move
+  appointment_history  VIEW = appointments UNION ALL appointments_archive
+
+One batch is one transaction:
+
+  SELECT … FOR UPDATE SKIP LOCKED LIMIT BATCH_SIZE   finished, older than cutoff
+  CREATE TABLE IF NOT EXISTS <month partitions>
+  WITH moved AS (DELETE … RETURNING …) INSERT INTO appointments_archive …
+  UPSERT appointments_archive_totals
+
+so a row is always in exactly one of the two tables. A transaction-level
+advisory lock lets only one worker archive at a time; the others skip.
+
+The background thread (start()) runs a pass every ARCHIVE_INTERVAL_SECONDS,
+moving batches with a short pause between them until nothing is left.
+Open appointments are never touched, so no in-memory index changes.
+
+Readers of history (service-time fit, arrival forecast) query
+appointment_history; month partitions are pruned by appointment_time.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import date, datetime, timedelta
+
+from database import get_connection
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+ARCHIVE_AFTER_HOURS      = float(os.getenv("APPOINTMENT_ARCHIVE_AFTER_HOURS", "24"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("APPOINTMENT_ARCHIVE_INTERVAL_SECONDS", "300"))
+BATCH_SIZE               = 5000
+BATCH_PAUSE_SECONDS      = 0.05     # lets live traffic in between batches
+ARCHIVE_LOCK_KEY         = 0x41524348
+
+# Same columns as appointments; the archive adds archived_at.
+COLUMNS = ("appointment_id", "patient_id", "doctor_id", "department_id", "appointment_time",
+           "appointment_type", "problem_text", "severity_score", "priority_score",
+           "predicted_service_time", "waiting_time", "status", "is_hyper_emergency",
+           "started_at", "completed_at")
+_COLUMN_LIST = ", ".join(COLUMNS)
+
+MOVED   = metrics.counter("archive_moved_rows_total", "Appointments moved into the archive.")
+BATCHES = metrics.counter("archive_batches_total", "Archive batches committed.")
+LIVE    = metrics.gauge("archive_live_finished_rows",
+                        "Finished appointments past the cutoff still in the live table after a pass.")
+
+
+def ensure_schema(cursor):
+    """Archive tables, history view and the index the batch query uses; no-ops once they exist."""
+    # Workers start together; DDL on the same objects must not interleave.
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (ARCHIVE_LOCK_KEY,))
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS appointments_archive (
+            appointment_id         INT NOT NULL,
+            patient_id             INT,
+            doctor_id              INT,
+            department_id          INT,
+            appointment_time       TIMESTAMP NOT NULL,
+            appointment_type       VARCHAR(20),
+            problem_text           TEXT,
+            severity_score         INT,
+            priority_score         INT,
+            predicted_service_time INT,
+            waiting_time           INT,
+            status                 VARCHAR(20),
+            is_hyper_emergency     BOOLEAN,
+            started_at             TIMESTAMP,
+            completed_at           TIMESTAMP,
+            archived_at            TIMESTAMP NOT NULL DEFAULT NOW()
+        ) PARTITION BY RANGE (appointment_time);
+        CREATE INDEX IF NOT EXISTS appointments_archive_dept_time_idx
+            ON appointments_archive (department_id, appointment_time);
+        CREATE INDEX IF NOT EXISTS appointments_archive_patient_idx
+            ON appointments_archive (patient_id);
+        CREATE INDEX IF NOT EXISTS appointments_archive_id_idx
+            ON appointments_archive (appointment_id);
+        CREATE INDEX IF NOT EXISTS appointments_archive_archived_idx
+            ON appointments_archive (archived_at, appointment_id);
+
+        CREATE TABLE IF NOT EXISTS appointments_archive_totals (
+            month DATE PRIMARY KEY,
+            rows  BIGINT NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS appointments_finished_time_idx
+            ON appointments (appointment_time) WHERE status IN ('completed','cancelled');
+    """)
+    cursor.execute(f"""
+        CREATE OR REPLACE VIEW appointment_history AS
+            SELECT {_COLUMN_LIST}, NULL::TIMESTAMP AS archived_at FROM appointments
+            UNION ALL
+            SELECT {_COLUMN_LIST}, archived_at FROM appointments_archive
+    """)
+
+
+def partition_name(month: date) -> str:
+    return f"appointments_archive_y{month.year}m{month.month:02d}"
+
+
+def _ensure_partition(cursor, month: date):
+    upper = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {partition_name(month)}
+            PARTITION OF appointments_archive FOR VALUES FROM (%s) TO (%s)
+    """, (month, upper))
+
+
+def cutoff(now: datetime | None = None) -> datetime:
+    return (now or datetime.now()) - timedelta(hours=ARCHIVE_AFTER_HOURS)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MOVING
+# ═══════════════════════════════════════════════════════════════════════════════
+def archive_batch(cursor, before: datetime, limit: int = BATCH_SIZE) -> int | None:
+    """
+    Moves up to `limit` finished appointments older than `before` into the
+    archive. Returns rows moved, or None if another worker holds the lock.
+    The caller commits.
+    """
+    cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", (ARCHIVE_LOCK_KEY,))
+    if not cursor.fetchone()[0]:
+        return None
+    cursor.execute("""
+        SELECT appointment_id, date_trunc('month', appointment_time)::date
+        FROM appointments
+        WHERE status IN ('completed','cancelled')
+          AND appointment_time < %s AND COALESCE(completed_at, appointment_time) < %s
+        ORDER BY appointment_time
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (before, before, limit))
+    rows = cursor.fetchall()
+    if not rows:
+        return 0
+    for month in sorted({month for _, month in rows}):
+        _ensure_partition(cursor, month)
+
+    cursor.execute(f"""
+        WITH moved AS (
+            DELETE FROM appointments WHERE appointment_id = ANY(%s)
+            RETURNING {_COLUMN_LIST}
+        ), archived AS (
+            INSERT INTO appointments_archive ({_COLUMN_LIST})
+            SELECT {_COLUMN_LIST} FROM moved
+            RETURNING date_trunc('month', appointment_time)::date AS month
+        )
+        INSERT INTO appointments_archive_totals (month, rows)
+        SELECT month, COUNT(*) FROM archived GROUP BY month
+        ON CONFLICT (month) DO UPDATE SET rows = appointments_archive_totals.rows + EXCLUDED.rows
+    """, ([appointment_id for appointment_id, _ in rows],))
+    return len(rows)
+
+
+def archive_pass(before: datetime | None = None, batch_size: int = BATCH_SIZE,
+                 max_batches: int | None = None, pause: float = BATCH_PAUSE_SECONDS) -> int:
+    """Moves batches until none are left (or max_batches). Returns rows moved."""
+    before = before or cutoff()
+    moved  = 0
+    batches = 0
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        while max_batches is None or batches < max_batches:
+            with metrics.timed("archive_batch"):
+                n = archive_batch(cursor, before, batch_size)
+                conn.commit()
+            if not n:
+                break
+            moved   += n
+            batches += 1
+            MOVED.inc(n)
+            BATCHES.inc()
+            if n < batch_size:
+                break
+            time.sleep(pause)
+        cursor.execute("""
+            SELECT COUNT(*) FROM appointments
+            WHERE status IN ('completed','cancelled') AND appointment_time < %s
+        """, (before,))
+        LIVE.set(cursor.fetchone()[0])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    if moved:
+        logger.info(f"[Archive] moved {moved} appointments in {batches} batches (before {before:%Y-%m-%d %H:%M})")
+    return moved
+
+
+def start() -> threading.Thread:
+    thread = threading.Thread(target=_archive_forever, name="appointment-archiver", daemon=True)
+    thread.start()
+    return thread
+
+
+def _archive_forever():
+    while True:
+        try:
+            archive_pass()
+        except Exception as exc:
+            logger.warning(f"[Archive] pass failed: {exc}")
+        time.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# READING
+# ═══════════════════════════════════════════════════════════════════════════════
+def archived_total(cursor) -> int:
+    cursor.execute("SELECT COALESCE(SUM(rows), 0) FROM appointments_archive_totals")
+    return int(cursor.fetchone()[0])
+
+
+def monthly_totals(cursor) -> list:
+    cursor.execute("SELECT month, rows FROM appointments_archive_totals ORDER BY month")
+    return [{"month": month.isoformat()[:7], "partition": partition_name(month), "rows": int(rows)}
+            for month, rows in cursor.fetchall()]
+
+
+def query(cursor, since: datetime, until: datetime, department_id: int | None = None,
+          patient_id: int | None = None, status: str | None = None,
+          after_id: int | None = None, limit: int = 500) -> list:
+    """
+    Archived appointments with since <= appointment_time < until, oldest
+    first, keyset-paginated by (appointment_time, appointment_id) via
+    after_id. Only the partitions overlapping [since, until) are scanned.
+    """
+    filters = ["a.appointment_time >= %s", "a.appointment_time < %s"]
+    params  = [since, until]
+    for column, value in (("a.department_id", department_id), ("a.patient_id", patient_id),
+                          ("a.status", status)):
+        if value is not None:
+            filters.append(f"{column} = %s")
+            params.append(value)
+    if after_id is not None:
+        filters.append("""(a.appointment_time, a.appointment_id) > (
+            SELECT appointment_time, appointment_id FROM appointments_archive
+            WHERE appointment_id = %s AND appointment_time >= %s AND appointment_time < %s LIMIT 1)""")
+        params += [after_id, since, until]
+    cursor.execute(f"""
+        SELECT a.appointment_id, a.patient_id, p.name, a.doctor_id, d.name, a.department_id, dep.name,
+               a.appointment_type, a.problem_text, a.severity_score, a.priority_score,
+               a.predicted_service_time, a.waiting_time, a.status, a.is_hyper_emergency,
+               a.appointment_time, a.started_at, a.completed_at, a.archived_at
+        FROM appointments_archive a
+        LEFT JOIN patients p      ON a.patient_id    = p.patient_id
+        LEFT JOIN doctors d       ON a.doctor_id     = d.doctor_id
+        LEFT JOIN departments dep ON a.department_id = dep.department_id
+        WHERE {" AND ".join(filters)}
+        ORDER BY a.appointment_time, a.appointment_id
+        LIMIT %s
+    """, params + [limit])
+    return [{"appointment_id": r[0], "patient_id": r[1], "patient_name": r[2], "doctor_id": r[3],
+             "doctor_name": r[4], "department_id": r[5], "department": r[6], "appointment_type": r[7],
+             "problem": r[8], "severity_score": r[9], "priority_score": r[10],
+             "predicted_service_time": r[11], "waiting_time": r[12], "status": r[13],
+             "is_hyper_emergency": r[14], "appointment_time": str(r[15]),
+             "started_at": str(r[16]) if r[16] else None, "completed_at": str(r[17]) if r[17] else None,
+             "archived_at": str(r[18])}
+            for r in cursor.fetchall()]
@@ -0,0 +1,179 @@
+"""
+services/events.py
+─────────────────────────────────────────────────────────────────────────────
+Change events for the in-memory indexes, shared across uvicorn workers.
+
+Mutation endpoints publish after COMMIT; indexes subscribe and update
+themselves incrementally instead of re-querying the database.
+
+  publish("appointment", appointment_id=…, doctor_id=…, department_id=…,
+          before=<old status | None>, after=<new status | None>,
+          [before_department_id=… if the appointment changed department],
+          [service={minutes, started_at, appointment_type, …} on completion])
+      before=None → created,  after=None → deleted
+
+  publish("doctor", doctor_id=…, [name=…, department_id=…,
+          experience_years=…, status=…])  ← added, or status toggled;
+                                            carries the changed fields
+
+  publish("rules", version=…)         ← rules reloaded through the API
+
+Every worker holds its own copies of these indexes, so events also travel
+between processes through Postgres NOTIFY:
+
+  worker A: publish ──▶ local handlers (synchronously)
+                   └──▶ outbox ──▶ bus thread ──pg_notify──▶ EVENTS_CHANNEL
+  worker B: bus thread ◀──LISTEN── EVENTS_CHANNEL ──▶ local handlers
+
+Each worker runs one bus thread (start_bus(), from the lifespan) holding a
+single connection that both LISTENs and sends; queued events go out in one
+round-trip. A worker ignores its own notifications.
+
+NOTIFY is fire-and-forget: events sent while a listener is disconnected
+are lost. When the bus reconnects it dispatches a local "resync" event so
+subscribers can reload from the database; the periodic reconcilers cover
+anything else.
+
+Handlers run synchronously on the publishing thread (or the bus thread for
+events from other workers) and must be cheap. A failing handler is logged
+and never fails the request that published.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import json
+import time
+import uuid
+import select
+import logging
+import threading
+from collections import defaultdict, deque
+
+from database import get_connection
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = ("scheduled", "waiting", "in-progress")
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+EVENTS_CHANNEL = "app_events"
+RECONNECT_SECONDS = 5
+# Events queued while the bus is down; the oldest are dropped beyond this.
+OUTBOX_LIMIT = 10_000
+
+# Identifies this worker's own notifications so it doesn't apply them twice.
+_ORIGIN = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+PUBLISHED = metrics.counter("events_published_total", "Events published by this worker.", ("kind",))
+RECEIVED  = metrics.counter("events_received_total", "Events received from other workers.", ("kind",))
+LAG       = metrics.histogram("event_bus_lag_seconds",
+                              "Time from publish on another worker to local dispatch.")
+
+_subscribers = defaultdict(list)
+_outbox      = deque(maxlen=OUTBOX_LIMIT)
+_wake        = None     # (read fd, write fd) once the bus is started
+_bus_thread  = None
+
+
+def is_open(status) -> bool:
+    return status in OPEN_STATUSES
+
+
+def subscribe(kind: str, handler):
+    _subscribers[kind].append(handler)
+
+
+def publish(kind: str, **payload):
+    _dispatch(kind, payload)
+    PUBLISHED.inc(kind)
+    if _bus_thread is None:
+        return
+    _outbox.append(json.dumps({"origin": _ORIGIN, "kind": kind, "sent": time.time(), "payload": payload},
+                              default=str))
+    try:
+        os.write(_wake[1], b"\0")
+    except BlockingIOError:
+        pass    # the bus already has a wake-up pending
+
+
+def _dispatch(kind: str, payload: dict):
+    for handler in _subscribers.get(kind, ()):
+        try:
+            handler(**payload)
+        except Exception as exc:
+            logger.warning(f"[Events] {kind} handler {handler.__qualname__} failed: {exc}")
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CROSS-WORKER BUS
+# ═══════════════════════════════════════════════════════════════════════════════
+def start_bus():
+    global _bus_thread, _wake
+    if _bus_thread is not None:
+        return _bus_thread
+    _wake = os.pipe()
+    os.set_blocking(_wake[1], False)
+    _bus_thread = threading.Thread(target=_bus_forever, name="event-bus", daemon=True)
+    _bus_thread.start()
+    return _bus_thread
+
+
+def _bus_forever():
+    reconnecting = False
+    while True:
+        conn = None
+        try:
+            conn = get_connection()
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute(f"LISTEN {EVENTS_CHANNEL}")
+            if reconnecting:
+                # Anything may have changed while we weren't listening.
+                _dispatch("resync", {})
+            while True:
+                _send(cursor)
+                readable, _, _ = select.select([conn, _wake[0]], [], [], 60)
+                if _wake[0] in readable:
+                    os.read(_wake[0], 4096)
+                if conn in readable:
+                    conn.poll()
+                    while conn.notifies:
+                        _receive(conn.notifies.pop(0).payload)
+        except Exception as exc:
+            logger.warning(f"[Events] bus dropped ({exc}), reconnecting.")
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        reconnecting = True
+        time.sleep(RECONNECT_SECONDS)
+
+
+def _send(cursor):
+    batch = []
+    while _outbox:
+        batch.append(_outbox.popleft())
+    if not batch:
+        return
+    try:
+        cursor.execute("SELECT pg_notify(%s, m) FROM unnest(%s::text[]) AS m", (EVENTS_CHANNEL, batch))
+    except Exception:
+        _outbox.extendleft(reversed(batch))
+        raise
+
+
+def _receive(raw: str):
+    try:
+        message = json.loads(raw)
+    except ValueError:
+        logger.warning(f"[Events] ignoring malformed notification {raw[:80]!r}")
+        return
+    if message.get("origin") == _ORIGIN:
+        return
+    kind = message.get("kind")
+    RECEIVED.inc(kind)
+    LAG.observe(max(0.0, time.time() - float(message.get("sent") or time.time())))
+    _dispatch(kind, message.get("payload") or {})
@@ -0,0 +1,279 @@
+"""
+services/forecasting.py
+─────────────────────────────────────────────────────────────────────────────
+Hourly arrival forecast per department, and the staffing it implies.
+
+Arrivals follow the week: Monday 09:00 looks like last Monday 09:00 far
+more than like Monday 03:00. Each department gets one baseline per
+hour-of-week slot (168 of them), exponentially smoothed across the last
+HISTORY_WEEKS weeks so recent weeks count most:
+
+  counts[dept][hour]          one GROUP BY date_trunc('hour') query over
+                              appointment_history (live + archived)
+       │
+       ▼  slot = weekday · 24 + hour,  weeks oldest → newest
+  level[slot] = mean(weeks)                             (start)
+  level[slot] = ALPHA · count(week) + (1 − ALPHA) · level[slot]
+
+  forecast(dept, t) = level[slot(t)]
+
+Aggregation happens in Postgres, so Python only ever sees
+departments × 168 × HISTORY_WEEKS small integers. Baselines are computed
+once per calendar day and cached; a day's arrivals are not used until the
+next day, so nothing is invalidated in between.
+
+Staffing: for each shift (services/schedule_index.SHIFT_WINDOWS) the
+peak forecast hour is turned into an offered load — doctors kept busy —
+using the department's mean predicted service time:
+
+  load   = peak arrivals/hour × mean service minutes / 60
+  needed = fewest doctors whose capacity covers load / TARGET_UTILIZATION,
+           where capacity follows department_capacity(): from two doctors
+           on, the least experienced is on standby at a reduced share
+
+needed is compared with the doctors rostered and available for that
+shift, and the shift is marked "activate", "standby" or "hold".
+
+accuracy() backtests the forecaster on the last BACKTEST_DAYS days, each
+day forecast from only the history before it, against the naive
+"same hour last week" forecast.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import logging
+import threading
+from datetime import date, datetime, timedelta
+
+from database import get_connection
+from services.reference_cache import reference_cache
+from services.rules_engine import rules_engine
+from services.schedule_index import SHIFT_WINDOWS, schedule_index, shift_interval
+from graph.department_graph import MAX_PATIENTS_PER_DOCTOR, department_capacity
+
+logger = logging.getLogger(__name__)
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+HISTORY_WEEKS      = 8
+ALPHA              = 0.3      # weight of the newest week per slot
+TARGET_UTILIZATION = 0.85
+MIN_DOCTORS        = 1        # every department keeps someone on every shift
+BACKTEST_DAYS      = 14
+
+SLOTS = 7 * 24
+
+
+def slot(at: datetime) -> int:
+    """Hour-of-week, 0 = Monday 00:00."""
+    return at.weekday() * 24 + at.hour
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MODEL — pure functions over {dept: {hour: count}}
+# ═══════════════════════════════════════════════════════════════════════════════
+def seasonal_baselines(counts: dict, day: date, weeks: int = HISTORY_WEEKS, alpha: float = ALPHA) -> dict:
+    """
+    {dept: [168 expected arrivals]} from the `weeks` weeks before `day`.
+    counts is {department_id: {hour datetime: arrivals}}; hours after day
+    00:00 are ignored, so one counts dict serves a whole backtest.
+    """
+    end   = _day_start(day)
+    start = end - timedelta(weeks=weeks)
+    baselines = {}
+    for dept_id, by_hour in counts.items():
+        grid = [[0] * SLOTS for _ in range(weeks)]     # grid[week][slot], oldest week first
+        for hour, n in by_hour.items():
+            if start <= hour < end:
+                grid[(hour - start).days // 7][slot(hour)] += n
+        level = [sum(week[s] for week in grid) / weeks for s in range(SLOTS)]
+        for week in grid:
+            level = [alpha * x + (1 - alpha) * l for x, l in zip(week, level)]
+        baselines[dept_id] = level
+    return baselines
+
+
+def doctors_needed(arrivals_per_hour: float, service_minutes: float,
+                   utilization: float = TARGET_UTILIZATION) -> int:
+    """Fewest doctors whose department_capacity() share covers the offered load."""
+    load = arrivals_per_hour * service_minutes / 60 / utilization
+    n = MIN_DOCTORS
+    while department_capacity(n) / MAX_PATIENTS_PER_DOCTOR < load:
+        n += 1
+    return n
+
+
+def _errors(pairs: list) -> dict:
+    """MAE / WAPE / bias of (predicted, actual) hourly counts."""
+    actual_total = sum(a for _, a in pairs)
+    abs_total    = sum(abs(p - a) for p, a in pairs)
+    return {"hours":    len(pairs),
+            "mae":      round(abs_total / len(pairs), 3) if pairs else 0.0,
+            "wape":     round(abs_total / actual_total, 3) if actual_total else None,
+            "bias":     round(sum(p - a for p, a in pairs) / len(pairs), 3) if pairs else 0.0}
+
+
+def backtest(counts: dict, last_day: date, days: int = BACKTEST_DAYS,
+             weeks: int = HISTORY_WEEKS, alpha: float = ALPHA) -> dict:
+    """
+    Forecasts each of the `days` days up to and including last_day from
+    the history before it, and scores the hourly forecasts per department.
+    """
+    forecast, naive = [], []
+    by_department = {}
+    for offset in range(days - 1, -1, -1):
+        day       = last_day - timedelta(days=offset)
+        baselines = seasonal_baselines(counts, day, weeks, alpha)
+        for dept_id, by_hour in counts.items():
+            level = baselines[dept_id]
+            for h in range(24):
+                hour   = _day_start(day) + timedelta(hours=h)
+                actual = by_hour.get(hour, 0)
+                forecast.append((level[slot(hour)], actual))
+                naive.append((by_hour.get(hour - timedelta(weeks=1), 0), actual))
+                by_department.setdefault(dept_id, []).append(forecast[-1])
+    return {"days": days, "weeks": weeks, "alpha": alpha,
+            "forecast":        _errors(forecast),
+            "naive_last_week": _errors(naive),
+            "by_department":   {dept_id: _errors(pairs) for dept_id, pairs in sorted(by_department.items())}}
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# FORECASTER
+# ═══════════════════════════════════════════════════════════════════════════════
+def load_counts(cursor, since: datetime, until: datetime) -> dict:
+    cursor.execute("""
+        SELECT department_id, date_trunc('hour', appointment_time), COUNT(*)
+        FROM appointment_history
+        WHERE appointment_time >= %s AND appointment_time < %s
+          AND status <> 'cancelled' AND department_id IS NOT NULL
+        GROUP BY 1, 2
+    """, (since, until))
+    counts = {}
+    for dept_id, hour, n in cursor.fetchall():
+        counts.setdefault(dept_id, {})[hour] = n
+    return counts
+
+
+def _mean_service_minutes(cursor, since: datetime) -> dict:
+    cursor.execute("""
+        SELECT department_id, AVG(predicted_service_time)
+        FROM appointment_history
+        WHERE appointment_time >= %s AND predicted_service_time > 0
+        GROUP BY 1
+    """, (since,))
+    return {dept_id: float(minutes) for dept_id, minutes in cursor.fetchall()}
+
+
+class ArrivalForecaster:
+
+    def __init__(self):
+        self._lock  = threading.Lock()
+        self._day   = None
+        self._model = None      # (baselines, mean service minutes) for self._day
+        self._accuracy = {}     # (day, days) → backtest report
+
+    def _with_cursor(self, cursor, fn):
+        if cursor is not None:
+            return fn(cursor)
+        conn = get_connection()
+        try:
+            return fn(conn.cursor())
+        finally:
+            conn.close()
+
+    def _ensure_model(self, cursor=None):
+        today = date.today()
+        with self._lock:
+            if self._day == today:
+                return self._model
+
+        def load(cursor):
+            since  = _day_start(today) - timedelta(weeks=HISTORY_WEEKS)
+            counts = load_counts(cursor, since, _day_start(today))
+            return seasonal_baselines(counts, today), _mean_service_minutes(cursor, since)
+
+        model = self._with_cursor(cursor, load)
+        with self._lock:
+            self._day, self._model = today, model
+        logger.info(f"[Forecast] baselines for {len(model[0])} departments from {HISTORY_WEEKS} weeks")
+        return model
+
+    def invalidate(self):
+        with self._lock:
+            self._day, self._model, self._accuracy = None, None, {}
+
+    # ── Queries ──────────────────────────────────────────────────────────────
+    def hourly(self, day: date, department_id: int | None = None, cursor=None) -> dict:
+        """{dept: [24 expected arrivals]} for the hours of `day`."""
+        baselines, _ = self._ensure_model(cursor)
+        first = slot(_day_start(day))
+        return {dept_id: [round(level[first + h], 2) for h in range(24)]
+                for dept_id, level in sorted(baselines.items())
+                if department_id is None or dept_id == department_id}
+
+    def staffing(self, day: date, cursor=None) -> list:
+        """Per department and shift on `day`: forecast, doctors needed, and the action."""
+        baselines, service = self._ensure_model(cursor)
+        # Departments without history: a plain adult routine visit.
+        default_minutes = rules_engine.estimate_service_time({"appointment_type": "routine", "age": 30})
+        plan = []
+        for name, dept_id in sorted(reference_cache.departments(cursor).items()):
+            level   = baselines.get(dept_id, [0.0] * SLOTS)
+            minutes = service.get(dept_id, default_minutes)
+            for shift in SHIFT_WINDOWS:
+                start, end = shift_interval(shift, day)
+                hours    = [start + timedelta(hours=h) for h in range(int((end - start).total_seconds() // 3600))]
+                expected = [level[slot(h)] for h in hours]
+                peak     = max(expected, default=0.0)
+                needed   = doctors_needed(peak, minutes)
+
+                middle    = start + (end - start) / 2
+                available = schedule_index.on_shift(dept_id, middle, cursor=cursor)
+                rostered  = schedule_index.on_shift(dept_id, middle, available_only=False, cursor=cursor)
+                off       = [d for d in rostered if d not in available]
+                if needed > len(available):
+                    action, doctors = "activate", off[:needed - len(available)]
+                elif needed < len(available):
+                    by_experience = sorted(available, key=lambda d: (reference_cache.doctor(d) or {})
+                                           .get("experience_years") or 0)
+                    action, doctors = "standby", by_experience[:len(available) - needed]
+                else:
+                    action, doctors = "hold", []
+                plan.append({
+                    "department_id": dept_id, "department": name, "shift": shift,
+                    "start": start.isoformat(), "end": end.isoformat(),
+                    "expected_arrivals": round(sum(expected), 1),
+                    "peak_arrivals_per_hour": round(peak, 2),
+                    "mean_service_minutes": round(minutes, 1),
+                    "doctors_needed": needed,
+                    "doctors_available": len(available),
+                    "doctors_rostered": len(rostered),
+                    "action": action,
+                    "change": needed - len(available),
+                    "doctor_ids": doctors,
+                })
+        return plan
+
+    def accuracy(self, days: int = BACKTEST_DAYS, cursor=None) -> dict:
+        """Backtest over the last `days` complete days, cached per day."""
+        today = date.today()
+        key   = (today, days)
+        with self._lock:
+            if key in self._accuracy:
+                return self._accuracy[key]
+
+        def load(cursor):
+            since = _day_start(today) - timedelta(days=days, weeks=HISTORY_WEEKS)
+            return load_counts(cursor, since, _day_start(today))
+
+        report = backtest(self._with_cursor(cursor, load), today - timedelta(days=1), days)
+        with self._lock:
+            self._accuracy = {k: v for k, v in self._accuracy.items() if k[0] == today}
+            self._accuracy[key] = report
+        return report
+
+
+arrival_forecaster = ArrivalForecaster()
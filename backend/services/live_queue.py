@@ -0,0 +1,219 @@
+"""
+services/live_queue.py
+─────────────────────────────────────────────────────────────────────────────
+Live per-doctor priority queues behind "call next patient".
+
+Finding a doctor's next patient used to mean the doctor_queue query plus a
+full optimize() sort. Each worker now keeps, per doctor, a heap of the
+waiting (scheduled / waiting) appointments keyed by rules_engine.queue_key,
+the same aged key optimize() sorts by. Keys are fixed at arrival, so an
+entry never has to be re-keyed while it waits:
+
+  live_queues.peek(doctor_id)            → next patient | None    O(1)
+  live_queues.pop(doctor_id, cursor)     → next patient, removed  O(log n)
+  live_queues.waiting(doctor_id)         → how many are waiting
+
+Kept in sync with the appointments table through the event bus:
+
+  first use of a doctor        one doctor_waiting query (open-appointment
+                               index, no table scan)
+  started / completed /        the entry is dropped, no database access
+  cancelled / deleted
+  created, or changed while    the id is marked pending; the next call
+  still waiting                re-reads pending ids by primary key
+                               (waiting_by_id) and pushes those still waiting
+  rules version changed        the doctor's heap is reloaded on next use
+  "resync"                     every heap is dropped
+
+Removal is lazy: an entry leaves the live set at once and is discarded
+when it reaches the top of the heap. A heap more than half dead is
+rebuilt.
+
+Heaps are per worker and advisory. POST /doctors/{id}/start re-checks the
+popped appointment under its row lock, so two workers never start the
+same patient; a stale top is skipped and the next one tried. Waiting times
+of everyone still queued are written back by refresh_worker, off the
+request path.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import heapq
+import threading
+from datetime import datetime
+
+from database import get_connection
+from services import events, metrics, query_catalog
+from services.rules_engine import MAX_SEVERITY, rules_engine
+
+WAITING       = ("scheduled", "waiting")
+LOAD_ATTEMPTS = 3
+
+SYNCS = metrics.counter("live_queue_syncs_total",
+                        "Live queue reads from the database, by kind (load, pending).", ("kind",))
+POPS  = metrics.counter("live_queue_pops_total",
+                        "Live queue pops, by outcome (started, stale, empty).", ("outcome",))
+
+
+def _patient(row) -> dict:
+    appointment_id, name, age, gender, disability, appointment_type, severity, arrival, hyper = row
+    _, level = rules_engine.calculate_priority(int(age or 0), str(gender or ""), bool(disability))
+    return {"appointment_id": appointment_id, "name": name, "age": age, "gender": gender,
+            "disability": bool(disability), "appointment_type": appointment_type or "routine",
+            "severity_score": min(max(int(severity or 0), 0), MAX_SEVERITY), "priority_level": level,
+            "arrival_time": arrival or datetime.now(), "is_hyper_emergency": bool(hyper)}
+
+
+def _key(patient: dict) -> tuple:
+    return rules_engine.queue_key(rules_engine.priority_weight(patient["priority_level"]),
+                                  patient["severity_score"], patient["arrival_time"],
+                                  hyper=patient["is_hyper_emergency"])
+
+
+class LiveQueues:
+
+    def __init__(self):
+        self._lock    = threading.Lock()
+        self._heaps   = {}   # doctor_id → [(key, appointment_id)], lazily pruned
+        self._live    = {}   # doctor_id → {appointment_id: (key, patient)}
+        self._rules   = {}   # doctor_id → rules version the keys were computed under
+        self._pending = {}   # doctor_id → {appointment_id} to re-read; present once loading starts
+        self._epoch   = 0    # bumped by "resync"
+
+    # ── Reads ────────────────────────────────────────────────────────────────
+    def peek(self, doctor_id: int, cursor=None):
+        self.sync(doctor_id, cursor)
+        with self._lock:
+            top = self._top(doctor_id)
+            return None if top is None else self._response(top[1])
+
+    def pop(self, doctor_id: int, cursor=None):
+        """Removes and returns the next patient. The caller must still check it under its row lock."""
+        self.sync(doctor_id, cursor)
+        with self._lock:
+            top = self._top(doctor_id)
+            if top is None:
+                POPS.inc("empty")
+                return None
+            heapq.heappop(self._heaps[doctor_id])
+            del self._live[doctor_id][top[0]]
+            self._compact(doctor_id)
+            return self._response(top[1])
+
+    def waiting(self, doctor_id: int) -> int:
+        with self._lock:
+            return len(self._live.get(doctor_id, ()))
+
+    def requeue(self, doctor_id: int, appointment_id: int):
+        """A popped appointment was not started after all: re-read it on the next call."""
+        with self._lock:
+            if doctor_id in self._pending:
+                self._pending[doctor_id].add(appointment_id)
+
+    def _top(self, doctor_id: int):
+        """(appointment_id, patient) at the top of the heap, dead entries discarded. Holds _lock."""
+        heap, live = self._heaps.get(doctor_id), self._live.get(doctor_id)
+        while heap:
+            key, appointment_id = heap[0]
+            entry = live.get(appointment_id)
+            if entry is not None and entry[0] == key:
+                return appointment_id, entry[1]
+            heapq.heappop(heap)
+        return None
+
+    @staticmethod
+    def _response(patient: dict) -> dict:
+        return {**patient, "arrival_time": str(patient["arrival_time"])}
+
+    # ── Sync with the appointments table ─────────────────────────────────────
+    def load(self, doctor_id: int, rows: list):
+        """Replaces doctor_id's heap with `rows` (doctor_waiting columns)."""
+        live = {}
+        for row in rows:
+            patient = _patient(row)
+            live[patient["appointment_id"]] = (_key(patient), patient)
+        heap = [(key, appointment_id) for appointment_id, (key, _) in live.items()]
+        heapq.heapify(heap)
+        with self._lock:
+            self._live[doctor_id], self._heaps[doctor_id] = live, heap
+            self._rules[doctor_id] = rules_engine.version
+            self._pending.setdefault(doctor_id, set())
+
+    def sync(self, doctor_id: int, cursor=None):
+        """Loads doctor_id's heap on first use and applies pending changes; no query when up to date."""
+        own_conn = None
+        try:
+            for _ in range(LOAD_ATTEMPTS):
+                with self._lock:
+                    loaded = doctor_id in self._live and self._rules.get(doctor_id) == rules_engine.version
+                    pending = self._pending.get(doctor_id) if loaded else None
+                    if loaded and not pending:
+                        return
+                    if not loaded:
+                        # Until load() installs the new heap, every event is kept as pending.
+                        self._live.pop(doctor_id, None)
+                        self._heaps.pop(doctor_id, None)
+                    self._pending[doctor_id] = set()
+                    epoch = self._epoch
+
+                if cursor is None:
+                    own_conn = get_connection()
+                    cursor   = own_conn.cursor()
+
+                if not loaded:
+                    SYNCS.inc("load")
+                    rows = query_catalog.execute(cursor, "doctor_waiting", (doctor_id,)).fetchall()
+                    if self._epoch == epoch:
+                        self.load(doctor_id, rows)
+                    continue
+
+                SYNCS.inc("pending")
+                rows = query_catalog.execute(cursor, "waiting_by_id", (list(pending),)).fetchall()
+                with self._lock:
+                    heap, live = self._heaps.get(doctor_id), self._live.get(doctor_id)
+                    if live is None or self._epoch != epoch:
+                        continue
+                    for appointment_id in pending:
+                        live.pop(appointment_id, None)
+                    for row in rows:
+                        if row[0] != doctor_id:
+                            continue                        # moved to another doctor
+                        patient = _patient(row[1:])
+                        key     = _key(patient)
+                        live[patient["appointment_id"]] = (key, patient)
+                        heapq.heappush(heap, (key, patient["appointment_id"]))
+                    self._compact(doctor_id)
+        finally:
+            if own_conn is not None:
+                own_conn.close()
+
+    def _compact(self, doctor_id: int):
+        """Rebuilds a heap that is mostly dead entries. Holds _lock."""
+        live = self._live[doctor_id]
+        if len(self._heaps[doctor_id]) > 2 * len(live) + 16:
+            self._heaps[doctor_id] = [(key, appointment_id) for appointment_id, (key, _) in live.items()]
+            heapq.heapify(self._heaps[doctor_id])
+
+    def on_appointment(self, doctor_id, appointment_id=None, before=None, after=None, **_):
+        with self._lock:
+            if doctor_id not in self._pending:
+                return                                      # not loaded in this worker
+            live = self._live.get(doctor_id)
+            if after in WAITING or live is None:
+                self._pending[doctor_id].add(appointment_id)
+            else:
+                live.pop(appointment_id, None)
+                self._pending[doctor_id].discard(appointment_id)
+
+    def on_resync(self, **_):
+        with self._lock:
+            self._heaps.clear()
+            self._live.clear()
+            self._rules.clear()
+            self._pending.clear()
+            self._epoch += 1
+
+
+live_queues = LiveQueues()
+
+events.subscribe("appointment", live_queues.on_appointment)
+events.subscribe("resync", live_queues.on_resync)
@@ -0,0 +1,325 @@
+"""
+services/metrics.py
+─────────────────────────────────────────────────────────────────────────────
+Request-level performance instrumentation, exposed in Prometheus text format.
+
+Three producers feed one in-process registry:
+
+  MetricsMiddleware   ← ASGI middleware, wraps every request
+                         http_request_duration_seconds{method,path,status}
+  TimedCursor         ← cursor_factory used by database.get_connection()
+                         db_connect_seconds, db_query_seconds{statement}
+  timed("optimizer")  ← context manager around any in-process phase
+                         phase_duration_seconds{phase}   (optimizer, llm, ...)
+
+Each request also gets a RequestProfile (via contextvars, so it follows the
+request into FastAPI's threadpool). When a request takes longer than
+SLOW_REQUEST_MS, the profile is logged with a per-statement breakdown:
+
+  [Slow] POST /appointments 412.3ms (14 q)  db_connect=3.1ms sql=380.2ms optimizer=2.0ms other=26.9ms
+         181.4ms  x12   UPDATE appointments SET waiting_time=%s, ...
+
+"other" is whatever isn't attributed to an exclusive phase — mostly routing
+and response serialization.
+
+Registries are per process; with several uvicorn workers each one exposes
+its own /metrics and Prometheus aggregates across targets.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import re
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+# 0 disables the slow-request log.
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# SQL statements are used as label values; keep them short and stable.
+STATEMENT_LABEL_CHARS = 120
+
+# Phases that never nest inside each other. Wrapper phases such as
+# "queue_refresh" (SQL + optimizer) are reported but not subtracted twice.
+EXCLUSIVE_PHASES = ("db_connect", "sql", "optimizer", "llm")
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# REGISTRY
+# ═══════════════════════════════════════════════════════════════════════════════
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name       = name
+        self.help       = help_text
+        self.labelnames = tuple(labelnames)
+        self._values    = {}
+        self._lock      = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge:
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name       = name
+        self.help       = help_text
+        self.labelnames = tuple(labelnames)
+        self._values    = {}
+        self._lock      = threading.Lock()
+
+    def set(self, value, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name       = name
+        self.help       = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets    = tuple(buckets)
+        self._series    = {}   # labelvalues → [bucket_counts, sum, count]
+        self._lock      = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * len(self.buckets), 0.0, 0]
+            if idx < len(self.buckets):
+                series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def totals(self, *labelvalues) -> tuple:
+        """(count, sum) of one series."""
+        with self._lock:
+            series = self._series.get(labelvalues)
+            return (series[2], series[1]) if series else (0, 0.0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    lines.append(f"{self.name}_bucket{_labels(names, key + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels(names, key + ('+Inf',))} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+_REGISTRY = []
+
+
+def _register(metric):
+    _REGISTRY.append(metric)
+    return metric
+
+
+def counter(name, help_text, labelnames=()) -> Counter:
+    return _register(Counter(name, help_text, labelnames))
+
+
+def gauge(name, help_text, labelnames=()) -> Gauge:
+    return _register(Gauge(name, help_text, labelnames))
+
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help_text, labelnames, buckets))
+
+
+def render() -> str:
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ─── BUILT-IN METRICS ─────────────────────────────────────────────────────────
+HTTP_DURATION = histogram("http_request_duration_seconds", "End-to-end request latency.",
+                          ("method", "path", "status"))
+DB_CONNECT    = histogram("db_connect_seconds", "Time spent opening a database connection.")
+DB_QUERY      = histogram("db_query_seconds", "Duration of individual SQL statements.",
+                          ("statement",))
+PHASE         = histogram("phase_duration_seconds", "Duration of in-process phases (optimizer, llm, ...).",
+                          ("phase",))
+SLOW_REQUESTS = counter("http_slow_requests_total", "Requests slower than SLOW_REQUEST_MS.",
+                        ("method", "path"))
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# PER-REQUEST PROFILE
+# ═══════════════════════════════════════════════════════════════════════════════
+class RequestProfile:
+
+    def __init__(self):
+        self.phases  = {}   # phase → seconds
+        self.queries = {}   # statement → [count, seconds]
+
+    def add_phase(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add_query(self, statement, seconds):
+        entry = self.queries.setdefault(statement, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+        self.add_phase("sql", seconds)
+
+
+_profile = contextvars.ContextVar("request_profile", default=None)
+
+
+def current_profile():
+    return _profile.get()
+
+
+@contextmanager
+def timed(phase: str):
+    """Times a block into phase_duration_seconds{phase} and the request profile."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        PHASE.observe(elapsed, phase)
+        profile = _profile.get()
+        if profile is not None:
+            profile.add_phase(phase, elapsed)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# DATABASE
+# ═══════════════════════════════════════════════════════════════════════════════
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_label(query) -> str:
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    text = _WHITESPACE.sub(" ", str(query)).strip()
+    return text[:STATEMENT_LABEL_CHARS]
+
+
+def record_query(query, seconds):
+    label = statement_label(query)
+    DB_QUERY.observe(seconds, label)
+    profile = _profile.get()
+    if profile is not None:
+        profile.add_query(label, seconds)
+
+
+def record_connect(seconds):
+    DB_CONNECT.observe(seconds)
+    profile = _profile.get()
+    if profile is not None:
+        profile.add_phase("db_connect", seconds)
+
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """Drop-in psycopg2 cursor that times every execute()."""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(query, time.perf_counter() - start)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ASGI MIDDLEWARE
+# ═══════════════════════════════════════════════════════════════════════════════
+class MetricsMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token   = _profile.set(profile)
+        status  = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _profile.reset(token)
+            route = scope.get("route")
+            path  = getattr(route, "path", None) or "<unmatched>"
+            HTTP_DURATION.observe(elapsed, scope["method"], path, status["code"])
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                SLOW_REQUESTS.inc(scope["method"], path)
+                _log_slow(scope["method"], path, elapsed, profile)
+
+
+def _log_slow(method, path, elapsed, profile):
+    attributed = sum(profile.phases.get(p, 0.0) for p in EXCLUSIVE_PHASES)
+    parts = [f"{name}={seconds * 1000:.1f}ms" for name, seconds in profile.phases.items()]
+    parts.append(f"other={max(elapsed - attributed, 0) * 1000:.1f}ms")
+    n_queries = sum(count for count, _ in profile.queries.values())
+
+    lines = [f"[Slow] {method} {path} {elapsed * 1000:.1f}ms ({n_queries} q)  " + " ".join(parts)]
+    for statement, (count, seconds) in sorted(profile.queries.items(), key=lambda kv: -kv[1][1]):
+        lines.append(f"    {seconds * 1000:8.1f}ms  x{count:<4} {statement}")
+    logger.warning("\n".join(lines))
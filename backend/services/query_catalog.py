@@ -0,0 +1,169 @@
+"""
+services/query_catalog.py
+─────────────────────────────────────────────────────────────────────────────
+The hot SQL, prepared once per database session and run by name.
+
+The doctor-queue SELECTs, the doctor-lock probe and the routing / reference
+reloads run thousands of times an hour. Sent as text, every call is parsed,
+analyzed and planned again. Each statement here is PREPAREd the first time
+a pooled session (database.py) runs it; after that the session only sends
+
+  EXECUTE doctor_queue(%s)
+
+and Postgres reuses the parse tree and, once it settles on a generic plan
+(after five executions), the plan too. The set of names a session holds is
+session.prepared; sessions live in the pool, so the PREPARE is paid once
+per session rather than once per request.
+
+  execute(cursor, "doctor_queue", (doctor_id,))   → cursor, ready to fetch
+
+Timings, per statement name:
+
+  query_prepare_seconds{query}    PREPARE, once per session
+  query_execute_seconds{query}    EXECUTE round-trip
+  query_plan_seconds{query}       Postgres planning time, sampled with
+                                  EXPLAIN (SUMMARY) EXECUTE on a session's
+                                  first execution and every PLAN_SAMPLE_EVERY
+  GET /metrics/queries            the same, summarized per statement
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import time
+import threading
+import weakref
+
+from services import metrics
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+PLAN_SAMPLE_EVERY = int(os.getenv("QUERY_PLAN_SAMPLE_EVERY", "500"))
+
+FINE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+
+PREPARE_SECONDS = metrics.histogram("query_prepare_seconds", "PREPARE of catalog statements, once per session.",
+                                    ("query",), buckets=FINE_BUCKETS)
+EXECUTE_SECONDS = metrics.histogram("query_execute_seconds", "EXECUTE round-trips of catalog statements.",
+                                    ("query",), buckets=FINE_BUCKETS)
+PLAN_SECONDS    = metrics.histogram("query_plan_seconds",
+                                    "Postgres planning time of catalog statements (sampled).",
+                                    ("query",), buckets=FINE_BUCKETS)
+
+# name → (parameter types, statement)
+CATALOG = {
+    # get_optimized_queue, _preview_waiting_time
+    "doctor_queue": (("int",), """
+        SELECT a.appointment_id, p.name, p.age, p.gender, p.disability,
+               a.appointment_type, a.severity_score, a.appointment_time, a.is_hyper_emergency
+        FROM appointments a JOIN patients p ON a.patient_id=p.patient_id
+        WHERE a.doctor_id=$1 AND a.status IN ('scheduled','waiting','in-progress')
+    """),
+    # refresh_queues (_refresh_queue_waiting_times, queue-refresh worker)
+    "doctor_queues": (("int[]",), """
+        SELECT a.doctor_id, a.appointment_id, p.name, p.age, p.gender, p.disability,
+               a.appointment_type, a.severity_score, a.appointment_time, a.is_hyper_emergency,
+               a.waiting_time, a.predicted_service_time, a.priority_score
+        FROM appointments a JOIN patients p ON a.patient_id=p.patient_id
+        WHERE a.doctor_id = ANY($1) AND a.status IN ('scheduled','waiting','in-progress')
+    """),
+    # live_queue: a doctor's waiting patients on first use, and changed ones by id
+    "doctor_waiting": (("int",), """
+        SELECT a.appointment_id, p.name, p.age, p.gender, p.disability,
+               a.appointment_type, a.severity_score, a.appointment_time, a.is_hyper_emergency
+        FROM appointments a JOIN patients p ON a.patient_id=p.patient_id
+        WHERE a.doctor_id=$1 AND a.status IN ('scheduled','waiting')
+    """),
+    "waiting_by_id": (("int[]",), """
+        SELECT a.doctor_id, a.appointment_id, p.name, p.age, p.gender, p.disability,
+               a.appointment_type, a.severity_score, a.appointment_time, a.is_hyper_emergency
+        FROM appointments a JOIN patients p ON a.patient_id=p.patient_id
+        WHERE a.appointment_id = ANY($1) AND a.status IN ('scheduled','waiting')
+    """),
+    # complete_current_patient: the doctor's longest-running visit
+    "doctor_in_progress": (("int",), """
+        SELECT appointment_id, department_id FROM appointments
+        WHERE doctor_id=$1 AND status='in-progress'
+        ORDER BY started_at NULLS LAST, appointment_id
+        LIMIT 1 FOR UPDATE SKIP LOCKED
+    """),
+    # doctor_locks: doctors of $1 whose lock is busy
+    "doctor_lock": (("int[]", "int"), """
+        SELECT d FROM unnest($1) AS d WHERE NOT pg_try_advisory_xact_lock($2, d)
+    """),
+    "doctor_lock_shared": (("int[]", "int"), """
+        SELECT d FROM unnest($1) AS d WHERE NOT pg_try_advisory_xact_lock_shared($2, d)
+    """),
+    # _lock_appointment
+    "appointment_doctor": (("int",), """
+        SELECT doctor_id FROM appointments WHERE appointment_id=$1
+    """),
+    "appointment_for_update": (("int",), """
+        SELECT doctor_id, status, department_id FROM appointments WHERE appointment_id=$1 FOR UPDATE
+    """),
+    # routing_index.reconcile — the old least-loaded GROUP BY
+    "open_counts": ((), """
+        SELECT d.doctor_id, COALESCE(COUNT(a.appointment_id),0)
+        FROM doctors d
+        LEFT JOIN appointments a
+            ON d.doctor_id = a.doctor_id AND a.status IN ('scheduled','waiting','in-progress')
+        GROUP BY d.doctor_id
+    """),
+    # reference_cache — department and doctor lookups
+    "departments": ((), "SELECT department_id, name FROM departments"),
+    "doctors":     ((), "SELECT doctor_id, name, department_id, experience_years, status FROM doctors"),
+}
+
+_lock       = threading.Lock()
+_executions = {}                            # name → executions in this process
+_unpooled   = weakref.WeakKeyDictionary()   # connections not from database.get_connection()
+
+
+def _prepared_on(conn) -> set:
+    prepared = getattr(conn, "prepared", None)
+    if prepared is None:
+        prepared = _unpooled.setdefault(conn, set())
+    return prepared
+
+
+def prepare(cursor, name: str):
+    """PREPAREs `name` on the cursor's session unless it already holds it."""
+    prepared = _prepared_on(cursor.connection)
+    if name in prepared:
+        return
+    types, statement = CATALOG[name]
+    signature = f"({', '.join(types)})" if types else ""
+    start = time.perf_counter()
+    cursor.execute(f"PREPARE {name}{signature} AS {statement}")
+    PREPARE_SECONDS.observe(time.perf_counter() - start, name)
+    prepared.add(name)
+
+
+def execute(cursor, name: str, params: tuple = ()):
+    """Runs catalog statement `name` with params; returns the cursor to fetch from."""
+    fresh = name not in _prepared_on(cursor.connection)
+    prepare(cursor, name)
+    call = f"{name}({', '.join(['%s'] * len(params))})" if params else name
+
+    with _lock:
+        n = _executions[name] = _executions.get(name, 0) + 1
+    if fresh or n % PLAN_SAMPLE_EVERY == 0:
+        cursor.execute(f"EXPLAIN (SUMMARY, FORMAT JSON) EXECUTE {call}", params)
+        PLAN_SECONDS.observe(cursor.fetchone()[0][0]["Planning Time"] / 1000, name)
+
+    start = time.perf_counter()
+    cursor.execute(f"EXECUTE {call}", params)
+    EXECUTE_SECONDS.observe(time.perf_counter() - start, name)
+    return cursor
+
+
+def stats() -> dict:
+    """Per statement: executions, prepares and mean prepare / plan / execute ms."""
+    summary = {}
+    for name in CATALOG:
+        entry = {"executions": _executions.get(name, 0)}
+        for key, histogram in (("prepare", PREPARE_SECONDS), ("plan", PLAN_SECONDS),
+                               ("execute", EXECUTE_SECONDS)):
+            count, total = histogram.totals(name)
+            entry[f"{key}_count"]   = count
+            entry[f"{key}_mean_ms"] = round(total / count * 1000, 4) if count else None
+        summary[name] = entry
+    return summary
@@ -0,0 +1,258 @@
+"""
+services/queue_versions.py
+─────────────────────────────────────────────────────────────────────────────
+Versioned snapshots of each doctor's optimized queue, so pollers (the
+reschedule explainer) fetch what changed instead of the whole queue.
+
+Every time a doctor's queue is computed (GET /appointments/optimized-queue
+or its /changes variant) the result is recorded here. If the order or any
+wait differs from the last snapshot, the doctor's version goes up by one and
+the snapshot is appended to a ring of the last RING_VERSIONS versions:
+
+  record(doctor_id, generation, queue, patients)   → version token
+  current(doctor_id)           → latest version, or None when it is stale
+  changes(doctor_id, since)    → {version, full: False, changes: […]}
+                                 or {version, full: True, optimized_queue}
+
+A snapshot is stale once an "appointment" event for the doctor arrives (any
+worker), on "rules" / "resync", or after MAX_AGE_SECONDS (the service-time
+model drifts without events). Each doctor has an event generation; record()
+takes the generation read *before* the queue was queried, so a change that
+lands mid-computation still leaves the snapshot stale.
+
+Each change carries a reason:
+
+  inserted   "hyper-emergency added", "new emergency patient", …
+  removed    "completed", "cancelled", "deleted", or "left the queue"
+  moved      "hyper-emergency inserted ahead", "patient ahead completed",
+             "overtaken by higher-priority patient", …
+  wait       same reasons when the position held but the wait changed,
+             else "service-time estimate changed"
+  shifted    a run of consecutive patients that moved together (everyone
+             behind an insert or removal): previous_position, position,
+             count, ids, wait_delta_minutes and one reason
+
+Versions live in this worker's memory. Tokens are "<instance>.<n>"; a
+token from another worker, or one older than the ring, gets a full resync
+(full: True) with the current token to poll from.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict, deque
+
+from services import events, metrics
+
+RING_VERSIONS   = int(os.getenv("QUEUE_VERSION_RING", "32"))
+MAX_AGE_SECONDS = float(os.getenv("QUEUE_VERSION_MAX_AGE_MS", "5000")) / 1000
+DEPARTED_KEEP   = 256          # removal reasons remembered per doctor
+INSTANCE        = uuid.uuid4().hex[:8]
+
+RESPONSES = metrics.counter("queue_changes_responses_total",
+                            "Queue /changes responses, by kind (delta, unchanged, full).", ("kind",))
+VERSIONS  = metrics.counter("queue_versions_total", "New queue versions recorded.")
+
+
+def _kind(entry: dict) -> str:
+    if entry["hyper"]:
+        return "hyper-emergency"
+    if entry["appointment_type"] == "emergency":
+        return "emergency patient"
+    return f"{entry['priority_level'].lower()}-priority patient"
+
+
+def _plural(n: int, what: str) -> str:
+    if n == 1:
+        return what
+    return f"{n} " + (what.replace("patient", "patients", 1) if "patient" in what else what[:-1] + "ies")
+
+
+class QueueVersions:
+
+    def __init__(self, ring: int = RING_VERSIONS):
+        self.ring        = ring
+        self._lock       = threading.Lock()
+        self._history    = {}   # doctor_id → deque[(n, {id: entry}, queue)]
+        self._latest     = {}   # doctor_id → (n, generation, computed_at)
+        self._generation = {}   # doctor_id → event count
+        self._epoch      = 0    # bumped by rules / resync: every doctor stale
+        self._departed   = {}   # doctor_id → OrderedDict{appointment_id: reason}
+
+    # ── Staleness ────────────────────────────────────────────────────────────
+    def generation(self, doctor_id: int) -> tuple:
+        with self._lock:
+            return (self._epoch, self._generation.get(doctor_id, 0))
+
+    def current(self, doctor_id: int):
+        """Latest version token, or None when the queue must be recomputed."""
+        with self._lock:
+            latest = self._latest.get(doctor_id)
+            if (latest is None or latest[1] != (self._epoch, self._generation.get(doctor_id, 0))
+                    or time.monotonic() - latest[2] > MAX_AGE_SECONDS):
+                return None
+            return f"{INSTANCE}.{latest[0]}"
+
+    def on_appointment(self, doctor_id, appointment_id=None, before=None, after=None, **_):
+        with self._lock:
+            self._generation[doctor_id] = self._generation.get(doctor_id, 0) + 1
+            if before is not None and not events.is_open(after):
+                departed = self._departed.setdefault(doctor_id, OrderedDict())
+                departed[appointment_id] = after or "deleted"
+                while len(departed) > DEPARTED_KEEP:
+                    departed.popitem(last=False)
+
+    def on_reset(self, **_):
+        with self._lock:
+            self._epoch += 1
+
+    # ── Recording ────────────────────────────────────────────────────────────
+    def record(self, doctor_id: int, generation: tuple, queue: list, patients: list) -> str:
+        """
+        queue: optimize() output, start/end times already strings.
+        patients: optimize() input (appointment_type, is_hyper_emergency).
+        generation: self.generation(doctor_id) taken before the queue was read.
+        """
+        by_id   = {p["id"]: p for p in patients}
+        entries = {e["id"]: {"position": i + 1, "name": e["name"],
+                             "waiting_time_minutes": e["waiting_time_minutes"],
+                             "priority_level": e["priority_level"],
+                             "appointment_type": by_id[e["id"]].get("appointment_type") or "routine",
+                             "hyper": bool(by_id[e["id"]].get("is_hyper_emergency"))}
+                   for i, e in enumerate(queue)}
+        with self._lock:
+            history = self._history.setdefault(doctor_id, deque(maxlen=self.ring))
+            n = history[-1][0] if history else 0
+            if not history or self._differs(history[-1][1], entries):
+                n += 1
+                history.append((n, entries, queue))
+                VERSIONS.inc()
+            self._latest[doctor_id] = (n, generation, time.monotonic())
+            return f"{INSTANCE}.{n}"
+
+    @staticmethod
+    def _differs(old: dict, new: dict) -> bool:
+        if old.keys() != new.keys():
+            return True
+        return any(old[i]["position"] != e["position"]
+                   or old[i]["waiting_time_minutes"] != e["waiting_time_minutes"]
+                   for i, e in new.items())
+
+    # ── Reading ──────────────────────────────────────────────────────────────
+    def changes(self, doctor_id: int, since: str = "") -> dict:
+        """Changes from version `since` to the latest recorded one."""
+        with self._lock:
+            history = self._history.get(doctor_id)
+            if not history:
+                RESPONSES.inc("full")
+                return {"version": None, "full": True, "optimized_queue": []}
+            n, entries, queue = history[-1]
+            old = None
+            instance, _, number = (since or "").partition(".")
+            if instance == INSTANCE and number.isdigit():
+                old = next((h[1] for h in history if h[0] == int(number)), None)
+            departed = dict(self._departed.get(doctor_id, {}))
+
+        version = f"{INSTANCE}.{n}"
+        if old is None:
+            RESPONSES.inc("full")
+            return {"version": version, "full": True, "optimized_queue": queue}
+        diff = self.diff(old, entries, departed)
+        RESPONSES.inc("delta" if diff else "unchanged")
+        return {"version": version, "since": since, "full": False, "changes": diff}
+
+    @staticmethod
+    def diff(old: dict, new: dict, departed: dict = None) -> list:
+        """Entry changes between two snapshots ({id: entry}), with reasons."""
+        departed = departed or {}
+        inserted = {i: e for i, e in new.items() if i not in old}
+        removed  = {i: e for i, e in old.items() if i not in new}
+        changes  = []
+
+        for i, e in sorted(removed.items(), key=lambda kv: kv[1]["position"]):
+            changes.append({"change": "removed", "id": i, "name": e["name"],
+                            "previous_position": e["position"],
+                            "reason": departed.get(i, "left the queue")})
+
+        for i, e in sorted(new.items(), key=lambda kv: kv[1]["position"]):
+            if i in inserted:
+                kind = _kind(e)
+                changes.append({"change": "inserted", "id": i, "name": e["name"],
+                                "position": e["position"],
+                                "waiting_time_minutes": e["waiting_time_minutes"],
+                                "reason": f"{kind} added" if kind == "hyper-emergency" else f"new {kind}"})
+                continue
+            before = old[i]
+            moved  = before["position"] != e["position"]
+            delta  = round(e["waiting_time_minutes"] - before["waiting_time_minutes"], 2)
+            if not moved and not delta:
+                continue
+
+            reasons = []
+            ahead_in = [x for x in inserted.values() if x["position"] < e["position"]]
+            if ahead_in:
+                kinds = {_kind(x) for x in ahead_in}
+                kind  = "hyper-emergency" if "hyper-emergency" in kinds else kinds.pop() if len(kinds) == 1 else "patient"
+                reasons.append(f"{_plural(len(ahead_in), kind)} inserted ahead")
+            ahead_out = [x for x in removed if removed[x]["position"] < before["position"]]
+            if ahead_out:
+                outcomes = {departed.get(x, "left the queue") for x in ahead_out}
+                outcome  = outcomes.pop() if len(outcomes) == 1 else "left the queue"
+                reasons.append(f"{_plural(len(ahead_out), 'patient')} ahead {outcome}")
+            if not reasons:
+                # rank among the patients in both snapshots
+                was, now = before["position"] - len(ahead_out), e["position"] - len(ahead_in)
+                reasons.append("overtaken by higher-priority patient" if now > was else
+                               "moved ahead of lower-priority patient" if now < was else
+                               "service-time estimate changed")
+
+            changes.append({"change": "moved" if moved else "wait", "id": i, "name": e["name"],
+                            "previous_position": before["position"], "position": e["position"],
+                            "waiting_time_minutes": e["waiting_time_minutes"],
+                            "wait_delta_minutes": delta, "reason": "; ".join(reasons)})
+        return _collapse(changes, old)
+
+
+def _collapse(changes: list, old: dict) -> list:
+    """
+    Runs of consecutive patients that all moved by the same offset, with the
+    same wait delta and reason (everyone behind an insert or a removal),
+    become one "shifted" entry: previous_position … previous_position+count-1
+    are now at position …, each wait + wait_delta_minutes.
+    """
+    def same_run(run, c):
+        last = run[-1]
+        return (c["change"] in ("moved", "wait") and last["change"] in ("moved", "wait")
+                and c["position"] == last["position"] + 1
+                and c["previous_position"] == last["previous_position"] + 1
+                and c["wait_delta_minutes"] == last["wait_delta_minutes"]
+                and c["reason"] == last["reason"])
+
+    def shifted(run):
+        if len(run) == 1:
+            return run
+        first, delta = run[0], run[0]["wait_delta_minutes"]
+        if any(round(old[c["id"]]["waiting_time_minutes"] + delta, 2) != c["waiting_time_minutes"]
+                                for c in run):
+            return run
+        return [{"change": "shifted", "previous_position": first["previous_position"],
+                 "position": first["position"], "count": len(run), "ids": [c["id"] for c in run],
+                 "wait_delta_minutes": delta, "reason": first["reason"]}]
+
+    collapsed, run = [], []
+    for c in changes:
+        if run and same_run(run, c):
+            run.append(c)
+            continue
+        collapsed += shifted(run) if run else []
+        run = [c]
+    return collapsed + (shifted(run) if run else [])
+
+
+queue_versions = QueueVersions()
+
+events.subscribe("appointment", queue_versions.on_appointment)
+events.subscribe("rules", queue_versions.on_reset)
+events.subscribe("resync", queue_versions.on_reset)
@@ -0,0 +1,166 @@
+"""
+services/reference_cache.py
+─────────────────────────────────────────────────────────────────────────────
+Process-local reference cache for departments and doctors.
+
+Departments almost never change and doctors change rarely, yet nearly every
+write endpoint used to run `SELECT department_id FROM departments WHERE name=%s`
+before doing real work. This module keeps both tables in memory:
+
+  departments : name ↔ department_id
+  doctors     : doctor_id → {name, department_id, experience_years, status}
+
+Lifecycle:
+  1. reference_cache.warm()            ← main.py lifespan, once per worker
+  2. reference_cache.department_id()   ← O(1) dict lookup on every hot path
+  3. "doctor" events                   ← after /doctors POST and status toggles,
+                                         in this worker and, through the event
+                                         bus, in every other one (put_doctor)
+  4. "resync" event                    ← the bus reconnected; invalidate
+
+If the cache is cold (DB was down at startup, or the event bus reconnected)
+ the next lookup reloads both tables in one round-trip.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import time
+import logging
+import threading
+
+from database import get_connection
+from services import events, query_catalog
+
+logger = logging.getLogger(__name__)
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+# A lookup for an unknown department name reloads at most this often, so a
+# department inserted straight into the DB is picked up without letting bad
+# input turn every request back into a round-trip.
+MISS_RELOAD_SECONDS = 30
+
+
+class ReferenceCache:
+
+    def __init__(self):
+        self._lock          = threading.Lock()
+        self._dept_by_name  = {}
+        self._dept_by_id    = {}
+        self._doctors       = {}
+        self._by_dept       = {}
+        self._loaded        = False
+        self._last_miss_reload = 0.0
+        # Bumped on every change so dependent indexes can tell their copy is stale.
+        self.generation     = 0
+
+    # ── Loading ──────────────────────────────────────────────────────────────
+    def warm(self, cursor=None) -> bool:
+        """Loads departments and doctors. Returns False if the DB is unreachable."""
+        try:
+            if cursor is not None:
+                self._load(cursor)
+            else:
+                conn = get_connection()
+                try:
+                    self._load(conn.cursor())
+                finally:
+                    conn.close()
+            return True
+        except Exception as exc:
+            logger.warning(f"[RefCache] warm failed ({exc}), will retry on first lookup.")
+            return False
+
+    def _load(self, cursor):
+        dept_rows   = query_catalog.execute(cursor, "departments").fetchall()
+        doctor_rows = query_catalog.execute(cursor, "doctors").fetchall()
+
+        by_name = {name: dept_id for dept_id, name in dept_rows}
+        by_id   = {dept_id: name for dept_id, name in dept_rows}
+        doctors = {r[0]: {"doctor_id": r[0], "name": r[1], "department_id": r[2],
+                          "experience_years": r[3] or 0, "status": r[4]}
+                   for r in doctor_rows}
+
+        with self._lock:
+            self._dept_by_name = by_name
+            self._dept_by_id   = by_id
+            self._doctors      = doctors
+            self._by_dept      = _group_by_department(doctors)
+            self._loaded       = True
+            self.generation   += 1
+        logger.info(f"[RefCache] loaded {len(by_name)} departments, {len(doctors)} doctors")
+
+    def _ensure_loaded(self, cursor=None):
+        if not self._loaded:
+            self.warm(cursor)
+
+    def invalidate(self):
+        """Drops the cached tables; the next lookup reloads them."""
+        with self._lock:
+            self._loaded = False
+            self.generation += 1
+
+    # ── Departments ──────────────────────────────────────────────────────────
+    def department_id(self, name: str, cursor=None):
+        """Returns department_id for a department name, or None if unknown."""
+        self._ensure_loaded(cursor)
+        dept_id = self._dept_by_name.get(name)
+        if dept_id is None and time.monotonic() - self._last_miss_reload > MISS_RELOAD_SECONDS:
+            self._last_miss_reload = time.monotonic()
+            self.warm(cursor)
+            dept_id = self._dept_by_name.get(name)
+        return dept_id
+
+    def department_name(self, department_id: int, cursor=None):
+        self._ensure_loaded(cursor)
+        return self._dept_by_id.get(department_id)
+
+    def departments(self, cursor=None) -> dict:
+        """name → department_id for every department."""
+        self._ensure_loaded(cursor)
+        return dict(self._dept_by_name)
+
+    # ── Doctors ──────────────────────────────────────────────────────────────
+    def doctor(self, doctor_id: int, cursor=None):
+        """Returns {doctor_id, name, department_id, experience_years, status} or None."""
+        self._ensure_loaded(cursor)
+        return self._doctors.get(doctor_id)
+
+    def doctors_in_department(self, department_id: int, cursor=None) -> list:
+        self._ensure_loaded(cursor)
+        return list(self._by_dept.get(department_id, ()))
+
+    def put_doctor(self, doctor_id: int, **fields):
+        """Inserts or patches one doctor in place after a committed write."""
+        with self._lock:
+            if not self._loaded:
+                return
+            if doctor_id not in self._doctors and "department_id" not in fields:
+                # A patch for a doctor we've never seen — reload rather than guess.
+                self._loaded = False
+                self.generation += 1
+                return
+            current = dict(self._doctors.get(doctor_id) or {"doctor_id": doctor_id})
+            current.update(fields)
+            doctors = dict(self._doctors)
+            doctors[doctor_id] = current
+            self._doctors = doctors
+            self._by_dept = _group_by_department(doctors)
+            self.generation += 1
+
+    # ── Event handlers ───────────────────────────────────────────────────────
+    def on_doctor(self, doctor_id, **fields):
+        self.put_doctor(doctor_id, **fields)
+
+    def on_resync(self, **_):
+        self.invalidate()
+
+
+def _group_by_department(doctors: dict) -> dict:
+    by_dept = {}
+    for doctor in doctors.values():
+        by_dept.setdefault(doctor["department_id"], []).append(doctor)
+    return by_dept
+
+
+reference_cache = ReferenceCache()
+events.subscribe("doctor", reference_cache.on_doctor)
+events.subscribe("resync", reference_cache.on_resync)
@@ -0,0 +1,243 @@
+"""
+services/refresh_worker.py
+─────────────────────────────────────────────────────────────────────────────
+Write-behind refresh of stored queue state (waiting_time,
+predicted_service_time, priority_score).
+
+Mutation endpoints used to recompute the doctor's whole queue inside their
+own transaction, so a burst of 10 changes for one doctor meant 10 full
+recomputes and 10 × n single-row UPDATEs. Now they commit, call
+
+  refresh_worker.mark_dirty(doctor_id)
+
+and return. A background thread coalesces dirty doctors and refreshes each
+one once:
+
+  mark_dirty ──▶ _dirty {doctor_id: (first_marked, last_marked)}
+                    │  due at min(last + DEBOUNCE_SECONDS,
+                    │             first + MAX_STALENESS_SECONDS)
+                    ▼
+  refresh_queues(cursor, due_doctors)   one SELECT, optimize per doctor,
+                                        one UPDATE … FROM (VALUES …) for the
+                                        rows whose stored values changed
+
+The debounce absorbs a burst; the staleness bound keeps a doctor under
+constant churn from being postponed forever. Stored values are at most
+MAX_STALENESS_SECONDS (plus one refresh) behind the committed queue.
+
+refresh_queues() is also used synchronously by /appointments/recalculate-all
+and the rules re-score.
+
+Each refresh holds its doctors' exclusive locks (services/doctor_locks.py)
+until it commits. The worker only try-locks: doctors whose queue is being
+mutated or refreshed by another worker right now are put back and retried
+after DEBOUNCE_SECONDS instead of waited for.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import time
+import logging
+import threading
+
+from psycopg2.extras import execute_values
+
+from database import get_connection
+from services import doctor_locks, metrics, query_catalog
+from services.rules_engine import rules_engine
+from services.service_time_model import service_time_model
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE_SECONDS      = float(os.getenv("QUEUE_REFRESH_DEBOUNCE_MS", "250")) / 1000
+MAX_STALENESS_SECONDS = float(os.getenv("QUEUE_REFRESH_MAX_STALENESS_MS", "2000")) / 1000
+RETRY_SECONDS         = 1.0
+
+PENDING   = metrics.gauge("queue_refresh_pending_doctors",
+                          "Doctors whose stored queue is waiting for a refresh.")
+OLDEST    = metrics.gauge("queue_refresh_oldest_pending_seconds",
+                          "Age of the oldest un-refreshed queue change.")
+STALENESS = metrics.histogram("queue_refresh_staleness_seconds",
+                              "Time from a doctor's first queue change to its refresh being committed.")
+COALESCED = metrics.counter("queue_refresh_coalesced_total",
+                            "Queue changes absorbed into an already pending refresh.")
+FAILURES  = metrics.counter("queue_refresh_failures_total",
+                            "Background queue refreshes that failed and were retried.")
+DEFERRED  = metrics.counter("queue_refresh_deferred_total",
+                            "Doctors put back because their queue was locked by another writer.")
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# BULK REFRESH
+# ═══════════════════════════════════════════════════════════════════════════════
+def refresh_queues(cursor, doctor_ids, lock: bool = True) -> int:
+    """
+    Recomputes the open queues of doctor_ids and writes back the rows whose
+    stored values changed. Returns count of appointments in those queues.
+    lock=False when the caller already holds the doctors' exclusive locks.
+    """
+    doctor_ids = sorted(doctor_ids)
+    if not doctor_ids:
+        return 0
+    if lock:
+        doctor_locks.lock_doctors(cursor, doctor_ids)
+    query_catalog.execute(cursor, "doctor_queues", (doctor_ids,))
+
+    queues = {}
+    stored = {}
+    for r in cursor.fetchall():
+        queues.setdefault(r[0], []).append({
+            "id":r[1],"name":r[2],"age":r[3],"gender":r[4],"disability":r[5],
+            "appointment_type":r[6],"severity_score":r[7],"arrival_time":r[8],"is_hyper_emergency":r[9]})
+        stored[r[1]] = (r[10], r[11], r[12])
+
+    changed = []
+    total   = 0
+    with metrics.timed("optimizer"):
+        for doctor_id, patients in queues.items():
+            for entry in rules_engine.optimize(patients, service_time_model.for_doctor(doctor_id)):
+                values = (int(entry["waiting_time_minutes"]), entry["estimated_duration"], entry["priority_score"])
+                if stored[entry["id"]] != values:
+                    changed.append((entry["id"],) + values)
+                total += 1
+
+    if changed:
+        execute_values(cursor, """
+            UPDATE appointments AS a
+            SET waiting_time=v.waiting_time, predicted_service_time=v.predicted_service_time,
+                priority_score=v.priority_score
+            FROM (VALUES %s) AS v(appointment_id, waiting_time, predicted_service_time, priority_score)
+            WHERE a.appointment_id = v.appointment_id
+        """, changed, page_size=1000)
+    return total
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# WORKER
+# ═══════════════════════════════════════════════════════════════════════════════
+class QueueRefreshWorker:
+
+    def __init__(self, debounce=DEBOUNCE_SECONDS, max_staleness=MAX_STALENESS_SECONDS):
+        self.debounce      = debounce
+        self.max_staleness = max_staleness
+        self._cond     = threading.Condition()
+        self._dirty    = {}     # doctor_id → (first_marked, last_marked), time.monotonic()
+        self._thread   = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def mark_dirty(self, doctor_id: int):
+        """Schedules a refresh of doctor_id's stored queue. Call after COMMIT."""
+        if doctor_id is None:
+            return
+        now = time.monotonic()
+        with self._cond:
+            pending = self._dirty.get(doctor_id)
+            if pending is not None:
+                COALESCED.inc()
+            self._dirty[doctor_id] = (pending[0] if pending else now, now)
+            PENDING.set(len(self._dirty))
+            self._cond.notify()
+        if not self.running:
+            self.flush()
+
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    # ── Lifecycle ────────────────────────────────────────────────────────────
+    def start(self):
+        if self.running:
+            return self._thread
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="queue-refresh", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: float = 10.0):
+        """Flushes everything still pending and stops the thread."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def flush(self):
+        """Refreshes every pending doctor now, on the calling thread."""
+        with self._cond:
+            batch, self._dirty = self._dirty, {}
+            PENDING.set(0)
+        if batch and not self._refresh(batch):
+            self._requeue(batch)
+
+    # ── Background loop ──────────────────────────────────────────────────────
+    def _due(self, first, last) -> float:
+        return min(last + self.debounce, first + self.max_staleness)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    OLDEST.set(round(now - min(f for f, _ in self._dirty.values()), 3) if self._dirty else 0)
+                    if self._stopping:
+                        batch, self._dirty = self._dirty, {}
+                        break
+                    batch = {d: t for d, t in self._dirty.items() if self._due(*t) <= now}
+                    if batch:
+                        for doctor_id in batch:
+                            del self._dirty[doctor_id]
+                        break
+                    timeout = min(self._due(*t) for t in self._dirty.values()) - now if self._dirty else None
+                    self._cond.wait(timeout)
+                PENDING.set(len(self._dirty))
+
+            if batch and not self._refresh(batch):
+                self._requeue(batch)
+                time.sleep(RETRY_SECONDS)
+            if self._stopping and not self._dirty:
+                OLDEST.set(0)
+                return
+
+    def _refresh(self, batch: dict) -> bool:
+        conn = None
+        try:
+            conn   = get_connection()
+            cursor = conn.cursor()
+            locked = doctor_locks.try_lock_doctors(cursor, batch)
+            with metrics.timed("queue_refresh"):
+                refresh_queues(cursor, locked, lock=False)
+            conn.commit()
+        except Exception as exc:
+            if conn is not None:
+                conn.rollback()
+            FAILURES.inc()
+            logger.warning(f"[QueueRefresh] refresh of {len(batch)} doctors failed: {exc}")
+            return False
+        finally:
+            if conn is not None:
+                conn.close()
+
+        now  = time.monotonic()
+        busy = [doctor_id for doctor_id in batch if doctor_id not in locked]
+        for doctor_id, (first, _) in batch.items():
+            if doctor_id in locked:
+                STALENESS.observe(now - first)
+        if busy:
+            # Due again after the debounce, even if already past the staleness bound.
+            DEFERRED.inc(len(busy))
+            self._requeue({doctor_id: (now, now) for doctor_id in busy})
+        return True
+
+    def _requeue(self, batch: dict):
+        with self._cond:
+            for doctor_id, (first, last) in batch.items():
+                pending = self._dirty.get(doctor_id)
+                self._dirty[doctor_id] = (first, max(last, pending[1])) if pending else (first, last)
+            PENDING.set(len(self._dirty))
+
+
+refresh_worker = QueueRefreshWorker()
@@ -0,0 +1,144 @@
+"""
+services/routing_index.py
+─────────────────────────────────────────────────────────────────────────────
+Per-department doctor ranking for triage and doctor assignment.
+
+hyper_emergency_triage and add_appointment need the department's active
+doctors ordered by (open patients ASC, experience DESC). That used to be a
+GROUP BY join of doctors against every open appointment on each call. This
+index keeps the open-patient count per doctor in memory:
+
+  counts    ← appointment events (services/events.py), ±1 per status change
+  metadata  ← reference_cache (name, department, experience, status)
+  ranking   ← sorted lazily per department, cached until something changes
+
+  routing_index.ranked(department_id)   → [{doctor_id, name, patients, …}]
+  routing_index.least_loaded(dept_id)   → doctor_id | None
+  routing_index.least_loaded(dept_id, among=on_shift_ids)
+
+The original SQL is kept as reconcile(), run once at startup and every
+RECONCILE_SECONDS in the background. It replaces the counts wholesale and
+reports how far the incremental counts had drifted.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import time
+import logging
+import threading
+
+from database import get_connection
+from services import events, metrics, query_catalog
+from services.reference_cache import reference_cache
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_SECONDS = 60
+
+DRIFT = metrics.counter("routing_index_drift_total",
+                        "Doctors whose open-patient count was corrected by reconciliation.")
+
+
+class TriageRoutingIndex:
+
+    def __init__(self):
+        self._lock    = threading.Lock()
+        self._open    = {}     # doctor_id → open appointments
+        self._ranked  = {}     # department_id → (reference_cache.generation, ranking)
+        self._loaded  = False
+
+    # ── Reconciliation (the old per-request SQL) ─────────────────────────────
+    def reconcile(self, cursor=None) -> int:
+        """Reloads every doctor's open count. Returns how many had drifted."""
+        own_conn = None
+        if cursor is None:
+            own_conn = get_connection()
+            cursor   = own_conn.cursor()
+        try:
+            fresh = dict(query_catalog.execute(cursor, "open_counts").fetchall())
+        finally:
+            if own_conn is not None:
+                own_conn.close()
+
+        with self._lock:
+            drifted = sum(1 for did, n in fresh.items() if self._loaded and self._open.get(did, 0) != n)
+            self._open   = fresh
+            self._ranked = {}
+            self._loaded = True
+        if drifted:
+            DRIFT.inc(amount=drifted)
+            logger.info(f"[RoutingIndex] reconcile corrected {drifted} doctor counts")
+        return drifted
+
+    def start_reconciler(self):
+        thread = threading.Thread(target=self._reconcile_forever, name="routing-reconciler", daemon=True)
+        thread.start()
+        return thread
+
+    def _reconcile_forever(self):
+        while True:
+            time.sleep(RECONCILE_SECONDS)
+            try:
+                self.reconcile()
+            except Exception as exc:
+                logger.warning(f"[RoutingIndex] reconcile failed: {exc}")
+
+    def _ensure_loaded(self, cursor=None):
+        if not self._loaded:
+            self.reconcile(cursor)
+
+    # ── Queries ──────────────────────────────────────────────────────────────
+    def ranked(self, department_id: int, cursor=None) -> list:
+        """Active doctors of a department, least loaded first, most experienced on ties."""
+        self._ensure_loaded(cursor)
+        cached = self._ranked.get(department_id)
+        if cached is not None and cached[0] == reference_cache.generation:
+            return cached[1]
+
+        doctors = [d for d in reference_cache.doctors_in_department(department_id, cursor)
+                   if d["status"] == "active"]
+        generation = reference_cache.generation
+        department = reference_cache.department_name(department_id, cursor)
+        with self._lock:
+            doctors.sort(key=lambda d: (self._open.get(d["doctor_id"], 0), -(d["experience_years"] or 0)))
+            ranking = [{"doctor_id": d["doctor_id"], "name": d["name"], "department": department,
+                        "patients": self._open.get(d["doctor_id"], 0),
+                        "experience_years": d["experience_years"], "rank": i + 1}
+                       for i, d in enumerate(doctors)]
+            self._ranked[department_id] = (generation, ranking)
+        return ranking
+
+    def least_loaded(self, department_id: int, cursor=None, among=None):
+        """Least-loaded active doctor, restricted to the doctor_ids in `among` if given."""
+        for doctor in self.ranked(department_id, cursor):
+            if among is None or doctor["doctor_id"] in among:
+                return doctor["doctor_id"]
+        return None
+
+    def open_count(self, doctor_id: int, cursor=None) -> int:
+        self._ensure_loaded(cursor)
+        return self._open.get(doctor_id, 0)
+
+    # ── Event handlers ───────────────────────────────────────────────────────
+    def on_appointment(self, doctor_id, before=None, after=None, **_):
+        delta = int(events.is_open(after)) - int(events.is_open(before))
+        if not delta or not self._loaded:
+            return
+        doctor = reference_cache.doctor(doctor_id)
+        with self._lock:
+            self._open[doctor_id] = max(0, self._open.get(doctor_id, 0) + delta)
+            if doctor is not None:
+                self._ranked.pop(doctor["department_id"], None)
+            else:
+                self._ranked = {}
+
+    def on_doctor(self, doctor_id, **_):
+        # Status and department changes reach the rankings through
+        # reference_cache.generation; only a brand-new doctor needs a count.
+        with self._lock:
+            self._open.setdefault(doctor_id, 0)
+
+
+routing_index = TriageRoutingIndex()
+events.subscribe("appointment", routing_index.on_appointment)
+events.subscribe("doctor", routing_index.on_doctor)
+events.subscribe("resync", routing_index.reconcile)
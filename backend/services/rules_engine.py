@@ -0,0 +1,403 @@
+"""
+services/rules_engine.py
+─────────────────────────────────────────────────────────────────────────────
+The single source of truth for patient scoring and queue ordering.
+
+Priority scoring, service-time estimation and the queue optimizer used to be
+copy-pasted across priority.py, service_time.py, scheduler.py,
+queue_optimizer.py and graph/department_graph.py, with drifting constants
+and level names. They all delegate here now.
+
+Weights and thresholds live in services/rules.json (or RULES_PATH), the
+tracked default. Rules posted to the API are persisted to RULES_OVERRIDE_PATH
+(rules_data/rules.json, gitignored), which wins over the default while it
+exists; delete it to go back to the tracked file:
+
+  rules.json ──load()──▶ _compile(version, text) ──▶ CompiledRules
+                              lru_cache per version      age→score table,
+                                                         level thresholds, ...
+
+  version = sha1 of the canonical rules JSON, so any edit to a weight is a
+  new version even if the human "version" label was not bumped.
+
+Hot reload:
+  rules_engine.load(dict)   ← POST /rules/reload with a body
+  rules_engine.reload()     ← POST /rules/reload without a body, the
+                              background watcher when the file's mtime moves,
+                              and "rules" events from other workers
+
+Swapping rules is a single reference assignment; requests in flight finish
+on the rules they started with.
+
+Queue order (rules.json → queue) ages patients by their wait, so a LOW
+follow-up can't be pushed back forever by a stream of HIGH arrivals:
+
+  effective(now) = weight + severity_points · severity
+                 + aging_points_per_hour · hours waited
+
+Everyone in a queue shares "now", so ordering by effective(now) is ordering
+by  aging · arrival − (weight + severity_points · severity), a key fixed at
+arrival (queue_key). Queue order only changes when patients join or leave,
+never because time passed. No timer re-sorts, and keys already in a heap
+stay valid. Severity is clamped to 0–MAX_SEVERITY, and severity_points · 10
+< 1 keeps it inside a weight class. Hyper-emergencies are not aged against:
+the key leads with them, so no wait overtakes one.
+With aging 0 the order is the old (weight, severity, arrival).
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from datetime import datetime, timedelta
+
+from services import events
+
+logger = logging.getLogger(__name__)
+
+RULES_PATH          = os.getenv("RULES_PATH", os.path.join(os.path.dirname(__file__), "rules.json"))
+RULES_OVERRIDE_PATH = os.getenv("RULES_OVERRIDE_PATH",
+                                os.path.join(os.path.dirname(os.path.dirname(__file__)), "rules_data", "rules.json"))
+WATCH_SECONDS = 10
+MAX_SEVERITY  = 10
+
+# Ages beyond this share the last band.
+_MAX_TABLE_AGE = 130
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# COMPILED RULES
+# ═══════════════════════════════════════════════════════════════════════════════
+class CompiledRules:
+    """Rules flattened into lookup tables so per-patient scoring is O(1)."""
+
+    def __init__(self, version: str, rules: dict):
+        self.version = version
+        self.label   = str(rules.get("version", ""))
+        self.rules   = rules
+
+        priority = rules["priority"]
+        self.age_scores = []
+        for age in range(_MAX_TABLE_AGE + 1):
+            for band in priority["age_bands"]:
+                if band["max_age"] is None or age <= band["max_age"]:
+                    self.age_scores.append(int(band["score"]))
+                    break
+            else:
+                raise ValueError(f"age {age} is not covered by any age band")
+
+        self.disability_score = int(priority["disability_score"])
+        window = priority["female_window"]
+        self.female_min, self.female_max, self.female_score = (
+            int(window["min_age"]), int(window["max_age"]), int(window["score"]))
+        self.levels  = sorted(((int(l["min_score"]), l["level"]) for l in priority["levels"]), reverse=True)
+        self.weights = {level: int(w) for level, w in priority["weights"].items()}
+        for _, level in self.levels:
+            if level not in self.weights:
+                raise ValueError(f"priority level {level!r} has no weight")
+
+        service = rules["service_time"]
+        self.base_minutes  = {k.lower(): int(v) for k, v in service["base_minutes"].items()}
+        self.default_base  = int(service["default_base_minutes"])
+        self.per_severity  = int(service["per_severity_point"])
+        age_extra          = service["age_extra"]
+        self.age_below, self.age_above, self.age_extra = (
+            int(age_extra["below"]), int(age_extra["above"]), int(age_extra["minutes"]))
+        self.disability_extra = int(service["disability_extra"])
+
+        # Optional section: rules without it keep the unaged order.
+        queue = rules.get("queue", {})
+        self.aging_per_minute = float(queue.get("aging_points_per_hour", 0)) / 60
+        self.severity_points  = float(queue.get("severity_points", 0.09))
+        if self.aging_per_minute < 0 or not 0 <= self.severity_points * 10 < 1:
+            raise ValueError("queue: aging_points_per_hour must be ≥ 0 and severity_points in [0, 0.1)")
+
+
+def _canonical(rules: dict) -> str:
+    return json.dumps(rules, sort_keys=True, separators=(",", ":"))
+
+
+def rules_version(rules: dict) -> str:
+    return hashlib.sha1(_canonical(rules).encode("utf-8")).hexdigest()[:12]
+
+
+@lru_cache(maxsize=8)
+def _compile(version: str, canonical: str) -> CompiledRules:
+    return CompiledRules(version, json.loads(canonical))
+
+
+def compile_rules(rules: dict) -> CompiledRules:
+    """Compiles (or fetches the cached compilation of) a rules dict."""
+    return _compile(rules_version(rules), _canonical(rules))
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# ENGINE
+# ═══════════════════════════════════════════════════════════════════════════════
+class RulesEngine:
+
+    def __init__(self, path: str = RULES_PATH, override_path: str = RULES_OVERRIDE_PATH):
+        self.path          = path
+        self.override_path = override_path
+        self._source       = None    # (path, mtime) the current rules were read from
+        self._compiled = None
+        self.reload()
+
+    # ── Loading ──────────────────────────────────────────────────────────────
+    @property
+    def version(self) -> str:
+        return self._compiled.version
+
+    @property
+    def rules(self) -> dict:
+        return self._compiled.rules
+
+    def load(self, rules: dict, persist: bool = False) -> bool:
+        """Swaps in new rules. Returns True if the version changed. Raises ValueError if invalid."""
+        try:
+            compiled = compile_rules(rules)
+        except (KeyError, TypeError) as exc:
+            raise ValueError(f"invalid rules: missing or malformed {exc}") from exc
+        changed = self._compiled is None or compiled.version != self._compiled.version
+        if persist:
+            os.makedirs(os.path.dirname(self.override_path), exist_ok=True)
+            tmp = f"{self.override_path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(rules, f, indent=2)
+            os.replace(tmp, self.override_path)
+            self._source = (self.override_path, os.path.getmtime(self.override_path))
+        self._compiled = compiled
+        if changed:
+            logger.info(f"[Rules] now on {compiled.label or '-'} ({compiled.version})")
+        return changed
+
+    def active_path(self) -> str:
+        """The persisted override if there is one, else the tracked rules file."""
+        return self.override_path if os.path.exists(self.override_path) else self.path
+
+    def reload(self) -> bool:
+        """Re-reads the active rules file. Returns True if the version changed."""
+        path  = self.active_path()
+        mtime = os.path.getmtime(path)
+        with open(path) as f:
+            rules = json.load(f)
+        self._source = (path, mtime)
+        return self.load(rules)
+
+    def start_watcher(self, on_change=None):
+        """Polls the rules file; calls on_change() after a reload that changed the version."""
+        thread = threading.Thread(target=self._watch_forever, args=(on_change,), name="rules-watcher", daemon=True)
+        thread.start()
+        return thread
+
+    def _watch_forever(self, on_change):
+        while True:
+            time.sleep(WATCH_SECONDS)
+            try:
+                path = self.active_path()
+                if (path, os.path.getmtime(path)) != self._source and self.reload() and on_change:
+                    on_change()
+            except Exception as exc:
+                logger.warning(f"[Rules] reload from {self.active_path()} failed ({exc}), keeping {self.version}")
+
+    def on_rules(self, version, **_):
+        # Another worker reloaded through the API and persisted the override.
+        if version != self.version:
+            self.reload()
+
+    # ── Priority ─────────────────────────────────────────────────────────────
+    def calculate_priority(self, age, gender, disability, rules: CompiledRules | None = None):
+        """Returns (total_score: int, level: str) with level one of the configured levels."""
+        r   = rules or self._compiled
+        age = int(age or 0)
+
+        score = r.age_scores[min(max(age, 0), _MAX_TABLE_AGE)]
+        if disability:
+            score += r.disability_score
+        if isinstance(gender, str) and gender.lower() == "female" and r.female_min <= age <= r.female_max:
+            score += r.female_score
+
+        for min_score, level in r.levels:
+            if score >= min_score:
+                return score, level
+        return score, r.levels[-1][1]
+
+    def priority_weight(self, level: str, rules: CompiledRules | None = None) -> int:
+        return (rules or self._compiled).weights.get(level, 1)
+
+    # ── Service time ─────────────────────────────────────────────────────────
+    def estimate_service_time(self, row: dict, rules: CompiledRules | None = None) -> int:
+        """
+        Returns estimated consultation duration in minutes.
+        row must contain: appointment_type, severity_score, age, disability
+        """
+        r = rules or self._compiled
+        appt_type = str(row.get("appointment_type") or "routine").lower().strip()
+
+        minutes = r.base_minutes.get(appt_type, r.default_base)
+        minutes += int(row.get("severity_score") or 0) * r.per_severity
+
+        age = int(row.get("age") or 0)
+        if age > r.age_above or age < r.age_below:
+            minutes += r.age_extra
+        if row.get("disability"):
+            minutes += r.disability_extra
+        return int(minutes)
+
+    # ── Queue optimizer ──────────────────────────────────────────────────────
+    def queue_key(self, weight: int, severity: int, arrival: datetime, rules: CompiledRules | None = None,
+                  hyper: bool = False) -> tuple:
+        """
+        Sort key, smallest first, for the aged effective priority. It depends
+        only on the patient, so keys computed at different times compare
+        correctly (heap-safe). Ties go to the earlier arrival. Severity is
+        clamped to 0–10 so it never lifts a patient out of its weight class.
+        Hyper-emergencies sort ahead of everyone, however long others waited.
+        """
+        r    = rules or self._compiled
+        base = weight + r.severity_points * min(max(int(severity or 0), 0), MAX_SEVERITY)
+        return (0 if hyper else 1, r.aging_per_minute * arrival.timestamp() / 60 - base, arrival)
+
+    def optimize(self, patients: list, durations=None) -> list:
+        """
+        patients: list of dicts, each must have:
+            id, name, age, gender, disability,
+            appointment_type, severity_score, arrival_time
+        and optionally is_hyper_emergency.
+
+        Returns list of dicts sorted by priority with waiting times.
+
+        waiting_time_minutes = cumulative service time of all patients AHEAD
+        in the queue — i.e., how long from NOW until this patient is called.
+
+        durations: optional callable(patient, formula_minutes, start_time) →
+        minutes, e.g. service_time_model.for_doctor(doctor_id). Ordering does
+        not depend on durations, so it is applied after sorting, when each
+        patient's start time is known.
+        """
+        if not patients:
+            return []
+
+        r   = self._compiled   # one rules snapshot for the whole queue
+        now = datetime.now()
+
+        enriched = []
+        for p in patients:
+            age        = int(p.get("age") or 0)
+            disability = bool(p.get("disability") or False)
+            priority_score, priority_level = self.calculate_priority(age, str(p.get("gender") or ""), disability, r)
+            duration = self.estimate_service_time({
+                "appointment_type": p.get("appointment_type", "routine"),
+                "severity_score":   p.get("severity_score", 0),
+                "age":              age,
+                "disability":       disability,
+            }, r)
+
+            # Normalise arrival_time — used for aging and ties, NOT for wait calc
+            arrival = p.get("arrival_time")
+            if isinstance(arrival, str):
+                try:
+                    arrival = datetime.fromisoformat(arrival)
+                except ValueError:
+                    arrival = now
+            if arrival is None:
+                arrival = now
+
+            enriched.append({
+                "id":                 p["id"],
+                "name":               p.get("name", ""),
+                "arrival_time":       arrival,
+                "priority_score":     priority_score,
+                "priority_level":     priority_level,
+                "priority_weight":    r.weights.get(priority_level, 1),
+                "severity_score":     int(p.get("severity_score") or 0),
+                "appointment_type":   p.get("appointment_type", "routine"),
+                "is_hyper_emergency": bool(p.get("is_hyper_emergency")),
+                "estimated_duration": duration,
+            })
+
+        # ── Sort: aged effective priority (queue_key) ─────────────────────────
+        enriched.sort(key=lambda x: self.queue_key(x["priority_weight"], x["severity_score"], x["arrival_time"], r,
+                                                   hyper=x["is_hyper_emergency"]))
+
+        # ── Waiting time = service time of everyone ahead ────────────────────
+        optimized_queue = []
+        cumulative_wait = 0
+        for patient in enriched:
+            start_time = now + timedelta(minutes=cumulative_wait)
+            if durations is not None:
+                patient["estimated_duration"] = durations(patient, patient["estimated_duration"], start_time)
+            end_time   = start_time + timedelta(minutes=patient["estimated_duration"])
+            optimized_queue.append({
+                "id":                   patient["id"],
+                "name":                 patient["name"],
+                "priority_level":       patient["priority_level"],
+                "priority_score":       patient["priority_score"],
+                "severity_score":       patient["severity_score"],
+                "estimated_duration":   patient["estimated_duration"],
+                "start_time":           start_time,
+                "end_time":             end_time,
+                "waiting_time_minutes": round(cumulative_wait, 2),
+            })
+            cumulative_wait += patient["estimated_duration"]
+
+        return optimized_queue
+
+    # ── Hospital-wide ordering ───────────────────────────────────────────────
+    def score_batch(self, rows: list) -> list:
+        """
+        Scores many patients against one rules snapshot.
+        rows: dicts with age, gender, disability, appointment_type, severity_score
+        Returns [(priority_score, priority_level, predicted_time, adjusted_score), ...]
+
+        Same results as calculate_priority + estimate_service_time per row, but
+        with every table bound to a local once per batch instead of per patient.
+        """
+        r = self._compiled
+        age_scores, max_age = r.age_scores, _MAX_TABLE_AGE
+        disability_score, female_score = r.disability_score, r.female_score
+        female_min, female_max = r.female_min, r.female_max
+        levels = r.levels
+        base_minutes, default_base, per_severity = r.base_minutes, r.default_base, r.per_severity
+        age_below, age_above, age_extra, disability_extra = r.age_below, r.age_above, r.age_extra, r.disability_extra
+
+        scored = []
+        for row in rows:
+            age        = int(row.get("age") or 0)
+            disability = bool(row.get("disability"))
+            gender     = row.get("gender")
+
+            score = age_scores[min(max(age, 0), max_age)]
+            if disability:
+                score += disability_score
+            if isinstance(gender, str) and female_min <= age <= female_max and gender.lower() == "female":
+                score += female_score
+            level = levels[-1][1]
+            for min_score, name in levels:
+                if score >= min_score:
+                    level = name
+                    break
+
+            minutes = base_minutes.get(str(row.get("appointment_type") or "routine").lower().strip(), default_base)
+            minutes += int(row.get("severity_score") or 0) * per_severity
+            if age > age_above or age < age_below:
+                minutes += age_extra
+            if disability:
+                minutes += disability_extra
+
+            scored.append((score, level, minutes, score / max(minutes, 1)))
+        return scored
+
+    def sort_patients(self, patients: list) -> list:
+        """Orders by priority_score per minute of predicted service time, best first."""
+        for patient in patients:
+            patient["adjusted_score"] = patient["priority_score"] / max(patient["predicted_time"], 1)
+        return sorted(patients, key=lambda x: x["adjusted_score"], reverse=True)
+
+
+rules_engine = RulesEngine()
+events.subscribe("rules", rules_engine.on_rules)
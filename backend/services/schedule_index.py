@@ -0,0 +1,217 @@
+"""
+services/schedule_index.py
+─────────────────────────────────────────────────────────────────────────────
+Shift-aware doctor schedule index, loaded from doctor_schedule.
+
+Shift rules used to live in three places: the roster SQL mapped "morning"
+vs "afternoon/night", toggle_doctor_status patched today's rows, and
+add_appointment ignored the schedule entirely. Every schedule row is now an
+interval on a per-department timeline:
+
+  morning   08:00–13:00
+  afternoon 15:00–20:00
+  night     20:00–08:00 (next day)
+
+  _timeline[department_id] = (starts[], [(start, end, doctor_id, shift, available)])
+                              sorted by start
+
+  on_shift(department_id, t)  → doctors whose interval contains t
+      bisect_right(starts, t) finds the last interval starting at or before
+      t; no interval is longer than MAX_SHIFT, so only the few that started
+      within MAX_SHIFT of t are examined — O(log n + k).
+
+  shift_entry(doctor_id, day, shifts) → (shift, available) for the roster
+
+Rows from yesterday onward are loaded (yesterday's night shift is still
+running this morning). reconcile() reloads them at startup and every
+RECONCILE_SECONDS. A "doctor" event (adding a doctor or toggling their
+status writes today's schedule) only marks that doctor dirty; the next
+lookup reloads the dirty doctors' rows in one query.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import time
+import bisect
+import logging
+import threading
+from datetime import date, datetime, time as dtime, timedelta
+
+from database import get_connection
+from services import events
+
+logger = logging.getLogger(__name__)
+
+# shift → (start, end); an end at or before the start means the next day.
+SHIFT_WINDOWS = {
+    "morning":   (dtime(8),  dtime(13)),
+    "afternoon": (dtime(15), dtime(20)),
+    "night":     (dtime(20), dtime(8)),
+}
+MAX_SHIFT = max(
+    (datetime.combine(date.min, end) - datetime.combine(date.min, start)) % timedelta(days=1)
+    for start, end in SHIFT_WINDOWS.values())
+
+RECONCILE_SECONDS = 60
+
+
+def shift_interval(shift: str, day: date):
+    """(start, end) datetimes of `shift` on `day`, or None for an unknown shift."""
+    window = SHIFT_WINDOWS.get(shift)
+    if window is None:
+        return None
+    start = datetime.combine(day, window[0])
+    end   = datetime.combine(day, window[1])
+    if end <= start:
+        end += timedelta(days=1)
+    return start, end
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# INDEX
+# ═══════════════════════════════════════════════════════════════════════════════
+class ScheduleIndex:
+
+    def __init__(self):
+        self._lock     = threading.Lock()
+        self._rows     = {}     # doctor_id → [(department_id, shift, date, available)]
+        self._timeline = {}     # department_id → (starts, intervals)
+        self._days     = {}     # (doctor_id, date) → {shift: available}
+        self._dirty    = set()  # doctor_ids whose rows changed since they were loaded
+        self._loaded   = False
+
+    # ── Loading ──────────────────────────────────────────────────────────────
+    def reconcile(self, cursor=None):
+        own_conn = None
+        if cursor is None:
+            own_conn = get_connection()
+            cursor   = own_conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT ds.doctor_id, d.department_id, ds.shift, ds.date, ds.availability_status
+                FROM doctor_schedule ds JOIN doctors d ON d.doctor_id=ds.doctor_id
+                WHERE ds.date >= CURRENT_DATE - 1
+            """)
+            rows = cursor.fetchall()
+        finally:
+            if own_conn is not None:
+                own_conn.close()
+        self.build(rows)
+
+    def build(self, rows):
+        """Replaces the index with (doctor_id, department_id, shift, date, available) rows."""
+        by_doctor = {}
+        for doctor_id, dept_id, shift, day, available in rows:
+            by_doctor.setdefault(doctor_id, []).append((dept_id, shift, day, bool(available)))
+        timeline, days = _index(by_doctor)
+        with self._lock:
+            self._rows, self._timeline, self._days = by_doctor, timeline, days
+            self._loaded = True
+
+    def start_reconciler(self):
+        thread = threading.Thread(target=self._reconcile_forever, name="schedule-reconciler", daemon=True)
+        thread.start()
+        return thread
+
+    def _reconcile_forever(self):
+        while True:
+            time.sleep(RECONCILE_SECONDS)
+            try:
+                self.reconcile()
+            except Exception as exc:
+                logger.warning(f"[ScheduleIndex] reconcile failed: {exc}")
+
+    def _ensure_loaded(self, cursor=None):
+        if not self._loaded:
+            self.reconcile(cursor)
+        elif self._dirty:
+            self._reload_dirty(cursor)
+
+    # ── Queries ──────────────────────────────────────────────────────────────
+    def on_shift(self, department_id: int, at: datetime, available_only: bool = True, cursor=None) -> list:
+        """doctor_ids of department_id whose shift contains `at`."""
+        self._ensure_loaded(cursor)
+        entry = self._timeline.get(department_id)
+        if entry is None:
+            return []
+        starts, intervals = entry
+        found = []
+        i = bisect.bisect_right(starts, at) - 1
+        earliest = at - MAX_SHIFT
+        while i >= 0 and starts[i] >= earliest:
+            start, end, doctor_id, _, available = intervals[i]
+            if at < end and (available or not available_only):
+                found.append(doctor_id)
+            i -= 1
+        return found
+
+    def shift_entry(self, doctor_id: int, day: date, shifts=tuple(SHIFT_WINDOWS), cursor=None):
+        """(shift, available) of the first of `shifts` the doctor has a row for on `day`, or None."""
+        self._ensure_loaded(cursor)
+        day_rows = self._days.get((doctor_id, day))
+        if not day_rows:
+            return None
+        for shift in shifts:
+            if shift in day_rows:
+                return shift, day_rows[shift]
+        return None
+
+    # ── Event handlers ───────────────────────────────────────────────────────
+    def on_doctor(self, doctor_id, **_):
+        # Handlers must be cheap: only note the doctor; the next lookup reloads it.
+        with self._lock:
+            if self._loaded:
+                self._dirty.add(doctor_id)
+
+    def _reload_dirty(self, cursor=None):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            return
+        own_conn = None
+        try:
+            if cursor is None:
+                own_conn = get_connection()
+                cursor   = own_conn.cursor()
+            cursor.execute("""
+                SELECT ds.doctor_id, d.department_id, ds.shift, ds.date, ds.availability_status
+                FROM doctor_schedule ds JOIN doctors d ON d.doctor_id=ds.doctor_id
+                WHERE ds.doctor_id = ANY(%s) AND ds.date >= CURRENT_DATE - 1
+            """, (list(dirty),))
+            rows = cursor.fetchall()
+        except Exception:
+            with self._lock:
+                self._dirty |= dirty
+            raise
+        finally:
+            if own_conn is not None:
+                own_conn.close()
+
+        with self._lock:
+            by_doctor = dict(self._rows)
+            for doctor_id in dirty:
+                by_doctor[doctor_id] = []
+            for doctor_id, dept_id, shift, day, available in rows:
+                by_doctor[doctor_id].append((dept_id, shift, day, bool(available)))
+            timeline, days = _index(by_doctor)
+            self._rows, self._timeline, self._days = by_doctor, timeline, days
+
+
+def _index(by_doctor: dict):
+    per_dept = {}
+    days     = {}
+    for doctor_id, rows in by_doctor.items():
+        for dept_id, shift, day, available in rows:
+            days.setdefault((doctor_id, day), {})[shift] = available
+            interval = shift_interval(shift, day)
+            if interval is not None:
+                per_dept.setdefault(dept_id, []).append((interval[0], interval[1], doctor_id, shift, available))
+    timeline = {}
+    for dept_id, intervals in per_dept.items():
+        intervals.sort(key=lambda iv: iv[0])
+        timeline[dept_id] = ([iv[0] for iv in intervals], intervals)
+    return timeline, days
+
+
+schedule_index = ScheduleIndex()
+events.subscribe("doctor", schedule_index.on_doctor)
+events.subscribe("resync", schedule_index.reconcile)
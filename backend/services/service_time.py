@@ -1,21 +1,2 @@
-def estimate_service_time(row):
-    # Base time
-    if row["appointment_type"] == "emergency":
-        base = 30
-    elif row["appointment_type"] == "routine":
-        base = 20
-    else:
-        base = 15
-
-    # Severity impact
-    base += row["severity_score"] * 2
-
-    # Age factor
-    if row["age"] > 65 or row["age"] < 12:
-        base += 5
-
-    # Disability
-    if row["disability"]:
-        base += 7
-
-    return int(base)
\ No newline at end of file
+"""Kept for old imports — service-time estimation lives in services/rules_engine.py."""
+from services.queue_optimizer import estimate_service_time
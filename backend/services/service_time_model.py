@@ -0,0 +1,233 @@
+"""
+services/service_time_model.py
+─────────────────────────────────────────────────────────────────────────────
+Service-duration model learned from completed appointments.
+
+The rules formula (rules.json → service_time: 30/20/15 base, +2 per severity
+point, +5 age, +7 disability) stays the backbone. On top of it this model
+learns a multiplier, actual / formula, at five levels of detail:
+
+  ()                                       whole hospital
+  (type,)                                  emergency / routine / …
+  (department, type)
+  (department, type, daypart)              daypart: morning 06–13,
+  (department, type, daypart, doctor)               afternoon 13–20, night
+
+Learning is streaming. Each level keeps exponentially decayed sufficient
+statistics [weight, Σ actual, Σ formula], updated in O(1) per completed
+appointment, so recent behaviour wins and nothing is ever retrained:
+
+  "appointment" event with service={minutes, …}   ← /complete, or PUT → completed
+       └──▶ observe() ──▶ _stats[key] = decay · old + new   (all 5 keys)
+
+  compile() turns the stats into a flat {key: multiplier} table. A level
+  with little data is shrunk toward its parent:
+
+       m(key) = (w · Σactual/Σformula + PRIOR_WEIGHT · m(parent)) / (w + PRIOR_WEIGHT)
+
+Serving: for_doctor(doctor_id) returns a durations(row, base, start) callable
+for RulesEngine.optimize. It resolves the most specific key present in the
+table once per (type, daypart) and memoizes it for the queue, so the
+per-patient cost in the optimizer stays O(1).
+
+fit() replays the last TRAIN_DAYS of completed appointments at startup,
+live and archived (appointment_history, see services/archive.py).
+Durations come from started_at (set when a visit goes in-progress) and
+completed_at; visits never marked in-progress are not learned from.
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import time
+import logging
+import threading
+from datetime import datetime
+
+from database import get_connection
+from services import events, metrics
+from services.reference_cache import reference_cache
+from services.rules_engine import rules_engine
+
+logger = logging.getLogger(__name__)
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+DECAY            = 0.99     # per observation at a key; half-life ≈ 70 visits
+PRIOR_WEIGHT     = 8.0      # pseudo-visits of the parent level
+MULTIPLIER_RANGE = (0.33, 3.0)
+MINUTES_RANGE    = (1, 240) # observed durations outside this are data errors
+TRAIN_DAYS       = 90
+COMPILE_SECONDS  = 1.0      # serving path recompiles at most this often
+
+OBSERVATIONS = metrics.counter("service_time_observations_total",
+                               "Completed visits the service-time model learned from.")
+ABS_ERROR    = metrics.histogram("service_time_abs_error_minutes",
+                                 "|predicted - actual| service minutes, measured before learning.",
+                                 buckets=(1, 2, 5, 10, 15, 20, 30, 45, 60, 90))
+
+
+def daypart(at) -> str:
+    hour = at.hour if at is not None else 12
+    if 6 <= hour < 13:
+        return "morning"
+    if 13 <= hour < 20:
+        return "afternoon"
+    return "night"
+
+
+def _type(appointment_type) -> str:
+    return str(appointment_type or "routine").lower().strip()
+
+
+def _keys(department_id, appointment_type, part, doctor_id) -> tuple:
+    """Most specific first."""
+    return ((department_id, appointment_type, part, doctor_id),
+            (department_id, appointment_type, part),
+            (department_id, appointment_type),
+            (appointment_type,),
+            ())
+
+
+def _parent(key: tuple) -> tuple:
+    # (dept, type) backs off to (type,); every other level drops its last part.
+    return key[1:] if len(key) == 2 else key[:-1]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MODEL
+# ═══════════════════════════════════════════════════════════════════════════════
+class ServiceTimeModel:
+
+    def __init__(self):
+        self._lock  = threading.Lock()
+        self._stats = {}        # key → [weight, Σ actual, Σ formula]
+        self._table = {}        # key → multiplier
+        self.version        = 0
+        self._compiled      = -1
+        self._compiled_at   = 0.0
+
+    # ── Learning ─────────────────────────────────────────────────────────────
+    def observe(self, department_id, doctor_id, row: dict, started_at, minutes: float,
+                record: bool = True) -> bool:
+        """
+        Learns from one completed visit.
+        row must contain: appointment_type, severity_score, age, disability
+        """
+        base = rules_engine.estimate_service_time(row)
+        if not (MINUTES_RANGE[0] <= minutes <= MINUTES_RANGE[1]) or base <= 0:
+            return False
+        keys = _keys(department_id, _type(row.get("appointment_type")), daypart(started_at), doctor_id)
+
+        if record:
+            ABS_ERROR.observe(abs(self._minutes(keys, base) - minutes))
+            OBSERVATIONS.inc()
+        with self._lock:
+            for key in keys:
+                stats = self._stats.get(key)
+                if stats is None:
+                    stats = self._stats[key] = [0.0, 0.0, 0.0]
+                stats[0] = stats[0] * DECAY + 1
+                stats[1] = stats[1] * DECAY + minutes
+                stats[2] = stats[2] * DECAY + base
+            self.version += 1
+        return True
+
+    def compile(self):
+        """Rebuilds the {key: multiplier} table from the current statistics."""
+        with self._lock:
+            stats   = {key: tuple(s) for key, s in self._stats.items()}
+            version = self.version
+        lo, hi = MULTIPLIER_RANGE
+        table  = {}
+        for key in sorted(stats, key=len):
+            weight, actual, base = stats[key]
+            parent = table.get(_parent(key), 1.0) if key else 1.0
+            ratio  = actual / base if base else parent
+            table[key] = min(hi, max(lo, (weight * ratio + PRIOR_WEIGHT * parent) / (weight + PRIOR_WEIGHT)))
+        self._table       = table
+        self._compiled    = version
+        self._compiled_at = time.monotonic()
+
+    def _maybe_compile(self):
+        if self._compiled != self.version and time.monotonic() - self._compiled_at >= COMPILE_SECONDS:
+            self.compile()
+
+    def fit(self, cursor=None, days: int = TRAIN_DAYS) -> int:
+        """Replaces the statistics with a replay of recent completed visits. Returns visits learned."""
+        own_conn = None
+        if cursor is None:
+            own_conn = get_connection()
+            cursor   = own_conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT a.department_id, a.doctor_id, a.appointment_type, a.severity_score,
+                       p.age, p.disability, a.started_at,
+                       EXTRACT(EPOCH FROM a.completed_at - a.started_at) / 60
+                FROM appointment_history a JOIN patients p ON a.patient_id=p.patient_id
+                WHERE a.status='completed' AND a.started_at IS NOT NULL
+                  AND a.completed_at > a.started_at
+                  AND a.completed_at >= NOW() - %s * INTERVAL '1 day'
+                ORDER BY a.completed_at
+            """, (days,))
+            rows = cursor.fetchall()
+        finally:
+            if own_conn is not None:
+                own_conn.close()
+
+        with self._lock:
+            self._stats = {}
+        learned = sum(self.observe(r[0], r[1], {"appointment_type": r[2], "severity_score": r[3],
+                                                "age": r[4], "disability": r[5]}, r[6], float(r[7]), record=False)
+                      for r in rows)
+        self.compile()
+        logger.info(f"[ServiceTime] fitted on {learned} completed visits, {len(self._table)} keys")
+        return learned
+
+    # ── Serving ──────────────────────────────────────────────────────────────
+    def _multiplier(self, keys) -> float:
+        table = self._table
+        for key in keys:
+            m = table.get(key)
+            if m is not None:
+                return m
+        return 1.0
+
+    def _minutes(self, keys, base) -> int:
+        return max(1, round(base * self._multiplier(keys)))
+
+    def for_doctor(self, doctor_id, department_id=None):
+        """durations(row, base_minutes, start_time) → minutes, for RulesEngine.optimize."""
+        self._maybe_compile()
+        if department_id is None:
+            doctor = reference_cache.doctor(doctor_id)
+            department_id = doctor["department_id"] if doctor else None
+        memo = {}
+
+        def durations(row, base, start):
+            slot = (_type(row.get("appointment_type")), daypart(start))
+            m = memo.get(slot)
+            if m is None:
+                m = memo[slot] = self._multiplier(_keys(department_id, slot[0], slot[1], doctor_id))
+            return max(1, round(base * m))
+        return durations
+
+    def predict(self, department_id, doctor_id, row: dict, start=None) -> int:
+        self._maybe_compile()
+        keys = _keys(department_id, _type(row.get("appointment_type")), daypart(start), doctor_id)
+        return self._minutes(keys, rules_engine.estimate_service_time(row))
+
+    def table(self) -> dict:
+        """The compiled multipliers, keyed "dept/type/daypart/doctor" (shorter for coarser levels)."""
+        self._maybe_compile()
+        return {"/".join(str(k) for k in key) or "*": round(m, 3) for key, m in sorted(
+            self._table.items(), key=lambda kv: (len(kv[0]), str(kv[0])))}
+
+    # ── Event handlers ───────────────────────────────────────────────────────
+    def on_appointment(self, doctor_id, department_id=None, service=None, **_):
+        if service:
+            started_at = service.get("started_at")
+            if isinstance(started_at, str):
+                started_at = datetime.fromisoformat(started_at)
+            self.observe(department_id, doctor_id, service, started_at, float(service["minutes"]))
+
+
+service_time_model = ServiceTimeModel()
+events.subscribe("appointment", service_time_model.on_appointment)
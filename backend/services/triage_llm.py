@@ -5,28 +5,79 @@ Hyper-Emergency Department Triage  —  Gemini 2.0 Flash  +  Rule-Based Fallback
 
 Flow:
   1. classify_department_llm(problem_text, age)   ← called by main.py
+       └─▶  triage_model.predict()    local model — used when it is confident
+       └─▶  BATCHER.submit()          micro-batch concurrent complaints
+       └─▶  BREAKER.allow()           circuit breaker — skip Gemini while open
        └─▶  _gemini_triage()          primary  — Google Gemini 2.0 Flash
+            _gemini_triage_batch()    (several patients, one JSON array reply)
        └─▶  _rule_based_triage()      fallback — pure Python, zero latency
+  2. classify_department_rules(problem_text, age) ← rule engine only, used for
+                                                    provisional (streamed) triage
 
 Both engines return the same dict shape:
   {
       "department":    str,   # e.g. "Cardiology"
       "urgency_level": str,   # "critical" | "high" | "medium" | "low"
       "reasoning":     str,   # human-readable explanation
-      "source":        str,   # "gemini" | "rule-based"
+      "source":        str,   # "local-model" | "gemini" | "rule-based" | "rule-based:circuit-open"
   }
+
+Every Gemini answer is appended to the local model's training log
+(services/triage_model.py).
+
+Circuit breaker (one per process):
+
+  closed ──LLM_BREAKER_FAILURES consecutive errors, timeouts or slow calls──▶ open
+  open ──LLM_BREAKER_OPEN_SECONDS──▶ half-open: one probe call goes to Gemini
+  half-open ──probe ok──▶ closed        half-open ──probe fails──▶ open
+
+While open (and while a half-open probe is in flight) every other call is
+answered by the rules at once, source "rule-based:circuit-open". The urlopen
+timeout follows the p95 of recent successful calls × LLM_TIMEOUT_HEADROOM,
+clamped to [LLM_TIMEOUT_MIN_SECONDS, LLM_TIMEOUT_MAX_SECONDS]; until
+LLM_TIMEOUT_MIN_SAMPLES calls have succeeded it is the maximum.
+
+  llm_breaker_state          0 closed, 1 half-open, 2 open
+  llm_breaker_transitions_total{state}
+  llm_timeout_seconds        current urlopen timeout
+
+Micro-batching: requests arriving within LLM_BATCH_WINDOW_MS of the first
+one share a single multi-patient prompt (up to LLM_BATCH_MAX_SIZE), with at
+most LLM_BATCH_CONCURRENCY prompts in flight; while all are busy, arrivals
+pile up for the next one. Results are matched back by patient id and
+sanitized one by one. A patient missing from the reply, or with an invalid
+entry, gets the rules; a failed call gets the rules for everyone.
+
+  llm_batch_size             patients per Gemini call
+  llm_batch_missing_total    patients the reply left out or garbled
 ─────────────────────────────────────────────────────────────────────────────
 """
 
 import os
 import json
 import re
+import time
 import logging
+import queue
+import threading
 import urllib.request
 import urllib.error
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from services import metrics, triage_model
 
 logger = logging.getLogger(__name__)
 
+LLM_CALLS   = metrics.counter("llm_triage_calls_total", "Gemini triage calls by outcome.", ("outcome",))
+STATE       = metrics.gauge("llm_breaker_state", "Gemini circuit breaker: 0 closed, 1 half-open, 2 open.")
+TRANSITIONS = metrics.counter("llm_breaker_transitions_total", "Circuit breaker state changes.", ("state",))
+TIMEOUT     = metrics.gauge("llm_timeout_seconds", "Current Gemini request timeout.")
+BATCH_SIZE  = metrics.histogram("llm_batch_size", "Patients per Gemini triage call.",
+                                buckets=(1, 2, 4, 8, 16, 32))
+BATCH_MISSING = metrics.counter("llm_batch_missing_total",
+                                "Batched patients answered by the rules: entry missing or invalid.")
+
 # ─── CONFIG ───────────────────────────────────────────────────────────────────
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 GEMINI_URL = (
@@ -34,6 +85,27 @@ GEMINI_URL = (
     f"gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
 )
 
+# Circuit breaker. LLM_BREAKER_FAILURES=0 turns it off.
+BREAKER_FAILURES     = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+# A successful call slower than this still counts towards opening.
+SLOW_CALL_SECONDS    = float(os.getenv("LLM_SLOW_CALL_SECONDS", "4"))
+
+# Adaptive timeout
+TIMEOUT_MIN_SECONDS  = float(os.getenv("LLM_TIMEOUT_MIN_SECONDS", "1"))
+TIMEOUT_MAX_SECONDS  = float(os.getenv("LLM_TIMEOUT_MAX_SECONDS", "8"))
+TIMEOUT_HEADROOM     = float(os.getenv("LLM_TIMEOUT_HEADROOM", "2"))
+TIMEOUT_MIN_SAMPLES  = int(os.getenv("LLM_TIMEOUT_MIN_SAMPLES", "20"))
+TIMEOUT_WINDOW       = 200
+
+CIRCUIT_OPEN_SOURCE  = "rule-based:circuit-open"
+
+# Micro-batching. LLM_BATCH_WINDOW_MS=0 sends one prompt per patient.
+BATCH_WINDOW_SECONDS = float(os.getenv("LLM_BATCH_WINDOW_MS", "5")) / 1000
+BATCH_MAX_SIZE       = int(os.getenv("LLM_BATCH_MAX_SIZE", "16"))
+BATCH_CONCURRENCY    = int(os.getenv("LLM_BATCH_CONCURRENCY", "4"))
+TOKENS_PER_PATIENT   = 256
+
 # Valid department names — must match your DB exactly
 VALID_DEPARTMENTS = [
     "Cardiology",
@@ -52,29 +124,228 @@ VALID_DEPARTMENTS = [
 def classify_department_llm(problem_text: str, age: int | None = None) -> dict:
     """
     Primary entry point called by main.py.
-    Tries Gemini first; falls back to rule-based on any failure.
+    Tries the local model, then Gemini; falls back to rule-based on any failure.
     """
     if not problem_text or not problem_text.strip():
         return _rule_based_triage("unknown complaint", age or 30)
 
-    if GEMINI_API_KEY:
+    result = triage_model.predict(problem_text, age)
+    if result is not None:
+        logger.info(f"[Triage] Local model → {result['department']} ({result['urgency_level']})")
+        return result
+
+    if not GEMINI_API_KEY:
+        result = _rule_based_triage(problem_text, age or 30)
+        logger.info(f"[Triage] Rule-based → {result['department']} ({result['urgency_level']})")
+        return result
+
+    with metrics.timed("llm"):
+        if BATCH_WINDOW_SECONDS > 0:
+            result = BATCHER.submit(problem_text, age).result()
+        else:
+            result = _triage_patients([(problem_text, age)])[0]
+    logger.info(f"[Triage] {result['source']} → {result['department']} ({result['urgency_level']})")
+    return result
+
+
+def classify_department_rules(problem_text: str, age: int | None = None) -> dict:
+    """Rule-based triage only — instant, never touches the network."""
+    if not problem_text or not problem_text.strip():
+        return _rule_based_triage("unknown complaint", age or 30)
+    return _rule_based_triage(problem_text, age or 30)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CIRCUIT BREAKER
+# ═══════════════════════════════════════════════════════════════════════════════
+_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitBreaker:
+
+    def __init__(self, failures: int = BREAKER_FAILURES, open_seconds: float = BREAKER_OPEN_SECONDS,
+                 slow_seconds: float = SLOW_CALL_SECONDS):
+        self.failures_to_open = failures
+        self.open_seconds     = open_seconds
+        self.slow_seconds     = slow_seconds
+        self.state     = "closed"
+        self.failures  = 0
+        self.opened_at = 0.0
+        self.latencies = deque(maxlen=TIMEOUT_WINDOW)   # successful calls only
+        self._probe    = None                          # thread running the half-open probe
+        self._lock     = threading.Lock()
+        STATE.set(0)
+        TIMEOUT.set(TIMEOUT_MAX_SECONDS)
+
+    def _set(self, state: str):
+        self.state = state
+        if state == "open":
+            self.opened_at = time.monotonic()
+        STATE.set(_STATE_VALUES[state])
+        TRANSITIONS.inc(state)
+        logger.warning(f"[Triage] Gemini circuit {state.replace('_', '-')}")
+
+    def allow(self) -> bool:
+        """True if this call may go to Gemini; it must then be followed by record()."""
+        if self.failures_to_open <= 0:
+            return True
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.open_seconds:
+                    return False
+                self._set("half_open")
+            if self._probe is not None:
+                return False
+            self._probe = threading.get_ident()
+            return True
+
+    def record(self, elapsed: float | None):
+        """Outcome of an allowed call: seconds it took, or None if it failed."""
+        with self._lock:
+            ok = elapsed is not None
+            if ok:
+                self.latencies.append(elapsed)
+            if self.failures_to_open <= 0:
+                return
+            probe = self._probe == threading.get_ident()
+            if probe:
+                self._probe = None
+            if ok and elapsed < self.slow_seconds:
+                self.failures = 0
+                if probe:
+                    self._set("closed")
+                return
+            self.failures += 1
+            # Calls that started before the circuit opened don't extend the open period.
+            if probe or (self.state == "closed" and self.failures >= self.failures_to_open):
+                self._set("open")
+
+    def timeout(self) -> float:
+        """urlopen timeout for the next call: p95 of recent successes × headroom."""
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < TIMEOUT_MIN_SAMPLES:
+            value = TIMEOUT_MAX_SECONDS
+        else:
+            p95   = samples[int(0.95 * (len(samples) - 1))]
+            value = min(TIMEOUT_MAX_SECONDS, max(TIMEOUT_MIN_SECONDS, p95 * TIMEOUT_HEADROOM))
+        TIMEOUT.set(round(value, 3))
+        return value
+
+
+BREAKER = CircuitBreaker()
+
+
+def _is_timeout(exc: Exception) -> bool:
+    return isinstance(exc, TimeoutError) or isinstance(getattr(exc, "reason", None), TimeoutError)
+
+
+def _triage_patients(patients: list) -> list:
+    """
+    One Gemini call for [(problem_text, age), ...] behind the breaker.
+    Every patient Gemini didn't answer gets the rules.
+    """
+    if not BREAKER.allow():
+        LLM_CALLS.inc("circuit_open", amount=len(patients))
+        results = [_rule_based_triage(text, age or 30) for text, age in patients]
+        for result in results:
+            result["source"] = CIRCUIT_OPEN_SOURCE
+        return results
+
+    answers = [None] * len(patients)
+    start   = time.perf_counter()
+    try:
+        if len(patients) == 1:
+            answers = [_gemini_triage(*patients[0], BREAKER.timeout())]
+        else:
+            answers = _gemini_triage_batch(patients, BREAKER.timeout())
+    except Exception as exc:
+        LLM_CALLS.inc("timeout" if _is_timeout(exc) else "error")
+        BREAKER.record(None)
+        logger.warning(f"[Triage] Gemini failed ({exc}) for {len(patients)} patient(s), switching to rule-based.")
+    else:
+        elapsed = time.perf_counter() - start
+        LLM_CALLS.inc("ok" if elapsed < SLOW_CALL_SECONDS else "slow")
+        BREAKER.record(elapsed)
+        for answer, (text, age) in zip(answers, patients):
+            if answer is not None:
+                triage_model.log_decision(text, age, answer)
+    return [answer or _rule_based_triage(text, age or 30) for answer, (text, age) in zip(answers, patients)]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MICRO-BATCHING
+# ═══════════════════════════════════════════════════════════════════════════════
+class TriageBatcher:
+
+    def __init__(self, window: float = BATCH_WINDOW_SECONDS, max_size: int = BATCH_MAX_SIZE,
+                 concurrency: int = BATCH_CONCURRENCY):
+        self.window    = window
+        self.max_size  = max_size
+        self._pending  = queue.Queue()     # (problem_text, age, Future)
+        self._slots    = threading.Semaphore(concurrency)
+        self._pool     = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="llm-batch")
+        self._thread   = None
+        self._lock     = threading.Lock()
+
+    def submit(self, problem_text: str, age: int | None) -> Future:
+        """Queues one patient; the Future resolves to its triage dict."""
+        future = Future()
+        self._pending.put((problem_text, age, future))
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._collect_forever, name="llm-batcher",
+                                                    daemon=True)
+                    self._thread.start()
+        return future
+
+    def _collect_forever(self):
+        while True:
+            # Wait for a free slot first: requests that arrive meanwhile join the next batch.
+            self._slots.acquire()
+            batch    = [self._pending.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_size:
+                try:
+                    batch.append(self._pending.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._pool.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch: list):
         try:
-            result = _gemini_triage(problem_text, age)
-            logger.info(f"[Triage] Gemini → {result['department']} ({result['urgency_level']})")
-            return result
+            BATCH_SIZE.observe(len(batch))
+            results = _triage_patients([(text, age) for text, age, _ in batch])
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
         except Exception as exc:
-            logger.warning(f"[Triage] Gemini failed ({exc}), switching to rule-based.")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+        finally:
+            self._slots.release()
 
-    # Fallback
-    result = _rule_based_triage(problem_text, age or 30)
-    logger.info(f"[Triage] Rule-based → {result['department']} ({result['urgency_level']})")
-    return result
+
+BATCHER = TriageBatcher()
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # ENGINE 1 — GEMINI 2.0 FLASH
 # ═══════════════════════════════════════════════════════════════════════════════
-def _gemini_triage(problem_text: str, age: int | None) -> dict:
+_TRIAGE_GUIDE = f"""Valid departments (choose EXACTLY one, spelling must match):
+{json.dumps(VALID_DEPARTMENTS)}
+
+Urgency levels: critical | high | medium | low
+- critical : life-threatening, seconds matter (cardiac arrest, stroke, severe trauma)
+- high     : serious, needs care within minutes (chest pain, acute neurological, fractures)
+- medium   : urgent but stable (moderate pain, infections, minor injuries)
+- low      : can wait (skin rashes, follow-ups, mild symptoms)"""
+
+
+def _gemini_triage(problem_text: str, age: int | None, timeout: float = TIMEOUT_MAX_SECONDS) -> dict:
     """
     Calls Gemini 2.0 Flash with a strict JSON-only prompt.
     Raises on any HTTP / parse error so the caller can fall back.
@@ -92,14 +363,7 @@ Decide:
 2. The urgency level.
 3. A brief clinical reasoning (1-2 sentences).
 
-Valid departments (choose EXACTLY one, spelling must match):
-{json.dumps(VALID_DEPARTMENTS)}
-
-Urgency levels: critical | high | medium | low
-- critical : life-threatening, seconds matter (cardiac arrest, stroke, severe trauma)
-- high     : serious, needs care within minutes (chest pain, acute neurological, fractures)
-- medium   : urgent but stable (moderate pain, infections, minor injuries)
-- low      : can wait (skin rashes, follow-ups, mild symptoms)
+{_TRIAGE_GUIDE}
 
 Respond with ONLY a valid JSON object — no markdown, no code fences, no extra text:
 {{
@@ -108,11 +372,68 @@ Respond with ONLY a valid JSON object — no markdown, no code fences, no extra
   "reasoning":     "<1-2 sentence clinical rationale>"
 }}"""
 
+    return _gemini_result(json.loads(_gemini_generate(prompt, TOKENS_PER_PATIENT, timeout)))
+
+
+def _gemini_triage_batch(patients: list, timeout: float = TIMEOUT_MAX_SECONDS) -> list:
+    """
+    Several patients in one prompt, answered as a JSON array keyed by id.
+    Returns one result per patient, None where the reply has no valid entry.
+    Raises if the reply is not a JSON array so the caller can fall back.
+    """
+    cases = json.dumps([{"id": i, "age": age or "unknown", "complaint": text}
+                        for i, (text, age) in enumerate(patients)], indent=1)
+
+    prompt = f"""You are a clinical triage AI for an emergency hospital dashboard.
+{len(patients)} patients have just been flagged as hyper-emergencies. Triage each
+one on its own complaint and age only.
+
+Patients:
+{cases}
+
+For EACH patient decide:
+1. Which single department should handle the case.
+2. The urgency level.
+3. A brief clinical reasoning (1-2 sentences).
+
+{_TRIAGE_GUIDE}
+
+Respond with ONLY a valid JSON array, one object per patient — no markdown, no code fences, no extra text:
+[
+  {{
+    "id":            <the patient's id>,
+    "department":    "<one of the valid departments>",
+    "urgency_level": "<critical|high|medium|low>",
+    "reasoning":     "<1-2 sentence clinical rationale>"
+  }}
+]"""
+
+    parsed = json.loads(_gemini_generate(prompt, TOKENS_PER_PATIENT * len(patients), timeout))
+    if not isinstance(parsed, list):
+        raise ValueError("batch reply is not a JSON array")
+
+    results = [None] * len(patients)
+    for entry in parsed:
+        try:
+            idx = int(entry["id"])
+            if 0 <= idx < len(patients) and results[idx] is None:
+                results[idx] = _gemini_result(entry)
+        except (TypeError, KeyError, ValueError, AttributeError):
+            continue
+    missing = results.count(None)
+    if missing:
+        BATCH_MISSING.inc(amount=missing)
+        logger.warning(f"[Triage] Gemini batch reply missing {missing}/{len(patients)} patient(s), using rules for them.")
+    return results
+
+
+def _gemini_generate(prompt: str, max_tokens: int, timeout: float) -> str:
+    """POSTs one prompt; returns the reply text with markdown fences stripped."""
     payload = json.dumps({
         "contents": [{"parts": [{"text": prompt}]}],
         "generationConfig": {
             "temperature": 0.1,
-            "maxOutputTokens": 256,
+            "maxOutputTokens": max_tokens,
         },
     }).encode("utf-8")
 
@@ -123,19 +444,20 @@ Respond with ONLY a valid JSON object — no markdown, no code fences, no extra
         method="POST",
     )
 
-    with urllib.request.urlopen(req, timeout=8) as resp:
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
         raw_body = resp.read().decode("utf-8")
 
     data = json.loads(raw_body)
     raw_text = data["candidates"][0]["content"]["parts"][0]["text"]
 
     # Strip any accidental markdown fences
-    cleaned = re.sub(r"```(?:json)?|```", "", raw_text).strip()
-    parsed  = json.loads(cleaned)
+    return re.sub(r"```(?:json)?|```", "", raw_text).strip()
+
 
-    # Validate & sanitize
-    department    = _sanitize_department(parsed.get("department", "General"))
-    urgency_level = _sanitize_urgency(parsed.get("urgency_level", "high"))
+def _gemini_result(parsed: dict) -> dict:
+    """Validate & sanitize one triage object from a Gemini reply."""
+    department    = _sanitize_department(str(parsed.get("department", "General")))
+    urgency_level = _sanitize_urgency(str(parsed.get("urgency_level", "high")))
     reasoning     = str(parsed.get("reasoning", "")).strip() or "AI triage completed."
 
     return {
@@ -0,0 +1,323 @@
+"""
+services/triage_model.py
+─────────────────────────────────────────────────────────────────────────────
+Local triage classifier distilled from logged Gemini decisions.
+
+Gemini answers in about a second; the keyword rules answer at once but stop at
+the first keyword group that matches. This model sits between them: a
+linear classifier over hashed n-grams, trained offline on what Gemini
+decided, answering in well under a millisecond.
+
+  Gemini decision ──log_decision()──▶ TRIAGE_DATA_DIR/decisions.jsonl
+                                                │
+        python -m services.triage_model train   │  (offline)
+                                                ▼
+  classify_department_llm ──predict()──▶ TRIAGE_DATA_DIR/model.json
+        │  confident → source "local-model"
+        └─ otherwise → Gemini, then the rules (services/triage_llm.py)
+
+Features, all binary and hashed (crc32) into 2^HASH_BITS buckets:
+
+  words and word bigrams         "chest", "chest pain"
+  character 4-grams              " che", "ches", "hest", … (typos, stems)
+  an age band                    "age:0-5", "age:6-14", …, "age:75+"
+
+Two softmax heads share the features: department and urgency. Training is
+plain SGD on the log-loss with a little L2, EPOCHS passes, in pure Python.
+The model file keeps only the buckets seen in training, one row of weights
+per head each. predict() sums those rows, so its cost is the number of
+n-grams in the complaint, not the size of the hash space.
+
+predict() returns None unless both heads reach MIN_CONFIDENCE and at least
+MIN_KNOWN of the complaint's buckets were seen in training. Softmax
+confidence alone is not enough: on wording it has never seen, the model is
+often sure and wrong (benchmarks/triage_model.py, unseen_phrases). Such
+complaints go to Gemini, and their decisions are logged for the next model.
+The model file is re-read when it changes (checked every MODEL_CHECK_SECONDS).
+
+  triage_model_predictions_total{outcome}   confident | unsure | no_model
+─────────────────────────────────────────────────────────────────────────────
+"""
+
+import os
+import re
+import json
+import math
+import time
+import zlib
+import random
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# ─── CONFIG ───────────────────────────────────────────────────────────────────
+TRIAGE_DATA_DIR     = os.getenv("TRIAGE_DATA_DIR",
+                                os.path.join(os.path.dirname(os.path.dirname(__file__)), "triage_data"))
+DECISION_LOG        = os.path.join(TRIAGE_DATA_DIR, "decisions.jsonl")
+MODEL_PATH          = os.path.join(TRIAGE_DATA_DIR, "model.json")
+MIN_CONFIDENCE      = float(os.getenv("TRIAGE_MODEL_MIN_CONFIDENCE", "0.85"))
+MIN_KNOWN           = float(os.getenv("TRIAGE_MODEL_MIN_KNOWN", "0.8"))
+MODEL_CHECK_SECONDS = 30
+
+HASH_BITS     = 20
+EPOCHS        = 12
+LEARNING_RATE = 0.3
+L2            = 1e-6
+
+AGE_BANDS = ((5, "0-5"), (14, "6-14"), (64, "15-64"), (74, "65-74"))
+
+PREDICTIONS = metrics.counter("triage_model_predictions_total",
+                              "Local triage model lookups by outcome.", ("outcome",))
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# FEATURES
+# ═══════════════════════════════════════════════════════════════════════════════
+def _age_band(age) -> str:
+    if not age:
+        return "unknown"
+    for upper, band in AGE_BANDS:
+        if age <= upper:
+            return band
+    return "75+"
+
+
+def features(problem_text: str, age, bits: int = HASH_BITS) -> list:
+    """Sorted, de-duplicated hash buckets of one complaint."""
+    words = _TOKEN.findall(problem_text.lower())
+    text  = f" {' '.join(words)} "
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    grams += [text[i:i + 4] for i in range(len(text) - 3)]
+    grams.append(f"age:{_age_band(age)}")
+    mask = (1 << bits) - 1
+    return sorted({zlib.crc32(g.encode()) & mask for g in grams})
+
+
+def _softmax(scores: list) -> list:
+    top  = max(scores)
+    exps = [math.exp(s - top) for s in scores]
+    total = sum(exps)
+    return [e / total for e in exps]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MODEL
+# ═══════════════════════════════════════════════════════════════════════════════
+class Head:
+    """One softmax output over `labels`: bias + sparse {bucket: [weight per label]}."""
+
+    def __init__(self, labels: list, weights: dict | None = None, bias: list | None = None):
+        self.labels  = list(labels)
+        self.weights = weights if weights is not None else {}
+        self.bias    = bias if bias is not None else [0.0] * len(self.labels)
+
+    def probabilities(self, buckets: list) -> list:
+        scores = list(self.bias)
+        for bucket in buckets:
+            row = self.weights.get(bucket)
+            if row is not None:
+                scores = [s + w for s, w in zip(scores, row)]
+        return _softmax(scores)
+
+    def step(self, buckets: list, target: int, rate: float):
+        """One SGD step on the log-loss of a single example."""
+        probs = self.probabilities(buckets)
+        grad  = [p - (1.0 if i == target else 0.0) for i, p in enumerate(probs)]
+        self.bias = [b - rate * g for b, g in zip(self.bias, grad)]
+        for bucket in buckets:
+            row = self.weights.get(bucket)
+            if row is None:
+                row = self.weights[bucket] = [0.0] * len(self.labels)
+            for i, g in enumerate(grad):
+                row[i] -= rate * (g + L2 * row[i])
+
+    def to_json(self) -> dict:
+        # Every trained bucket is kept, however small: predict() counts them as known.
+        weights = {str(bucket): [round(w, 5) for w in row] for bucket, row in self.weights.items()}
+        return {"labels": self.labels, "bias": [round(b, 5) for b in self.bias], "weights": weights}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Head":
+        return cls(data["labels"], {int(k): v for k, v in data["weights"].items()}, data["bias"])
+
+
+class TriageModel:
+
+    def __init__(self, department: Head, urgency: Head, bits: int = HASH_BITS, meta: dict | None = None):
+        self.department = department
+        self.urgency    = urgency
+        self.bits       = bits
+        self.meta       = meta or {}
+
+    def predict(self, problem_text: str, age=None) -> dict:
+        """Most likely department and urgency, the probability of each, and the share of known buckets."""
+        buckets = features(problem_text, age, self.bits)
+        dept    = self.department.probabilities(buckets)
+        urg     = self.urgency.probabilities(buckets)
+        d       = max(range(len(dept)), key=dept.__getitem__)
+        u       = max(range(len(urg)), key=urg.__getitem__)
+        known   = sum(bucket in self.department.weights for bucket in buckets) / len(buckets)
+        return {"department": self.department.labels[d], "department_p": dept[d],
+                "urgency_level": self.urgency.labels[u], "urgency_p": urg[u], "known": known}
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = {"bits": self.bits, "meta": self.meta,
+                "department": self.department.to_json(), "urgency": self.urgency.to_json()}
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TriageModel":
+        with open(path) as f:
+            data = json.load(f)
+        return cls(Head.from_json(data["department"]), Head.from_json(data["urgency"]),
+                   data["bits"], data.get("meta"))
+
+
+def train(decisions: list, epochs: int = EPOCHS, seed: int = 0, bits: int = HASH_BITS) -> TriageModel:
+    """
+    decisions: [{"problem_text", "age", "department", "urgency_level"}, ...]
+    """
+    departments = sorted({d["department"] for d in decisions})
+    urgencies   = sorted({d["urgency_level"] for d in decisions})
+    model = TriageModel(Head(departments), Head(urgencies), bits,
+                        {"trained_on": len(decisions), "trained_at": datetime.now().isoformat(timespec="seconds")})
+    examples = [(features(d["problem_text"], d.get("age"), bits),
+                 departments.index(d["department"]), urgencies.index(d["urgency_level"])) for d in decisions]
+    rng = random.Random(seed)
+    for epoch in range(epochs):
+        rng.shuffle(examples)
+        rate = LEARNING_RATE / (1 + epoch)
+        for buckets, dept, urg in examples:
+            model.department.step(buckets, dept, rate)
+            model.urgency.step(buckets, urg, rate)
+    return model
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SERVING
+# ═══════════════════════════════════════════════════════════════════════════════
+_model      = None
+_model_mtime = None
+_checked_at = 0.0
+_load_lock  = threading.Lock()
+_log_lock   = threading.Lock()
+
+
+def _current():
+    """The model on disk, re-read when its file changes; None if there is none."""
+    global _model, _model_mtime, _checked_at
+    if time.monotonic() - _checked_at < MODEL_CHECK_SECONDS:
+        return _model
+    with _load_lock:
+        if time.monotonic() - _checked_at < MODEL_CHECK_SECONDS:
+            return _model
+        _checked_at = time.monotonic()
+        try:
+            mtime = os.path.getmtime(MODEL_PATH)
+        except OSError:
+            _model = _model_mtime = None
+            return None
+        if mtime != _model_mtime:
+            try:
+                _model, _model_mtime = TriageModel.load(MODEL_PATH), mtime
+                logger.info(f"[TriageModel] loaded {MODEL_PATH} ({_model.meta.get('trained_on')} decisions)")
+            except (OSError, ValueError, KeyError) as exc:
+                logger.warning(f"[TriageModel] could not load {MODEL_PATH} ({exc})")
+        return _model
+
+
+def confident(prediction: dict, min_confidence: float = MIN_CONFIDENCE, min_known: float = MIN_KNOWN) -> bool:
+    return (min(prediction["department_p"], prediction["urgency_p"]) >= min_confidence
+            and prediction["known"] >= min_known)
+
+
+def predict(problem_text: str, age=None) -> dict | None:
+    """Triage dict (source "local-model") if the model is confident, else None."""
+    model = _current()
+    if model is None:
+        PREDICTIONS.inc("no_model")
+        return None
+    result = model.predict(problem_text, age)
+    if not confident(result):
+        PREDICTIONS.inc("unsure")
+        return None
+    PREDICTIONS.inc("confident")
+    return {
+        "department":    result["department"],
+        "urgency_level": result["urgency_level"],
+        "reasoning":     (f"Local model trained on past AI triage decisions "
+                          f"(confidence {result['department_p']:.0%} / {result['urgency_p']:.0%})."),
+        "source":        "local-model",
+    }
+
+
+def log_decision(problem_text: str, age, result: dict):
+    """Appends one Gemini decision to the training log; never raises."""
+    line = json.dumps({"at": datetime.now().isoformat(timespec="seconds"), "problem_text": problem_text,
+                       "age": age, "department": result["department"],
+                       "urgency_level": result["urgency_level"]}) + "\n"
+    try:
+        with _log_lock:
+            os.makedirs(TRIAGE_DATA_DIR, exist_ok=True)
+            # One write per line on an O_APPEND file: workers' lines don't interleave.
+            with open(DECISION_LOG, "a") as f:
+                f.write(line)
+    except OSError as exc:
+        logger.warning(f"[TriageModel] decision not logged ({exc})")
+
+
+def use_data_dir(directory: str) -> str:
+    """Points the decision log and model file at another directory; returns the previous one."""
+    global TRIAGE_DATA_DIR, DECISION_LOG, MODEL_PATH, _model, _model_mtime, _checked_at
+    previous = TRIAGE_DATA_DIR
+    TRIAGE_DATA_DIR = directory
+    DECISION_LOG    = os.path.join(directory, "decisions.jsonl")
+    MODEL_PATH      = os.path.join(directory, "model.json")
+    _model = _model_mtime = None
+    _checked_at = 0.0
+    return previous
+
+
+def load_decisions(path: str | None = None) -> list:
+    decisions = []
+    with open(path or DECISION_LOG) as f:
+        for line in f:
+            try:
+                decisions.append(json.loads(line))
+            except ValueError:
+                continue     # a line cut short by a crash
+    return decisions
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# OFFLINE TRAINING
+#   python -m services.triage_model train [--log decisions.jsonl] [--out model.json]
+# ═══════════════════════════════════════════════════════════════════════════════
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the local triage model from logged decisions.")
+    parser.add_argument("command", choices=("train",))
+    parser.add_argument("--log", default=None, help="default: TRIAGE_DATA_DIR/decisions.jsonl")
+    parser.add_argument("--out", default=None, help="default: TRIAGE_DATA_DIR/model.json")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    args = parser.parse_args(argv)
+
+    decisions = load_decisions(args.log)
+    start = time.perf_counter()
+    model = train(decisions, args.epochs)
+    model.save(args.out or MODEL_PATH)
+    print(f"trained on {len(decisions)} decisions in {time.perf_counter() - start:.1f}s → {args.out or MODEL_PATH}")
+
+
+if __name__ == "__main__":
+    main()